@@ -0,0 +1,108 @@
+"""多服务商路由的基准测试：用注入延迟和错误的本地模拟模型比较尾部延迟和失败率
+
+用法（在 ppt-to-word-ai 目录下运行）:
+    python -m benchmarks.llm_router --requests 400 --threads 8 --error-rate 0.1 --slow-rate 0.02
+
+场景（每个场景使用新的路由实例和相同的随机数种子）:
+    direct    直接调用首选服务商，不重试（原有行为）
+    retry     只使用首选服务商，限流和服务端错误时退避重试
+    failover  首选服务商重试次数用完后转到备用服务商
+    hedged    在failover的基础上，请求耗时超过首选服务商的p95时向备用服务商发送对冲请求
+"""
+# 导入必要的库和模块
+import sys  # 用于输出到标准错误
+import json  # 结果以JSON格式输出
+import time  # 用于计时
+import argparse  # 命令行参数解析
+import statistics  # 计算中位数
+from concurrent.futures import ThreadPoolExecutor  # 模拟并发的幻灯片请求
+
+SCENARIOS = ('direct', 'retry', 'failover', 'hedged')
+
+
+def _percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def run_scenario(scenario: str, args) -> dict:
+    """运行一个场景，返回总耗时、失败数和延迟分位数"""
+    from src import llm_router
+    from src.llm_providers import FakeProvider, register_provider, get_provider
+
+    # 每个场景重新创建模拟模型，使随机注入的延迟和错误序列相同
+    register_provider('fake-primary', lambda: FakeProvider(
+        'fake-primary', latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        error_rate=args.error_rate, error_status=args.error_status, seed=args.seed))
+    register_provider('fake-backup', lambda: FakeProvider(
+        'fake-backup', latency=args.latency * 1.5, seed=args.seed + 1))
+
+    if scenario == 'direct':
+        provider = get_provider('fake-primary')
+        call = provider.generate
+    else:
+        names = ['fake-primary'] if scenario == 'retry' else ['fake-primary', 'fake-backup']
+        router = llm_router.LLMRouter(names, hedge=scenario == 'hedged')
+        call = router.generate
+
+    def one(index: int):
+        started = time.perf_counter()
+        try:
+            call(f"请求 {index}")
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, str(e)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(one, range(args.requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [seconds for seconds, error in results if error is None]
+    return {
+        "wall_seconds": round(wall, 3),
+        "failed": sum(1 for _, error in results if error is not None),
+        "p50": round(statistics.median(latencies), 4) if latencies else None,
+        "p95": round(_percentile(latencies, 0.95), 4),
+        "p99": round(_percentile(latencies, 0.99), 4),
+        "max": round(max(latencies), 4) if latencies else None
+    }
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="多服务商路由的尾部延迟和失败率基准测试")
+    parser.add_argument('--requests', type=int, default=400, help="每个场景的请求数")
+    parser.add_argument('--threads', type=int, default=8, help="并发请求数")
+    parser.add_argument('--latency', type=float, default=0.05, help="正常请求的延迟（秒）")
+    parser.add_argument('--slow-rate', type=float, default=0.02, help="首选服务商慢请求的比例")
+    parser.add_argument('--slow-latency', type=float, default=1.0, help="慢请求的延迟（秒）")
+    parser.add_argument('--error-rate', type=float, default=0.1, help="首选服务商出错请求的比例")
+    parser.add_argument('--error-status', type=int, default=429, help="出错时的HTTP状态码")
+    parser.add_argument('--seed', type=int, default=1, help="随机数种子")
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--output', help="结果JSON的保存路径（默认输出到标准输出）")
+    args = parser.parse_args(argv)
+
+    # 退避时间按模拟的延迟缩短，使基准测试在几秒内完成
+    from src import llm_router
+    llm_router.AI_RETRY_BASE_DELAY = args.latency
+    llm_router.AI_HEDGE_MIN_SAMPLES = min(llm_router.AI_HEDGE_MIN_SAMPLES, max(1, args.requests // 20))
+
+    scenarios = {}
+    for scenario in args.scenarios:
+        scenarios[scenario] = run_scenario(scenario, args)
+        print(f"{scenario:<9} {scenarios[scenario]}", file=sys.stderr)
+
+    result = {"params": {key: value for key, value in vars(args).items() if key != 'output'},
+              "scenarios": scenarios}
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""基准测试：在不访问AI接口的情况下测量提取、OCR和Word生成的性能
+
+用法（在 ppt-to-word-ai 目录下运行）:
+    python -m benchmarks.run --slides 50 --pages 50 --images 1 --scanned 5 --latency 0.2 --output bench.json
+    python -m benchmarks.run --compare bench.json  # 与之前的结果比较
+
+AI调用使用本地桩模型（AI_MODEL_TYPE=stub），输出是确定性的，延迟由 --latency 指定；
+默认关闭所有缓存，使每次运行都完整执行各个阶段
+"""
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于设置环境变量
+import sys  # 用于输出到标准错误
+import json  # 结果以JSON格式输出
+import time  # 用于计时
+import shutil  # 用于清理临时目录
+import argparse  # 命令行参数解析
+import platform  # 记录运行环境
+import resource  # 获取子进程的峰值内存
+import statistics  # 计算中位数
+import subprocess  # 获取当前提交
+import tempfile  # 存放合成文件和输出文件的临时目录
+import threading  # 后台采样内存占用
+from . import synthetic  # 合成输入文件生成器
+
+
+class PeakRss:
+    """在一段代码执行期间后台采样当前进程的常驻内存（RSS），记录峰值
+
+    Linux上读取 /proc/self/statm；其他系统退回到进程生命周期内的峰值
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0  # 峰值（字节）
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current() -> int:
+        """当前进程的RSS（字节）"""
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            # macOS上ru_maxrss的单位是字节，Linux上是KB
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return usage if sys.platform == 'darwin' else usage * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+        return False
+
+
+def measure(name: str, func, units: int, repeat: int) -> dict:
+    """重复运行一个阶段，返回耗时、吞吐量和峰值内存"""
+    runs = []
+    peak = 0
+    for _ in range(repeat):
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            func()
+            runs.append(time.perf_counter() - start)
+        peak = max(peak, rss.peak)
+    median = statistics.median(runs)
+    result = {
+        "seconds": round(median, 4),  # 多次运行的中位数
+        "min_seconds": round(min(runs), 4),
+        "runs": [round(value, 4) for value in runs],
+        "units": units,
+        "units_per_second": round(units / median, 3) if median > 0 else None,
+        "peak_rss_mb": round(peak / 1024 / 1024, 1)
+    }
+    print(f"{name:<16} {median:8.3f}s  {result['units_per_second']} 张/秒  峰值 {result['peak_rss_mb']} MB",
+          file=sys.stderr)
+    return result
+
+
+def git_commit() -> str:
+    """当前代码的提交ID，不在git仓库中时返回None"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(previous: dict, current: dict):
+    """打印两次结果中各阶段耗时的变化"""
+    print(f"\n与 {previous.get('commit')} 比较:", file=sys.stderr)
+    for name, stage in current["stages"].items():
+        before = previous.get("stages", {}).get(name)
+        if not before:
+            continue
+        change = (stage["seconds"] - before["seconds"]) / before["seconds"] * 100 if before["seconds"] else 0
+        print(f"{name:<16} {before['seconds']:8.3f}s -> {stage['seconds']:8.3f}s  ({change:+.1f}%)  "
+              f"内存 {before['peak_rss_mb']} -> {stage['peak_rss_mb']} MB", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PPT/PDF转Word的性能基准测试")
+    parser.add_argument('--slides', type=int, default=30, help="合成PPTX的幻灯片数量，0表示跳过PPTX")
+    parser.add_argument('--pages', type=int, default=30, help="合成PDF的页数，0表示跳过PDF")
+    parser.add_argument('--paragraphs', type=int, default=4, help="每张幻灯片/每页的段落数")
+    parser.add_argument('--words', type=int, default=30, help="每个段落的词数")
+    parser.add_argument('--images', type=int, default=1, help="每张幻灯片/每页包含文字的图片数量")
+    parser.add_argument('--scanned', type=int, default=0, help="PDF中扫描页（无文本层）的数量")
+    parser.add_argument('--no-logo', action='store_true', help="PPTX中不放置重复的徽标图片")
+    parser.add_argument('--latency', type=float, default=0.0, help="桩模型每次调用的延迟（秒）")
+    parser.add_argument('--repeat', type=int, default=3, help="每个阶段重复运行的次数")
+    parser.add_argument('--seed', type=int, default=0, help="合成内容的随机种子")
+    parser.add_argument('--warm-cache', action='store_true', help="保留OCR/AI缓存和增量转换（默认全部关闭）")
+    parser.add_argument('--input', action='append', default=[], help="额外测试的真实文件，可重复指定")
+    parser.add_argument('--output', help="结果JSON的保存路径（默认输出到标准输出）")
+    parser.add_argument('--compare', help="与之前保存的结果JSON比较")
+    parser.add_argument('--keep', action='store_true', help="保留临时目录中的合成文件和生成的文档")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='ppt2word-bench-')
+
+    # 必须在导入src之前设置，src中的模块在导入时读取配置
+    os.environ['AI_MODEL_TYPE'] = 'stub'
+    os.environ['AI_STUB_LATENCY'] = str(args.latency)
+    os.environ['OUTPUT_DIR'] = os.path.join(workdir, 'output')
+    os.environ['CACHE_DIR'] = os.path.join(workdir, 'cache')
+    if not args.warm_cache:
+        os.environ['LLM_CACHE_ENABLED'] = '0'
+        os.environ['OCR_CACHE_ENABLED'] = '0'
+        os.environ['INCREMENTAL_ENABLED'] = '0'
+
+    from src.ppt_processor import extract_structured_content
+    from src.pdf_processor import extract_text_from_pdf
+    from src.word_generator import create_word_document
+    from src.converter import convert_file
+    from src.ocr import get_ocr_stats
+
+    inputs = []  # (名称, 文件路径)
+    if args.slides:
+        path = os.path.join(workdir, 'synthetic.pptx')
+        synthetic.make_pptx(path, slides=args.slides, paragraphs=args.paragraphs, words=args.words,
+                            images=args.images, logo=not args.no_logo, seed=args.seed)
+        inputs.append(('pptx', path))
+    if args.pages:
+        path = os.path.join(workdir, 'synthetic.pdf')
+        synthetic.make_pdf(path, pages=args.pages, paragraphs=args.paragraphs, words=args.words,
+                           images=args.images, scanned=args.scanned, seed=args.seed)
+        inputs.append(('pdf', path))
+    for path in args.input:
+        inputs.append((os.path.basename(path), path))
+
+    stages = {}
+    try:
+        for name, path in inputs:
+            is_pdf = path.lower().endswith('.pdf')
+            extract = extract_text_from_pdf if is_pdf else extract_structured_content
+            content = extract(path)  # 预热（启动OCR进程池等），同时为Word生成阶段准备输入
+            units = len(content)
+            filename = os.path.basename(path)
+            stages[f"{name}_extract"] = measure(f"{name}_extract", lambda: extract(path), units, args.repeat)
+            stages[f"{name}_docx"] = measure(
+                f"{name}_docx", lambda: create_word_document(content, filename), units, args.repeat
+            )
+            stages[f"{name}_convert"] = measure(
+                f"{name}_convert", lambda: convert_file(path, filename), units, args.repeat
+            )
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss  # OCR子进程的峰值内存
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'keep')},
+        "stages": stages,
+        "ocr": get_ocr_stats(),
+        "children_peak_rss_mb": round(children / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    }
+    if args.keep:
+        result["workdir"] = workdir
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), result)
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""启动基准测试：测量Web进程的冷启动时间和第一个请求的延迟
+
+用法（在 ppt-to-word-ai 目录下运行）:
+    python -m benchmarks.startup --slides 10 --latency 0.1 --output startup.json
+
+每种模式在新的Python进程中运行，互不影响：
+    cold  不预热，第一个转换请求需要导入转换依赖、启动OCR进程池并创建模型客户端
+    warm  先执行 src.warmup 中的 preload() 和 warm_worker()（与gunicorn.conf.py的钩子相同），再处理请求
+分别记录导入应用、预热、第一个 /api/status、第一个和第二个转换任务的耗时
+"""
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于设置环境变量
+import sys  # 用于启动子进程和输出
+import json  # 结果以JSON格式输出
+import time  # 用于计时
+import shutil  # 用于清理临时目录
+import argparse  # 命令行参数解析
+import tempfile  # 存放合成文件和输出文件的临时目录
+import subprocess  # 每种模式在新的进程中运行
+from . import synthetic  # 合成输入文件生成器
+
+MODES = ('cold', 'warm')
+
+
+def _wait(client, status_url: str, timeout: float = 600) -> dict:
+    """轮询任务状态直到任务结束"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(status_url).get_json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise TimeoutError(f"任务超时: {status_url}")
+
+
+def _convert(client, path: str) -> float:
+    """通过 /process 上传一个文件并等待转换完成，返回耗时"""
+    started = time.perf_counter()
+    with open(path, 'rb') as f:
+        response = client.post('/process', data={'file': (f, os.path.basename(path))},
+                               content_type='multipart/form-data')
+    job = _wait(client, response.get_json()["status_url"])
+    if job["status"] != "completed":
+        raise RuntimeError(f"转换失败: {job.get('details')}")
+    return time.perf_counter() - started
+
+
+def run_child(mode: str, inputs: list) -> dict:
+    """在当前（新启动的）进程中测量一种模式"""
+    result = {}
+    started = time.perf_counter()
+    from src.main import app
+    result["import_app"] = time.perf_counter() - started
+
+    if mode == 'warm':
+        from src.warmup import preload, warm_worker
+        started = time.perf_counter()
+        preload()
+        warm_worker()
+        result["warmup"] = time.perf_counter() - started
+
+    client = app.test_client()
+    started = time.perf_counter()
+    client.get('/api/status')
+    result["first_status"] = time.perf_counter() - started
+    result["first_convert"] = _convert(client, inputs[0])
+    result["second_convert"] = _convert(client, inputs[1])
+    return {name: round(value, 4) for name, value in result.items()}
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Web进程冷启动和第一个请求延迟的基准测试")
+    parser.add_argument('--slides', type=int, default=10, help="合成PPTX的幻灯片数量")
+    parser.add_argument('--images', type=int, default=1, help="每张幻灯片包含文字的图片数量")
+    parser.add_argument('--latency', type=float, default=0.0, help="桩模型每次调用的延迟（秒）")
+    parser.add_argument('--output', help="结果JSON的保存路径（默认输出到标准输出）")
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--inputs', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.inputs)))
+        return None
+
+    workdir = tempfile.mkdtemp(prefix='ppt2word-startup-')
+    try:
+        # 两个内容不同的文件，第二次转换不会命中第一次的缓存
+        inputs = []
+        for seed in (1, 2):
+            path = os.path.join(workdir, f'synthetic_{seed}.pptx')
+            synthetic.make_pptx(path, slides=args.slides, images=args.images, seed=seed)
+            inputs.append(path)
+
+        # 必须在导入src之前设置，src中的模块在导入时读取配置
+        env = dict(os.environ)
+        env.update({
+            'AI_MODEL_TYPE': 'stub',
+            'AI_STUB_LATENCY': str(args.latency),
+            'INPUT_DIR': os.path.join(workdir, 'input'),
+            'OUTPUT_DIR': os.path.join(workdir, 'output'),
+            'CACHE_DIR': os.path.join(workdir, 'cache'),
+            'LLM_CACHE_ENABLED': '0',
+            'OCR_CACHE_ENABLED': '0',
+            'INCREMENTAL_ENABLED': '0'
+        })
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        modes = {}
+        for mode in MODES:
+            output = subprocess.check_output(
+                [sys.executable, '-m', 'benchmarks.startup', '--child', mode, '--inputs', *inputs],
+                cwd=root, env=env
+            )
+            modes[mode] = json.loads(output.decode().strip().splitlines()[-1])
+            print(f"{mode:<5} {modes[mode]}", file=sys.stderr)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {"params": {"slides": args.slides, "images": args.images, "latency": args.latency}, "modes": modes}
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# 导入必要的库和模块
+import io  # 用于在内存中生成图片
+import random  # 使用固定种子生成确定性的内容
+from PIL import Image, ImageDraw  # 生成包含文字的图片
+
+# 生成文本使用的词汇（中英混合，接近真实课件）
+_WORDS = [
+    "数据", "结构", "算法", "复杂度", "系统", "模型", "网络", "函数", "变量", "实验",
+    "分析", "方法", "原理", "过程", "结果", "定义", "性质", "证明", "应用", "示例",
+    "data", "model", "input", "output", "network", "layer", "vector", "matrix", "graph", "node"
+]
+# 绘制在图片上的英文文字（OCR默认字体只能可靠识别ASCII字符）
+_IMAGE_WORDS = [
+    "system", "input", "output", "layer", "process", "result", "method", "vector",
+    "matrix", "signal", "control", "module", "server", "client", "memory", "cache"
+]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    """生成一个由words个词组成的句子"""
+    return " ".join(rng.choice(_WORDS) for _ in range(words)) + "。"
+
+
+def text_image(rng: random.Random, width: int = 800, height: int = 400, lines: int = 6) -> bytes:
+    """生成一张白底黑字、包含若干行文字的PNG图片，模拟课件中的截图和图表"""
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    line_height = height // (lines + 1)
+    for line in range(lines):
+        text = " ".join(rng.choice(_IMAGE_WORDS) for _ in range(6))
+        draw.text((20, 10 + line * line_height), text, fill='black')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def logo_image() -> bytes:
+    """生成每张幻灯片都重复出现的徽标图片（用于测试装饰图片过滤）"""
+    image = Image.new('RGB', (160, 60), (30, 80, 160))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((10, 10, 50, 50), fill='white')
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def make_pptx(path: str, slides: int = 20, paragraphs: int = 4, words: int = 30,
+              images: int = 1, logo: bool = True, seed: int = 0) -> str:
+    """生成一个合成的PPTX文件
+
+    参数:
+        path: 输出文件路径
+        slides: 幻灯片数量
+        paragraphs: 每张幻灯片的段落数（文本密度）
+        words: 每个段落的词数
+        images: 每张幻灯片包含文字的图片数量
+        logo: 是否在每张幻灯片上放置相同的徽标
+        seed: 随机种子，相同参数生成完全相同的文件
+
+    返回:
+        输出文件路径
+    """
+    from pptx import Presentation  # 用于生成PPT文件
+    from pptx.util import Inches  # PPT中的长度单位
+
+    rng = random.Random(seed)
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]  # 标题和内容版式
+    logo_blob = logo_image() if logo else None
+    for number in range(1, slides + 1):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f"第{number}节 {sentence(rng, 3)}"
+        body = slide.placeholders[1].text_frame
+        body.text = sentence(rng, words)
+        for _ in range(paragraphs - 1):
+            body.add_paragraph().text = sentence(rng, words)
+        for index in range(images):
+            slide.shapes.add_picture(
+                io.BytesIO(text_image(rng)), Inches(1 + index * 0.5), Inches(4), width=Inches(4)
+            )
+        if logo_blob:
+            slide.shapes.add_picture(io.BytesIO(logo_blob), Inches(8), Inches(0.2), width=Inches(1.5))
+    presentation.save(path)
+    return path
+
+
+def make_pdf(path: str, pages: int = 20, paragraphs: int = 4, words: int = 30,
+             images: int = 1, scanned: int = 0, seed: int = 0) -> str:
+    """生成一个合成的PDF文件
+
+    参数:
+        path: 输出文件路径
+        pages: 页数
+        paragraphs: 每页的段落数（文本密度）
+        words: 每个段落的词数
+        images: 每页嵌入的包含文字的图片数量
+        scanned: 其中扫描页（整页只有一张图片、没有文本层）的数量，均匀分布在文档中
+        seed: 随机种子，相同参数生成完全相同的文件
+
+    返回:
+        输出文件路径
+    """
+    import fitz  # PyMuPDF，用于生成PDF文件
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    # 扫描页的位置均匀分布
+    scanned_pages = set()
+    if scanned:
+        step = pages / float(scanned)
+        scanned_pages = {int(index * step) for index in range(scanned)}
+    for number in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        if number in scanned_pages:
+            blob = text_image(rng, width=1240, height=1754, lines=30)
+            page.insert_image(page.rect, stream=blob)
+            continue
+        # PDF内置字体不支持中文，文本层使用英文词汇
+        text = "\n\n".join(
+            " ".join(rng.choice(_IMAGE_WORDS) for _ in range(words)) for _ in range(paragraphs)
+        )
+        page.insert_textbox(fitz.Rect(50, 50, 545, 500), text, fontsize=10)
+        for index in range(images):
+            top = 520 + index * 20
+            page.insert_image(fitz.Rect(50, top, 400, top + 175), stream=text_image(rng))
+    doc.save(path)
+    doc.close()
+    return path
@@ -0,0 +1,29 @@
+# Gunicorn配置：gunicorn -c gunicorn.conf.py src.main:app
+#
+# 启用预热（WARMUP=1，默认）时：
+#   master进程先导入应用（preload_app），在开始创建worker之前导入转换依赖并加载Word模板，
+#   worker通过fork共享这些模块；每个worker在开始处理请求之前启动OCR进程池、创建模型客户端。
+# WARMUP=0 时只导入处理请求所需的轻量模块，转换依赖在第一次转换时才导入
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 300))
+# 任务状态保存在worker的内存中，因此只使用一个worker；并发由线程和 MAX_CONCURRENT_JOBS 控制
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+preload_app = os.getenv('WARMUP', '1') == '1'
+
+
+def when_ready(server):
+    """master进程就绪、创建worker之前调用"""
+    if preload_app:
+        from src.warmup import preload
+        preload()
+
+
+def post_fork(server, worker):
+    """worker进程创建之后、开始处理请求之前调用"""
+    if preload_app:
+        from src.warmup import warm_worker
+        warm_worker()
@@ -1,17 +1,81 @@
 # 导入必要的库和模块
 import os  # 操作系统相关功能，用于获取环境变量
 import re  # 正则表达式库，用于文本处理
+import hashlib  # 用于计算缓存键
+import logging  # 记录错误和回退信息
+import threading  # 线程锁，保证缓存只初始化一次
+from .llm_router import get_router  # 多服务商路由：故障转移、退避重试、自适应并发和对冲请求
+from .disk_cache import DiskCache, CACHE_DIR  # 持久化的内容寻址缓存
+from .metrics import Counter, ERRORS  # 缓存和错误指标
 
-# 根据配置动态导入模型SDK
-try:
-    import google.generativeai as genai  # Google Gemini AI接口
-except ImportError:
-    genai = None
+logger = logging.getLogger(__name__)
 
-try:
-    from volcenginesdkarkruntime import Ark  # 火山引擎大模型SDK
-except ImportError:
-    Ark = None
+# 提示词模板版本号，修改下方提示词时需要同时递增，使旧的缓存结果失效
+PROMPT_VERSION = "zh-v1"
+
+# AI输出缓存配置
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'  # 是否启用缓存
+LLM_CACHE_MAX_MB = float(os.getenv('LLM_CACHE_MAX_MB', 200))  # 缓存总大小上限（MB）
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv('LLM_CACHE_MAX_AGE_DAYS', 30))  # 缓存最长保存天数
+
+# 批量模式下每部分输出的最大标记数，以及单次请求的输出上限
+BATCH_OUTPUT_TOKENS_PER_PART = int(os.getenv('AI_BATCH_OUTPUT_TOKENS_PER_PART', 2048))
+BATCH_MAX_OUTPUT_TOKENS = int(os.getenv('AI_BATCH_MAX_OUTPUT_TOKENS', 8192))
+
+# 批量模式的输出分隔行，例如 "===第2部分==="
+BATCH_SEPARATOR_PATTERN = re.compile(r'^\s*=+\s*第\s*(\d+)\s*部分\s*=+\s*$', re.MULTILINE)
+
+# 生成失败时返回的文本以该标记开头，调用方据此避免把错误结果当作正常内容保存
+GENERATION_ERROR_MARKER = "AI内容生成错误"
+
+# AI输出缓存的查询结果（hit / miss）
+LLM_CACHE_LOOKUPS = Counter('ppt2word_llm_cache_lookups_total', 'AI输出缓存的查询次数', labels=('result',))
+
+class BatchSplitError(ValueError):
+    """批量请求的输出无法按部分拆分"""
+
+_llm_cache = None  # 进程内共享的缓存实例
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """获取AI输出缓存，缓存未启用或无法创建时返回None"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            try:
+                _llm_cache = DiskCache(
+                    os.path.join(CACHE_DIR, 'llm_cache.sqlite3'),
+                    max_bytes=int(LLM_CACHE_MAX_MB * 1024 * 1024),
+                    max_age=LLM_CACHE_MAX_AGE_DAYS * 86400
+                )
+            except Exception as e:
+                logger.warning(f"AI输出缓存初始化失败，已禁用缓存: {e}")
+                return None
+        return _llm_cache
+
+def _cache_get(cache, cache_key: str):
+    """查询AI输出缓存；缓存出错（例如数据库被锁、磁盘已满）时记录错误并按未命中处理"""
+    try:
+        return cache.get(cache_key)
+    except Exception as e:
+        ERRORS.inc(stage='llm_cache')
+        logger.warning(f"读取AI输出缓存出错: {e}")
+        return None
+
+def _cache_set(cache, cache_key: str, value: str):
+    """写入AI输出缓存；出错时只记录错误，已生成的结果照常返回"""
+    try:
+        cache.set(cache_key, value)
+    except Exception as e:
+        ERRORS.inc(stage='llm_cache')
+        logger.warning(f"写入AI输出缓存出错: {e}")
+
+def llm_cache_key(clean_content: str, model_id: str) -> str:
+    """计算AI输出的缓存键：清理后文本 + 模型ID + 提示词模板版本"""
+    raw = f"{PROMPT_VERSION}\x00{model_id}\x00{clean_content}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
 
 def clean_extracted_text(text: str) -> str:
     """清理和规范化提取的文本 - 根据反馈改进
@@ -46,47 +110,19 @@ def clean_extracted_text(text: str) -> str:
     
     return '\n'.join(clean_lines)
 
-def generate_explanation(content: str) -> str:
-    """根据配置使用AI大模型生成格式化的学术解释
+def build_prompt(content_block: str) -> str:
+    """根据待处理内容构建发送给AI的提示词
     
     参数:
-        content: 从PPT或PDF中提取的原始内容
+        content_block: 清理后的幻灯片内容（批量模式下为多张幻灯片带分隔标记的内容）
         
     返回:
-        AI生成的格式化学术解释文本
+        完整的提示词
     """
-    # 获取模型类型配置
-    model_type = os.getenv('AI_MODEL_TYPE', 'gemini')  # 默认使用Gemini模型
-    
-    # 根据模型类型选择相应的API
-    if model_type.lower() == 'gemini' and genai is not None:
-        # 配置Gemini模型
-        api_key = os.getenv('GEMINI_API_KEY')  # 从环境变量获取API密钥
-        if not api_key:
-            raise ValueError("环境变量中未设置GEMINI_API_KEY")  # 如果未设置API密钥则抛出错误
-        
-        # 使用API密钥配置Gemini
-        genai.configure(api_key=api_key)  # 配置API密钥
-        model = genai.GenerativeModel('gemini-2.5-flash')  # 创建生成式模型实例
-    elif model_type.lower() == 'volcengine' and Ark is not None:
-        # 配置火山引擎大模型
-        api_key = os.getenv('ARK_API_KEY')
-        model=os.getenv('model_id')  # 从环境变量获取API密钥
-        if not api_key:
-            raise ValueError("环境变量中未设置ARK_API_KEY")  # 如果未设置API密钥则抛出错误
-        
-        # 使用API密钥配置火山引擎大模型
-        client = Ark(api_key=api_key)  # 创建火山引擎大模型客户端
-    else:
-        raise ValueError(f"不支持的模型类型: {model_type} 或所需SDK未安装")
-    
-    # 首先清理内容
-    clean_content = clean_extracted_text(content)  # 清理和规范化提取的文本
-    
 #     prompt = f"""Eres un experto en crear material didáctico académico de alta calidad en ESPAÑOL.
 
 # CONTENIDO A PROCESAR:
-# {clean_content}
+# {content_block}
 
 # INSTRUCCIONES CRÍTICAS PARA EXCELENCIA ACADÉMICA:
 
@@ -147,7 +183,7 @@ def generate_explanation(content: str) -> str:
     prompt = f"""你是一个精通创建高质量初中学科教学材料的专家。
 
 待处理的内容：
-{clean_content}
+{content_block}
 
 指令：
 🎯 目标：将原始PPT内容转化为一个结构化、专业、且真正有用的学习文档。
@@ -187,32 +223,173 @@ def generate_explanation(content: str) -> str:
 
 请根据上述所有指令，生成一份基于所提供内容的，完整且教学严谨的学术参考文档。
 """
+    return prompt
+
+def generate_explanation(content: str) -> str:
+    """根据配置使用AI大模型生成格式化的学术解释
+    
+    参数:
+        content: 从PPT或PDF中提取的原始内容
+        
+    返回:
+        AI生成的格式化学术解释文本
+    """
+    # 按 AI_PROVIDERS（未设置时为 AI_MODEL_TYPE）路由到各服务商的共享客户端
+    router = get_router()
+    
+    # 首先清理内容
+    clean_content = clean_extracted_text(content)  # 清理和规范化提取的文本
+    
+    prompt = build_prompt(clean_content)
 
+    # 内容完全相同的幻灯片直接返回缓存结果，不再调用模型
+    cache = get_llm_cache()
+    cache_key = llm_cache_key(clean_content, router.model_key())
+    if cache is not None:
+        cached = _cache_get(cache, cache_key)
+        LLM_CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+    
     try:
-        # 根据模型类型调用相应的API
-        if model_type.lower() == 'gemini':
-            # 调用Gemini模型生成内容
-            response = model.generate_content(
-                prompt,  # 提示词
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.3,  # 较低的温度值，使输出更保守、更可预测，适合学术内容
-                    max_output_tokens=2048,  # 最大输出标记数
-                    top_p=0.9  # 控制输出多样性的参数
-                )
-            )
-            return response.text  # 返回生成的文本
-        elif model_type.lower() == 'volcengine':
-            # 调用火山引擎大模型生成内容
-            response = client.chat.completions.create(
-                model = os.getenv('model_id'),
-                messages=[
-                    {"role": "user", "content":f"{prompt}"}
-                ],
-                thinking={"type": "disabled"},
-                temperature=0.3,  # 较低的温度值，使输出更保守、更可预测，适合学术内容
-                top_p=0.9  # 控制输出多样性的参数
-            )
-            return response.choices[0].message.content  # 返回生成的文本
+        # 调用模型生成内容（路由负责按服务商限流、重试和故障转移）
+        result = router.generate(prompt, mode='single')
     except Exception as e:
         # 错误处理机制
-        return f"AI内容生成错误: {str(e)}\n\n原始内容:\n{clean_content}"  # 返回错误信息和原始内容
\ No newline at end of file
+        ERRORS.inc(stage='llm')
+        logger.error(f"AI内容生成失败: {e}")
+        return f"{GENERATION_ERROR_MARKER}: {str(e)}\n\n原始内容:\n{clean_content}"  # 返回错误信息和原始内容
+    if cache is not None and result:
+        _cache_set(cache, cache_key, result)  # 只缓存成功的结果
+    return result  # 返回生成的文本
+
+def generate_explanation_stream(content: str):
+    """流式生成学术解释：模型每返回一段文本就立即产出，而不是等待完整结果
+    
+    与generate_explanation使用相同的提示词和缓存；命中缓存时一次性产出完整结果，
+    生成完成后才写入缓存；出错时产出错误信息和原始内容
+    
+    参数:
+        content: 从PPT或PDF中提取的原始内容
+        
+    返回:
+        逐段产出AI生成文本的生成器
+    """
+    router = get_router()
+    clean_content = clean_extracted_text(content)  # 清理和规范化提取的文本
+    prompt = build_prompt(clean_content)
+    
+    cache = get_llm_cache()
+    cache_key = llm_cache_key(clean_content, router.model_key())
+    if cache is not None:
+        cached = _cache_get(cache, cache_key)
+        LLM_CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            yield cached
+            return
+    
+    chunks = []  # 已产出的文本片段，用于生成结束后写入缓存
+    try:
+        for chunk in router.stream(prompt):
+            if chunk:
+                chunks.append(chunk)
+                yield chunk
+    except Exception as e:
+        # 错误处理机制：已输出的部分保留，后面追加错误信息
+        ERRORS.inc(stage='llm')
+        logger.error(f"AI内容流式生成失败: {e}")
+        yield f"\n\n{GENERATION_ERROR_MARKER}: {str(e)}\n\n原始内容:\n{clean_content}"
+        return
+    if cache is not None and chunks:
+        _cache_set(cache, cache_key, "".join(chunks))  # 只缓存完整成功的结果
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的标记数：中日韩字符约每字1个标记，其他字符约每4个1个标记"""
+    cjk = len(re.findall(r'[\u3000-\u9fff\uff00-\uffef]', text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def split_batch_response(response: str, count: int) -> list:
+    """按分隔行把批量请求的输出拆分为各部分
+    
+    参数:
+        response: 模型返回的完整文本
+        count: 期望的部分数量
+        
+    返回:
+        按部分顺序排列的文本列表；分隔行缺失、重复或顺序不对时抛出BatchSplitError
+    """
+    matches = list(BATCH_SEPARATOR_PATTERN.finditer(response))
+    numbers = [int(match.group(1)) for match in matches]
+    if numbers != list(range(1, count + 1)):
+        raise BatchSplitError(f"批量输出分隔标记不完整: 期望{count}部分，实际为{numbers}")
+    
+    parts = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(response)
+        part = response[match.end():end].strip()
+        if not part:
+            raise BatchSplitError(f"批量输出的第{i + 1}部分为空")
+        parts.append(part)
+    return parts
+
+def generate_batch_explanations(contents: list) -> list:
+    """把多张幻灯片打包到一次AI请求中，生成各自的学术解释
+    
+    提示词中的指令只出现一次，各幻灯片的内容用【第N部分】标记分隔，
+    要求模型在每部分输出前写一行 ===第N部分===，再按分隔行拆分回每张幻灯片。
+    已缓存的幻灯片不会发送；拆分失败或请求出错时回退为逐张调用generate_explanation
+    
+    参数:
+        contents: 多张幻灯片的原始内容（与generate_explanation的参数相同）
+        
+    返回:
+        与contents一一对应的AI生成文本列表
+    """
+    router = get_router()
+    model_key = router.model_key()
+    cache = get_llm_cache()
+    
+    results = [None] * len(contents)
+    missing = []  # (下标, 清理后内容, 缓存键)
+    for index, content in enumerate(contents):
+        clean_content = clean_extracted_text(content)
+        cache_key = llm_cache_key(clean_content, model_key)
+        cached = _cache_get(cache, cache_key) if cache is not None else None
+        if cached is not None:
+            LLM_CACHE_LOOKUPS.inc(result='hit')
+            results[index] = cached
+        else:
+            missing.append((index, clean_content, cache_key))
+    
+    if len(missing) == 1:
+        index = missing[0][0]
+        results[index] = generate_explanation(contents[index])
+    elif missing:
+        if cache is not None:
+            LLM_CACHE_LOOKUPS.inc(len(missing), result='miss')
+        # 指令只出现一次，各部分内容用标记分隔
+        content_block = "\n\n".join(
+            f"【第{number}部分】\n{clean_content}"
+            for number, (_, clean_content, _) in enumerate(missing, start=1)
+        )
+        prompt = build_prompt(content_block) + (
+            f"\n批量输出要求：\n"
+            f"- 以上内容共{len(missing)}部分，请对每一部分分别按上述要求生成文档。\n"
+            f"- 每一部分的输出之前单独一行写上分隔标记，例如 ===第1部分===、===第2部分===，不要省略或合并。\n"
+        )
+        max_output_tokens = min(BATCH_MAX_OUTPUT_TOKENS, BATCH_OUTPUT_TOKENS_PER_PART * len(missing))
+        try:
+            response = router.generate(prompt, max_output_tokens=max_output_tokens, mode='batch')
+            parts = split_batch_response(response or "", len(missing))
+        except Exception as e:
+            # 拆分失败或请求出错：回退为逐张调用
+            ERRORS.inc(stage='llm_batch')
+            logger.warning(f"批量生成失败，回退为逐张生成: {e}")
+            for index, _, _ in missing:
+                results[index] = generate_explanation(contents[index])
+            return results
+        for (index, _, cache_key), part in zip(missing, parts):
+            results[index] = part
+            if cache is not None:
+                _cache_set(cache, cache_key, part)
+    return results
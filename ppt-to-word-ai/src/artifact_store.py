@@ -0,0 +1,276 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于移动和删除文件
+import time  # 用于记录产物的创建和访问时间
+import uuid  # 用于生成不可猜测的下载键
+import hashlib  # 计算产物内容的哈希值
+import logging  # 记录淘汰时的错误
+import sqlite3  # 产物索引使用的本地SQLite数据库
+import tempfile  # 生成中的文件先写入暂存目录
+import threading  # 每个线程使用独立的数据库连接
+import zipfile  # Word文档和压缩包按解压后的内容计算哈希
+from .metrics import register_collector  # 产物占用的磁盘空间指标
+
+logger = logging.getLogger(__name__)
+
+# 生成文件的根目录（与word_generator一致），产物存放在其中的 artifacts 子目录
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', '/app/assets/output')
+ARTIFACT_DIR = os.getenv('ARTIFACT_DIR', os.path.join(OUTPUT_DIR, 'artifacts'))
+# 产物的保存时间（秒），超时后不再能下载并被删除
+ARTIFACT_TTL_SECONDS = int(os.getenv('ARTIFACT_TTL_SECONDS', 24 * 3600))
+# 产物占用磁盘的总大小上限（MB），超出时从最久未下载的产物开始删除，0表示不限制
+ARTIFACT_MAX_MB = float(os.getenv('ARTIFACT_MAX_MB', 2048))
+
+_CHUNK_SIZE = 1024 * 1024  # 计算哈希时每次读取的字节数
+_EVICT_INTERVAL = 60  # 下载时最多每隔这么多秒执行一次淘汰
+_STAGING_MAX_AGE = 24 * 3600  # 暂存文件超过这么多秒未修改视为遗留文件（进程异常退出时留下）
+
+
+def content_digest(path: str) -> str:
+    """计算文件内容的SHA-256哈希值
+
+    Word文档（docx）和压缩包中每个条目都带有写入时间，内容相同的两次转换得到的文件字节并不相同；
+    因此zip格式的文件按条目名称和解压后的内容计算哈希，其他文件按原始字节计算
+    """
+    digest = hashlib.sha256()
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                digest.update(info.filename.encode('utf-8') + b'\0')
+                with archive.open(info) as member:
+                    for chunk in iter(lambda: member.read(_CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                digest.update(b'\0')
+    else:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """生成文件（Word文档、批量压缩包）的存储，线程安全
+
+    每次转换得到一个唯一的下载键，不同用户上传同名文件不会互相覆盖；
+    内容相同的产物只在磁盘上保存一份（按内容哈希去重），下载时以哈希值作为ETag。
+    产物超过保存时间或总大小超过上限时按最近下载时间（LRU）淘汰，不再被引用的文件随之删除
+    """
+
+    def __init__(self, directory: str, ttl: float = 0, max_bytes: int = 0):
+        """
+        参数:
+            directory: 存储目录，文件保存在 blobs/ 下，索引保存在 index.db 中
+            ttl: 产物保存秒数，0表示永不过期
+            max_bytes: 文件总字节数上限，0表示不限制
+        """
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, 'blobs')
+        self.staging_dir = os.path.join(directory, 'staging')
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._local = threading.local()  # 每个线程一个连接（sqlite3连接不能跨线程共享）
+        self._last_evict = 0.0  # 上一次淘汰的时间
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "digest TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "key TEXT PRIMARY KEY, digest TEXT NOT NULL, download_name TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_accessed ON artifacts (accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_digest ON artifacts (digest)")
+        conn.commit()
+        self.evict()  # 清理上次运行期间过期的产物和遗留的暂存文件
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, 'index.db'), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def staging_path(self, suffix: str = '') -> str:
+        """在暂存目录中创建一个空文件并返回其路径，生成的文件写入这里后再交给 put
+
+        暂存目录与存储目录位于同一文件系统，put 时只需重命名，不需要复制
+        """
+        fd, path = tempfile.mkstemp(dir=self.staging_dir, suffix=suffix)
+        os.close(fd)
+        return path
+
+    def put(self, path: str, download_name: str) -> str:
+        """保存一个生成的文件，返回新的下载键
+
+        内容已存在时直接引用已有的文件并删除传入的文件，否则把文件移动到存储目录
+
+        参数:
+            path: 生成的文件路径（调用后不再存在）
+            download_name: 用户下载时看到的文件名
+
+        返回:
+            下载键
+        """
+        key = uuid.uuid4().hex
+        now = time.time()
+        try:
+            digest = content_digest(path)
+            extension = os.path.splitext(download_name)[1].lower()
+            blob_path = os.path.join(self.blob_dir, digest[:2], digest + extension)
+
+            conn = self._conn()
+            with conn:
+                # 在同一个事务中检查并登记文件，避免与淘汰同时进行时删掉刚被引用的文件
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone():
+                    os.remove(path)
+                else:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(path, blob_path)
+                    conn.execute(
+                        "INSERT INTO blobs (digest, path, size) VALUES (?, ?, ?)",
+                        (digest, blob_path, os.path.getsize(blob_path))
+                    )
+                conn.execute(
+                    "INSERT INTO artifacts (key, digest, download_name, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, digest, download_name, now, now)
+                )
+        finally:
+            # 保存失败（例如计算哈希或写入索引出错）时删除传入的文件，不在暂存目录中遗留
+            if os.path.exists(path):
+                os.remove(path)
+        self.evict(keep=key)
+        return key
+
+    def get(self, key: str):
+        """查找下载键对应的文件
+
+        返回:
+            {"path", "download_name", "digest", "size", "created_at"} 字典，不存在或已过期时返回None
+        """
+        now = time.time()
+        if now - self._last_evict > _EVICT_INTERVAL:
+            self.evict()  # 没有新的上传时，过期的产物也会随下载请求被删除
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT blobs.path, artifacts.download_name, artifacts.digest, blobs.size, artifacts.created_at "
+            "FROM artifacts JOIN blobs ON blobs.digest = artifacts.digest WHERE artifacts.key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        path, download_name, digest, size, created_at = row
+        if self.ttl and now - created_at > self.ttl:
+            return None  # 已过期
+        # 更新访问时间，用于LRU淘汰
+        with conn:
+            conn.execute("UPDATE artifacts SET accessed_at = ? WHERE key = ?", (now, key))
+        return {"path": path, "download_name": download_name, "digest": digest, "size": size,
+                "created_at": created_at}
+
+    def evict(self, keep: str = None):
+        """删除过期的产物和遗留的暂存文件；总大小超过上限时从最久未下载的产物开始删除
+
+        参数:
+            keep: 不参与大小淘汰的下载键（刚保存的产物，即使单个文件就超过上限也保留）
+        """
+        self._last_evict = time.time()
+        self._remove_stale_staging()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if self.ttl:
+                conn.execute("DELETE FROM artifacts WHERE created_at < ?", (time.time() - self.ttl,))
+            if self.max_bytes:
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM blobs "
+                    "WHERE digest IN (SELECT digest FROM artifacts)"
+                ).fetchone()[0]
+                if total > self.max_bytes:
+                    rows = conn.execute(
+                        "SELECT key, digest FROM artifacts WHERE key != ? ORDER BY accessed_at ASC", (keep or '',)
+                    ).fetchall()
+                    sizes = dict(conn.execute("SELECT digest, size FROM blobs").fetchall())
+                    references = dict(conn.execute(
+                        "SELECT digest, COUNT(*) FROM artifacts GROUP BY digest"
+                    ).fetchall())
+                    stale = []
+                    for key, digest in rows:
+                        if total <= self.max_bytes:
+                            break
+                        stale.append((key,))
+                        references[digest] -= 1
+                        if references[digest] == 0:
+                            total -= sizes.get(digest, 0)  # 最后一个引用被删除时文件才会被删除
+                    conn.executemany("DELETE FROM artifacts WHERE key = ?", stale)
+            # 不再被任何产物引用的文件
+            orphans = conn.execute(
+                "SELECT digest, path FROM blobs WHERE digest NOT IN (SELECT digest FROM artifacts)"
+            ).fetchall()
+            conn.executemany("DELETE FROM blobs WHERE digest = ?", [(digest,) for digest, _ in orphans])
+            # 在事务提交之前删除文件：此时其他线程的 put 在等待写锁，不会重新登记同一个文件
+            for _, path in orphans:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"删除产物文件 {path} 时出错: {e}")
+
+    def _remove_stale_staging(self):
+        """删除长时间未修改的暂存文件（进程在转换过程中异常退出时留下的）"""
+        cutoff = time.time() - _STAGING_MAX_AGE
+        for name in os.listdir(self.staging_dir):
+            path = os.path.join(self.staging_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除暂存文件 {path} 时出错: {e}")
+
+    def stats(self) -> dict:
+        """当前的产物数量、文件数量和占用的字节数"""
+        conn = self._conn()
+        artifacts = conn.execute("SELECT COUNT(*) FROM artifacts").fetchone()[0]
+        blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        return {"artifacts": artifacts, "blobs": blobs, "bytes": size}
+
+
+_store = None  # 进程内共享的产物存储（首次使用时创建）
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """获取（必要时创建）进程内共享的产物存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore(
+                ARTIFACT_DIR, ttl=ARTIFACT_TTL_SECONDS, max_bytes=int(ARTIFACT_MAX_MB * 1024 * 1024)
+            )
+        return _store
+
+
+def _collect_metrics():
+    """产物存储的Prometheus指标（存储尚未使用时不输出）"""
+    if _store is None:
+        return []
+    stats = _store.stats()
+    return [
+        ("ppt2word_artifacts", "gauge", "可下载的产物数量", stats["artifacts"]),
+        ("ppt2word_artifact_blobs", "gauge", "去重后磁盘上的产物文件数量", stats["blobs"]),
+        ("ppt2word_artifact_bytes", "gauge", "产物文件占用的字节数", stats["bytes"]),
+    ]
+
+
+register_collector(_collect_metrics)
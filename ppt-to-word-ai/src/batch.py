@@ -0,0 +1,286 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于遍历目录和读取配置
+import sys  # 用于命令行输出
+import json  # 报告以JSON格式保存
+import time  # 用于统计耗时
+import logging  # 记录单个文件的转换错误
+import zipfile  # 用于解压上传的压缩包和打包输出
+import shutil  # 用于清理解压的临时目录
+import argparse  # 命令行参数解析
+import tempfile  # 压缩包解压到临时目录
+from concurrent.futures import ThreadPoolExecutor, as_completed  # 并行转换多个文件
+from src.ocr import get_ocr_stats  # OCR统计数据
+from src.uploads import sniff_format  # 按文件头校验解压出的文件
+
+logger = logging.getLogger(__name__)
+
+# 支持批量转换的文件格式
+BATCH_EXTENSIONS = ('.pptx', '.ppt', '.pdf')
+# 同时转换的文件数量（每个文件内部还会并发调用AI和OCR）
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', os.getenv('MAX_CONCURRENT_JOBS', os.cpu_count() or 1)))
+# 一个批次最多包含的文件数量
+BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 500))
+# 压缩包解压后的总大小上限（MB），防止压缩炸弹
+BATCH_MAX_EXTRACT_MB = float(os.getenv('BATCH_MAX_EXTRACT_MB', 2048))
+# 批量转换报告的文件名
+REPORT_FILENAME = "批量转换报告.json"
+
+
+def collect_inputs(directory: str) -> list:
+    """递归收集目录中所有支持的文件
+
+    参数:
+        directory: 输入目录
+
+    返回:
+        文件路径列表（忽略隐藏文件和Office的临时文件 ~$xxx.pptx）
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(files):
+            if name.startswith(('.', '~$')):
+                continue
+            if name.lower().endswith(BATCH_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return paths
+
+
+def schedule_by_size(paths: list) -> list:
+    """按文件大小从大到小排序（最长处理时间优先调度），使最耗时的文件最先开始，减少最后只剩一个大文件在跑的情况"""
+    return sorted(paths, key=lambda path: os.path.getsize(path), reverse=True)
+
+
+def extract_zip(zip_path: str, target_dir: str) -> list:
+    """安全地解压压缩包中支持的文件，保留目录结构
+
+    跳过绝对路径和包含 .. 的条目，防止写到目标目录之外；
+    文件头与扩展名不符的条目会被删除并跳过；解压总大小超过 BATCH_MAX_EXTRACT_MB 时抛出ValueError
+
+    返回:
+        解压出的文件路径列表
+    """
+    paths = []
+    target_dir = os.path.realpath(target_dir)
+    with zipfile.ZipFile(zip_path) as archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(BATCH_EXTENSIONS)
+            and not os.path.basename(info.filename).startswith(('.', '~$'))
+            and not info.filename.startswith('__MACOSX/')
+        ]
+        if sum(info.file_size for info in members) > BATCH_MAX_EXTRACT_MB * 1024 * 1024:
+            raise ValueError(f"压缩包解压后超过{BATCH_MAX_EXTRACT_MB:g}MB")
+        for info in members:
+            destination = os.path.realpath(os.path.join(target_dir, info.filename))
+            if not destination.startswith(target_dir + os.sep):
+                logger.warning(f"跳过压缩包中的非法路径: {info.filename}")
+                continue
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            with archive.open(info) as source, open(destination, 'wb') as target:
+                while True:
+                    chunk = source.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+            with open(destination, 'rb') as f:
+                header = f.read(8)
+            extension = os.path.splitext(destination)[1].lower().lstrip('.')
+            if sniff_format(destination, header) != extension:
+                logger.warning(f"跳过内容与扩展名不符的文件: {info.filename}")
+                os.remove(destination)
+                continue
+            paths.append(destination)
+    return paths
+
+
+def _relative(path: str, base_dir: str) -> str:
+    """文件相对于输入根目录的路径（没有根目录时为文件名）"""
+    return os.path.relpath(path, base_dir) if base_dir else os.path.basename(path)
+
+
+def name_collisions(paths: list, base_dir: str = None) -> set:
+    """找出输出文件名会冲突的输入文件
+
+    输出文件名只取基本名，同一目录下的 a.pdf 和 a.pptx 会写到同一个Word文档，后完成的会覆盖先完成的
+
+    返回:
+        需要在输出文件名中保留扩展名的文件路径集合
+    """
+    groups = {}
+    for path in paths:
+        # 按不区分大小写比较，兼容不区分大小写的文件系统
+        stem = os.path.splitext(_relative(path, base_dir))[0].lower()
+        groups.setdefault(stem, []).append(path)
+    return {path for group in groups.values() if len(group) > 1 for path in group}
+
+
+def _convert_one(path: str, base_dir: str, output_dir: str, keep_extension: bool = False) -> dict:
+    """转换批次中的一个文件，输出目录保留其在输入目录中的相对位置
+
+    keep_extension为True时输出文件名保留原扩展名，避免与基本名相同的其他文件互相覆盖
+    """
+    # 转换流程依赖python-pptx、PyMuPDF等较重的库，在第一次转换时才导入（Web进程启动时不加载）
+    from src.converter import convert_file  # 单个文件的完整转换流程
+    from src.word_generator import output_filename, OUTPUT_DIR  # 输出文件名规则和默认输出目录
+    relative = _relative(path, base_dir)
+    target_dir = os.path.join(output_dir, os.path.dirname(relative)) if output_dir else None
+    output_path = None
+    if keep_extension:
+        directory = target_dir or OUTPUT_DIR
+        os.makedirs(directory, exist_ok=True)
+        output_path = os.path.join(directory, output_filename(os.path.basename(path), keep_extension=True))
+    result = {
+        "file": relative,
+        "size": os.path.getsize(path),
+        "units": 0,  # 幻灯片/页面数量，由转换流程通过进度回调报告
+        "status": "completed",
+        "output": None,
+        "error": None
+    }
+
+    def progress(done, total, stage=None):
+        # 转换流程在 .ppt 转换为 .pptx 之后才统计数量，直接使用它报告的总数
+        if total:
+            result["units"] = total
+
+    started = time.perf_counter()
+    try:
+        output_path = convert_file(path, os.path.basename(path), progress_callback=progress,
+                                   output_dir=target_dir, output_path=output_path)
+        result["output"] = os.path.relpath(output_path, output_dir) if output_dir else output_path
+    except Exception as e:
+        logger.error(f"批量转换 {relative} 失败: {e}")
+        result["status"] = "failed"
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def run_batch(paths: list, output_dir: str = None, base_dir: str = None, workers: int = None,
+              progress_callback=None) -> dict:
+    """并行转换一批文件，返回包含逐个文件结果和汇总信息的报告
+
+    所有文件在同一个进程中转换，共享OCR进程池、OCR/AI缓存和模型客户端；
+    同一目录下基本名相同的文件（如 a.pdf 和 a.pptx）输出时保留扩展名，不会互相覆盖
+
+    参数:
+        paths: 要转换的文件路径列表
+        output_dir: 输出目录，默认使用 OUTPUT_DIR
+        base_dir: 输入根目录，输出会保留文件相对于它的目录结构
+        workers: 同时转换的文件数量，默认 BATCH_WORKERS
+        progress_callback: 可选的进度回调 callback(done, total, stage)，每完成一个文件调用一次
+
+    返回:
+        {"summary": {...}, "files": [...]} 报告字典
+    """
+    if len(paths) > BATCH_MAX_FILES:
+        raise ValueError(f"批量转换的文件数量超过上限: {len(paths)} > {BATCH_MAX_FILES}")
+
+    paths = schedule_by_size(paths)
+    collisions = name_collisions(paths, base_dir)
+    ocr_before = get_ocr_stats()
+    started = time.perf_counter()
+    results = []
+    if progress_callback:
+        progress_callback(0, len(paths), "batch")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers or BATCH_WORKERS), thread_name_prefix='batch') as executor:
+        futures = [
+            executor.submit(_convert_one, path, base_dir, output_dir, path in collisions) for path in paths
+        ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            results.append(future.result())
+            if progress_callback:
+                progress_callback(done, len(paths), "batch")
+
+    wall_seconds = time.perf_counter() - started
+    results.sort(key=lambda result: result["file"])
+    succeeded = [result for result in results if result["status"] == "completed"]
+    units = sum(result["units"] for result in succeeded)
+    ocr_after = get_ocr_stats()
+    summary = {
+        "files": len(results),
+        "completed": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "units": units,  # 成功转换的幻灯片/页面总数
+        "input_bytes": sum(result["size"] for result in results),
+        "wall_seconds": round(wall_seconds, 3),
+        "file_seconds": round(sum(result["seconds"] for result in results), 3),  # 各文件耗时之和
+        "units_per_second": round(units / wall_seconds, 3) if wall_seconds > 0 else None,
+        "workers": max(1, workers or BATCH_WORKERS),
+        # 本批次期间的OCR统计（缓存命中、实际识别和跳过的图片数）
+        "ocr": {
+            name: round(ocr_after[name] - ocr_before.get(name, 0), 3)
+            for name in ocr_after if isinstance(ocr_after[name], (int, float))
+        }
+    }
+    return {"summary": summary, "files": results}
+
+
+def write_report(report: dict, path: str):
+    """把报告保存为JSON文件"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def zip_outputs(report: dict, output_dir: str, zip_path: str):
+    """把批次中生成的所有Word文档和报告打包为一个压缩包"""
+    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for result in report["files"]:
+            if result["output"]:
+                archive.write(os.path.join(output_dir, result["output"]), result["output"])
+        archive.writestr(REPORT_FILENAME, json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def main(argv=None):
+    """命令行入口（在 ppt-to-word-ai 目录下运行）:
+    python -m src.batch 课程目录 --output 输出目录 [--workers 4] [--report 报告.json]
+    """
+    parser = argparse.ArgumentParser(description="批量把目录中的PPT/PDF转换为Word学习文档")
+    parser.add_argument('input', help="输入目录（递归查找 .pptx/.ppt/.pdf）或压缩包")
+    parser.add_argument('--output', help="输出目录，默认使用 OUTPUT_DIR")
+    parser.add_argument('--workers', type=int, help=f"同时转换的文件数量（默认 {BATCH_WORKERS}）")
+    parser.add_argument('--report', help=f"报告保存路径（默认保存到输出目录下的 {REPORT_FILENAME}）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'), format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    output_dir = os.path.abspath(args.output or os.getenv('OUTPUT_DIR', '/app/assets/output'))
+
+    temp_dir = None  # 压缩包解压的临时目录
+    if os.path.isdir(args.input):
+        base_dir = os.path.abspath(args.input)
+        paths = collect_inputs(base_dir)
+    else:
+        base_dir = temp_dir = tempfile.mkdtemp(prefix='ppt2word-batch-')
+        paths = extract_zip(args.input, base_dir)
+
+    def progress(done, total, stage=None):
+        print(f"[{done}/{total}]", file=sys.stderr)
+
+    try:
+        if not paths:
+            print("没有找到可转换的文件", file=sys.stderr)
+            return 1
+        report = run_batch(paths, output_dir=output_dir, base_dir=base_dir, workers=args.workers,
+                           progress_callback=progress)
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    write_report(report, args.report or os.path.join(output_dir, REPORT_FILENAME))
+
+    summary = report["summary"]
+    print(
+        f"完成 {summary['completed']}/{summary['files']} 个文件，失败 {summary['failed']} 个，"
+        f"共 {summary['units']} 张幻灯片/页面，耗时 {summary['wall_seconds']} 秒",
+        file=sys.stderr
+    )
+    for result in report["files"]:
+        if result["status"] == "failed":
+            print(f"  失败: {result['file']}: {result['error']}", file=sys.stderr)
+    return 0 if summary["failed"] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
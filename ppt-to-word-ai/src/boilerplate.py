@@ -0,0 +1,122 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取配置
+import re  # 正则表达式库，用于规范化文本行
+import logging  # 记录去除的模板文本
+import collections  # 文本行的出现次数、待输出的幻灯片
+from .metrics import Counter  # 去除的行数指标
+
+logger = logging.getLogger(__name__)
+
+# 是否去除在大多数幻灯片/页面中重复出现的模板文本（课程名、页眉页脚、学校名称、版权声明等）
+BOILERPLATE_ENABLED = os.getenv('BOILERPLATE_ENABLED', '1') == '1'
+# 输出一张幻灯片之前，最多预先读取的后续幻灯片数量（流式处理时用于建立出现频率的索引）
+BOILERPLATE_WINDOW = int(os.getenv('BOILERPLATE_WINDOW', 8))
+# 出现在至少这个比例的幻灯片中的文本行视为模板文本
+BOILERPLATE_RATIO = float(os.getenv('BOILERPLATE_RATIO', 0.6))
+# 至少看到这么多张幻灯片后才开始判断（幻灯片太少时无法区分模板文本和正文）
+BOILERPLATE_MIN_UNITS = int(os.getenv('BOILERPLATE_MIN_UNITS', 4))
+
+BOILERPLATE_LINES = Counter('ppt2word_boilerplate_lines_removed_total', '去除的重复模板文本行数')
+
+_LINE_BREAKS = re.compile(r'[\n\v]')  # 换行和PPT中的软换行
+_DIGITS = re.compile(r'\d+')  # 页码、日期等数字
+_PUNCTUATION = re.compile(r'\W+')  # 标点和空白
+_PAGE_NUMBER_LETTERS = 12  # 去掉数字后最多剩下这么多字符的行视为页码一类的行
+
+
+def normalize_line(line: str) -> str:
+    """规范化一行文本，用于比较：忽略大小写、标点和空白
+
+    页码一类的短行（去掉数字后只剩很少的文字）中的数字视为相同，
+    例如 "3 / 26" 与 "4 / 26"、"第 3 页" 与 "第 4 页"；较长的正文行保留数字，不会因为只有数字不同而被合并
+    """
+    line = ' '.join(_PUNCTUATION.sub(' ', line.lower()).split())
+    if len(_DIGITS.sub('', line).replace(' ', '')) <= _PAGE_NUMBER_LETTERS:
+        line = _DIGITS.sub('#', line)
+    return line
+
+
+def _unit_lines(unit: dict):
+    """一张幻灯片/页面中参与统计的文本行：文本内容和图片中识别的文本（标题和表格不参与）"""
+    for element in unit["content"]:
+        if element["type"] in ("text", "heading"):
+            yield from _LINE_BREAKS.split(element["data"])
+    for image_data in unit.get("images", []):
+        yield from _LINE_BREAKS.split(image_data.get("text") or '')
+
+
+class BoilerplateFilter:
+    """按文本行在多少张幻灯片中出现建立索引，去除大多数幻灯片中都有的行"""
+
+    def __init__(self, ratio: float = None, min_units: int = None):
+        self.ratio = BOILERPLATE_RATIO if ratio is None else ratio
+        self.min_units = BOILERPLATE_MIN_UNITS if min_units is None else min_units
+        self.frequency = collections.Counter()  # 规范化后的行 -> 出现该行的幻灯片数量
+        self.units = 0  # 已统计的幻灯片数量
+        self.removed = 0  # 已去除的行数
+
+    def observe(self, unit: dict):
+        """统计一张幻灯片中的文本行（同一张幻灯片中重复的行只计一次）"""
+        lines = {normalize_line(line) for line in _unit_lines(unit)}
+        self.frequency.update(line for line in lines if len(line) >= 2)
+        self.units += 1
+
+    def is_boilerplate(self, line: str) -> bool:
+        """按目前已统计的幻灯片判断一行文本是否为模板文本"""
+        if self.units < self.min_units:
+            return False
+        return self.frequency[normalize_line(line)] >= self.ratio * self.units
+
+    def _strip_text(self, text: str) -> str:
+        lines = _LINE_BREAKS.split(text)
+        kept = [line for line in lines if not self.is_boilerplate(line)]
+        self.removed += len(lines) - len(kept)
+        return '\n'.join(kept) if len(kept) < len(lines) else text
+
+    def strip(self, unit: dict) -> dict:
+        """去除一张幻灯片的文本内容和图片文本中的模板文本（直接修改并返回该幻灯片）"""
+        if unit.get("cached_section") is not None:
+            return unit  # 增量转换中复用的幻灯片，使用上次的合并文本
+        content = []
+        for element in unit["content"]:
+            if element["type"] in ("text", "heading"):
+                text = self._strip_text(element["data"])
+                if not text.strip():
+                    continue  # 整段都是模板文本
+                element = dict(element, data=text)
+            content.append(element)
+        unit["content"] = content
+        for image_data in unit.get("images", []):
+            if image_data.get("text"):
+                image_data["text"] = self._strip_text(image_data["text"])
+        return unit
+
+
+def strip_boilerplate(units, window: int = None):
+    """去除模板文本的流水线阶段
+
+    每张幻灯片在其后的 window 张幻灯片都已统计之后才输出，
+    因此判断时索引至少包含 window + 1 张幻灯片（整个文档更短时包含整个文档）；
+    之后的幻灯片继续累加到索引中
+
+    参数:
+        units: 逐张产出的幻灯片/页面结构化内容（图片文本已填充）
+        window: 预先读取的幻灯片数量，默认使用 BOILERPLATE_WINDOW
+
+    返回:
+        按原顺序产出已去除模板文本的幻灯片的生成器
+    """
+    window = BOILERPLATE_WINDOW if window is None else max(0, window)
+    boilerplate = BoilerplateFilter()
+    pending = collections.deque()
+    for unit in units:
+        boilerplate.observe(unit)
+        pending.append(unit)
+        if len(pending) > window:
+            yield boilerplate.strip(pending.popleft())
+    while pending:
+        yield boilerplate.strip(pending.popleft())
+
+    if boilerplate.removed:
+        BOILERPLATE_LINES.inc(boilerplate.removed)
+        logger.info(f"共 {boilerplate.units} 张幻灯片/页面，去除重复的模板文本 {boilerplate.removed} 行")
@@ -0,0 +1,92 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于判断文件类型和删除临时文件
+import logging  # 记录增量转换信息
+from src.pipeline import iter_document, count_units  # 流式处理流水线，逐张提取并OCR
+from src.word_generator import create_word_document  # Word生成模块，用于创建Word文档
+from src.manifest import DocumentManifest, INCREMENTAL_ENABLED  # 增量转换清单
+from src.metrics import timed  # 阶段耗时指标
+from src.pptx_fastpath import is_readable  # 快速检查PPTX能否被解析
+from src.office_converter import convert_document, office_available, PPTX_PDF_FALLBACK  # Office格式转换
+
+logger = logging.getLogger(__name__)
+
+
+def _prepare_source(file_path: str, original_filename: str) -> tuple:
+    """把无法直接解析的文件转换为可以处理的格式
+
+    旧版二进制 .ppt 转换为 .pptx；无法解析的 .pptx 在可以使用Office转换时转换为PDF
+
+    返回:
+        (实际处理的文件路径, 用于判断文件类型的文件名, 需要删除的临时文件或None)
+    """
+    base_name, extension = os.path.splitext(original_filename)
+    extension = extension.lower()
+    if extension == '.ppt':
+        converted = convert_document(file_path, 'pptx')
+        return converted, base_name + '.pptx', converted
+    if extension == '.pptx' and PPTX_PDF_FALLBACK and office_available() and not is_readable(file_path):
+        logger.warning(f"无法解析 {original_filename}，转换为PDF后处理")
+        converted = convert_document(file_path, 'pdf')
+        return converted, base_name + '.pdf', converted
+    return file_path, original_filename, None
+
+
+def convert_file(file_path: str, original_filename: str, progress_callback=None, event_callback=None,
+                 output_dir: str = None, output_path: str = None) -> str:
+    """将一个PPT/PDF文件完整转换为Word学习文档
+
+    参数:
+        file_path: 已保存到本地的输入文件路径
+        original_filename: 用户上传时的原始文件名，用于生成输出文件名
+        progress_callback: 可选的进度回调 callback(done, total, stage)
+        event_callback: 可选的实时输出回调 callback(slide, text)，用于推送AI边生成边输出的文本
+        output_dir: 可选的输出目录，默认使用 OUTPUT_DIR
+        output_path: 可选的完整输出路径，指定时忽略 output_dir
+
+    返回:
+        生成的Word文档的完整路径
+    """
+    if progress_callback:
+        progress_callback(0, 0, "extracting")  # 开始提取内容
+
+    source_path, source_name, converted = _prepare_source(file_path, original_filename)
+    try:
+        return _convert(source_path, source_name, original_filename, progress_callback, event_callback,
+                        output_dir, output_path)
+    finally:
+        if converted is not None:
+            os.remove(converted)  # 删除Office转换得到的临时文件
+
+
+def _convert(file_path: str, source_name: str, original_filename: str, progress_callback, event_callback,
+             output_dir: str, output_path: str) -> str:
+    """转换一个可以直接解析的PPTX/PDF文件，source_name用于判断文件类型"""
+    # 流式处理：提取、OCR、AI生成和写入文档同时进行，
+    # 第一张幻灯片已经在调用AI时，后面的幻灯片还在提取和OCR
+    with timed("count_units"):
+        total = count_units(file_path, source_name)
+    # 增量转换：同名文档再次上传时，未变化的幻灯片直接复用上次生成的章节
+    manifest = DocumentManifest.load(original_filename) if INCREMENTAL_ENABLED else None
+    content = iter_document(file_path, source_name, manifest=manifest)
+
+    # 生成Word文档，create_word_document会逐张幻灯片报告进度
+    output_path = create_word_document(
+        content, original_filename,
+        progress_callback=progress_callback, total=total, event_callback=event_callback,
+        section_callback=manifest.record if manifest is not None else None,
+        output_dir=output_dir, output_path=output_path
+    )
+
+    if manifest is not None:
+        try:
+            if manifest.previous:
+                changes = manifest.diff()
+                logger.info(
+                    f"增量转换 {original_filename}: 未变化 {changes['unchanged']} 张, "
+                    f"新增 {changes['added']}, 修改 {changes['changed']}, "
+                    f"删除 {changes['removed']}, 移动 {changes['reordered']}"
+                )
+            manifest.save()  # 保存本次的清单，供下次上传时比较
+        except Exception as e:
+            logger.warning(f"保存转换清单时出错: {e}")  # 清单只影响下次转换的速度
+    return output_path
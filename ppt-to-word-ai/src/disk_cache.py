@@ -0,0 +1,103 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于创建缓存目录
+import time  # 用于记录缓存条目的创建和访问时间
+import sqlite3  # 持久化缓存使用的本地SQLite数据库
+import threading  # 每个线程使用独立的数据库连接
+
+# 缓存文件的存放目录
+CACHE_DIR = os.getenv('CACHE_DIR', '/app/assets/cache')
+
+
+class DiskCache:
+    """基于SQLite的持久化键值缓存，线程安全
+
+    按最近访问时间（LRU）淘汰，同时支持总大小、条目数和最长保存时间限制。
+    键通常是内容的哈希值，值为文本
+    """
+
+    def __init__(self, path: str, max_bytes: int = 0, max_entries: int = 0, max_age: float = 0):
+        """
+        参数:
+            path: SQLite数据库文件路径
+            max_bytes: 缓存值的总字节数上限，0表示不限制
+            max_entries: 缓存条目数上限，0表示不限制
+            max_age: 条目最长保存秒数，0表示永不过期
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._local = threading.local()  # 每个线程一个连接（sqlite3连接不能跨线程共享）
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")  # 允许多个线程/进程同时读取
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        """读取缓存值，不存在或已过期时返回None"""
+        conn = self._conn()
+        row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        now = time.time()
+        if self.max_age and now - created_at > self.max_age:
+            # 条目已过期，删除并视为未命中
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        # 更新访问时间，用于LRU淘汰
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return value
+
+    def set(self, key: str, value: str):
+        """写入缓存值，并按配置淘汰过期或最久未使用的条目"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode('utf-8')), now, now)
+        )
+        self._evict(conn, now)
+        conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """按保存时间、条目数和总大小淘汰条目"""
+        if self.max_age:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.max_age,))
+        if self.max_entries:
+            # 删除超出条目数上限的最久未访问条目
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+        if self.max_bytes:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # 从最久未访问的条目开始删除，直到总大小回到上限以内
+                rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC").fetchall()
+                stale = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    stale.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM entries WHERE key = ?", stale)
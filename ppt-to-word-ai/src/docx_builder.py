@@ -0,0 +1,257 @@
+# 导入必要的库和模块
+import io  # 模板在内存中保存为字节，每次请求从中加载
+import os  # 读取模板路径配置
+import re  # 识别编号列表和表格分隔行
+import threading  # 保护模板的首次加载
+from docx import Document  # 用于加载模板和保存Word文档
+from docx.enum.style import WD_STYLE_TYPE  # 新增代码块样式
+from docx.oxml import parse_xml  # 把批量生成的XML解析为文档元素
+from docx.oxml.ns import nsdecls  # XML命名空间声明
+from docx.shared import Pt  # 用于设置字号
+
+# 可选的预设样式的Word模板（.docx），为空时使用python-docx的默认模板并设置中文字体
+DOCX_TEMPLATE = os.getenv('DOCX_TEMPLATE', '')
+
+# 代码块使用的段落样式名称（模板中没有时自动添加）
+CODE_STYLE = 'Code'
+# 编号列表：任意数字加 ". "，例如 "12. 内容"
+_NUMBERED = re.compile(r'^\d+\.\s+')
+# 表格的表头分隔行，例如 |---|:---:|
+_TABLE_SEPARATOR = re.compile(r'^\|?\s*:?-{3,}:?\s*(\|\s*:?-{3,}:?\s*)*\|?$')
+# XML中不允许出现的控制字符（python-docx在写入时同样会拒绝）
+_INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_template = None  # 处理好的模板（字节）和各样式的ID
+_template_lock = threading.Lock()
+
+
+def _build_template():
+    """加载模板并设置样式，返回 (模板字节, 样式名 -> 样式ID)"""
+    doc = Document(DOCX_TEMPLATE or None)
+    styles = doc.styles
+    if not DOCX_TEMPLATE:
+        # 改进的样式配置
+        font = styles['Normal'].font
+        font.name = 'SimSun'  # 使用宋体或其他支持中文的字体
+        font.size = Pt(12)  # 调整为适合中文阅读的字号
+
+    names = {style.name for style in styles}
+    if CODE_STYLE not in names:
+        # 代码块：等宽字体、较小字号、段落之间不留空
+        code = styles.add_style(CODE_STYLE, WD_STYLE_TYPE.PARAGRAPH)
+        code.base_style = styles['Normal']
+        code.font.name = 'Consolas'
+        code.font.size = Pt(10)
+        code.paragraph_format.space_before = Pt(0)
+        code.paragraph_format.space_after = Pt(0)
+        names.add(CODE_STYLE)
+
+    style_ids = {}
+    for name in ('Title', 'Heading 1', 'Heading 2', 'Heading 3', 'List Bullet', 'List Number',
+                 'Table Grid', CODE_STYLE):
+        # 自定义模板中缺少的样式退回到正文样式
+        style_ids[name] = styles[name].style_id if name in names else None
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue(), style_ids
+
+
+def get_template():
+    """获取（必要时加载）进程内共享的模板，每个进程只加载一次"""
+    global _template
+    with _template_lock:
+        if _template is None:
+            _template = _build_template()
+        return _template
+
+
+def _escape(text: str) -> str:
+    """转义XML文本，并删除Word不允许的控制字符"""
+    text = _INVALID_XML_CHARS.sub('', text)
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _run_xml(text: str, bold: bool = False) -> str:
+    """生成一个文本段（run）的XML，换行和制表符与python-docx的处理方式一致"""
+    parts = []
+    for index, line in enumerate(text.split('\n')):
+        if index:
+            parts.append('<w:br/>')
+        for position, piece in enumerate(line.split('\t')):
+            if position:
+                parts.append('<w:tab/>')
+            if piece:
+                parts.append(f'<w:t xml:space="preserve">{_escape(piece)}</w:t>')
+    properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return f'<w:r>{properties}{"".join(parts)}</w:r>'
+
+
+def _paragraph_xml(text: str = '', style_id: str = None, bold: bool = False) -> str:
+    """生成一个段落的XML"""
+    properties = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+    run = _run_xml(text, bold) if text else ''
+    return f'<w:p>{properties}{run}</w:p>'
+
+
+class DocumentBuilder:
+    """批量生成正文XML的Word文档构建器
+
+    样式来自每个进程只加载一次的模板；段落先以XML字符串的形式累积，
+    每个章节写完后一次性解析并插入文档，避免逐个段落调用python-docx
+    """
+
+    def __init__(self):
+        template, self.style_ids = get_template()
+        self.doc = Document(io.BytesIO(template))
+        self._body = self.doc.element.body
+        self._pending = []  # 尚未插入文档的XML片段
+
+    def add_heading(self, text: str, level: int = 1):
+        """添加标题，level为0时使用文档标题样式"""
+        style = 'Title' if level == 0 else f'Heading {level}'
+        self._pending.append(_paragraph_xml(text, self.style_ids.get(style)))
+
+    def add_paragraph(self, text: str = '', style: str = None, bold: bool = False):
+        """添加段落，style为样式名称（例如 'List Bullet'），为空时使用正文样式"""
+        self._pending.append(_paragraph_xml(text, self.style_ids.get(style) if style else None, bold))
+
+    def add_table(self, rows: list):
+        """添加表格，第一行作为表头（加粗），列数不足的行用空单元格补齐"""
+        columns = max(len(row) for row in rows)
+        style_id = self.style_ids.get('Table Grid')
+        style = f'<w:tblStyle w:val="{style_id}"/>' if style_id else ''
+        parts = [
+            f'<w:tbl><w:tblPr>{style}<w:tblW w:type="auto" w:w="0"/><w:tblLook w:val="04A0"/></w:tblPr>',
+            '<w:tblGrid>' + '<w:gridCol/>' * columns + '</w:tblGrid>'
+        ]
+        for index, row in enumerate(rows):
+            cells = list(row) + [''] * (columns - len(row))
+            parts.append('<w:tr>')
+            for cell in cells:
+                parts.append(
+                    '<w:tc><w:tcPr><w:tcW w:type="auto" w:w="0"/></w:tcPr>'
+                    f'{_paragraph_xml(cell, bold=index == 0)}</w:tc>'
+                )
+            parts.append('</w:tr>')
+        parts.append('</w:tbl>')
+        self._pending.append(''.join(parts))
+
+    def add_markdown(self, text: str):
+        """将AI生成的具有层次结构的内容按行解析并写入文档"""
+        writer = SectionWriter(self)
+        for line in text.split('\n'):
+            writer.feed_line(line)
+        writer.close()
+
+    def add_error_section(self, error: Exception, combined_content: str):
+        """AI处理出错时写入的回退章节，保留原始内容"""
+        self.add_heading("AI内容处理错误", level=1)
+        self.add_paragraph(f"错误信息: {str(error)}")  # 添加错误详情
+        self.add_paragraph("未处理的原始内容:")  # 标明以下是原始内容
+        self.add_paragraph(combined_content)  # 添加原始内容
+
+    def flush(self):
+        """把累积的XML一次性解析并插入到文档末尾（分节属性之前）"""
+        if not self._pending:
+            return
+        fragment = parse_xml(f'<w:body {nsdecls("w")}>{"".join(self._pending)}</w:body>')
+        self._pending = []
+        sect_pr = self._body.sectPr
+        for element in list(fragment):
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                self._body.append(element)
+
+    def save(self, path: str):
+        """保存文档"""
+        self.flush()
+        self.doc.save(path)
+
+
+class SectionWriter:
+    """逐行解析AI生成的内容并写入构建器
+
+    跨多行的结构（代码块、表格）在遇到结束标记或其他类型的行时才写入，
+    因此可以与 IncrementalLineParser 配合，在流式模式下逐行输入
+    """
+
+    def __init__(self, builder: DocumentBuilder):
+        self.builder = builder
+        self.code = None  # 代码块中的行，不在代码块中时为None
+        self.table = []  # 正在收集的表格行
+
+    def feed_line(self, line: str):
+        """处理一行内容"""
+        stripped = line.strip()
+        if self.code is not None:
+            if stripped.startswith('```'):
+                self._flush_code()
+            else:
+                self.code.append(line.rstrip())  # 代码保留缩进
+            return
+        if stripped.startswith('|'):
+            # 表格行（包括表头分隔行）
+            self.table.append(stripped)
+            return
+        self._flush_table()
+        if stripped.startswith('```'):
+            self.code = []  # 代码块开始（忽略语言标记）
+            return
+        self._add_line(stripped)
+
+    def close(self):
+        """写入尚未结束的代码块和表格"""
+        if self.code is not None:
+            self._flush_code()
+        self._flush_table()
+
+    def _flush_code(self):
+        for line in self.code:
+            self.builder.add_paragraph(line, style=CODE_STYLE)
+        self.code = None
+
+    def _flush_table(self):
+        if not self.table:
+            return
+        rows = [
+            [cell.strip() for cell in line.strip('|').split('|')]
+            for line in self.table if not _TABLE_SEPARATOR.match(line)
+        ]
+        self.table = []
+        if len(rows) >= 2 or (rows and len(rows[0]) >= 2):
+            self.builder.add_table(rows)
+        else:
+            for row in rows:
+                self._add_line(' | '.join(row))  # 单独一行、单独一列的不是表格，作为普通段落
+
+    def _add_line(self, line: str):
+        """解析一行普通内容，并以相应的格式写入文档"""
+        builder = self.builder
+        if not line:  # 跳过空行
+            return
+
+        if line.startswith('####'):
+            # 小标题（三级标题）
+            builder.add_heading(line[4:].strip(), level=3)
+        elif line.startswith('###'):
+            # 副标题（二级标题）
+            builder.add_heading(line[3:].strip(), level=2)
+        elif line.startswith('##'):
+            # 主标题（一级标题）
+            builder.add_heading(line[2:].strip(), level=1)
+        elif line.startswith('•') or line.startswith('- ') or line.startswith('* '):
+            # 项目符号列表（无序列表）
+            # 根据不同的项目符号类型提取文本内容
+            bullet_text = line[1:].strip() if line.startswith('•') else line[2:].strip()
+            builder.add_paragraph(bullet_text, style='List Bullet')  # 使用项目符号样式
+        elif _NUMBERED.match(line):
+            # 编号列表（有序列表），编号由Word的列表样式生成
+            builder.add_paragraph(_NUMBERED.sub('', line, count=1).strip(), style='List Number')
+        elif line.startswith('**') and line.endswith('**'):
+            # 粗体文本作为突出段落
+            builder.add_paragraph(line[2:-2], bold=True)  # 去除前后的**标记
+        elif len(line) > 10:  # 只处理内容实质的段落（超过10个字符）
+            # 普通段落
+            builder.add_paragraph(line)
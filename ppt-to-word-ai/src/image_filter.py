@@ -0,0 +1,175 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取阈值配置
+import io  # 用于处理二进制流
+import hashlib  # 用于计算图片内容摘要
+import logging  # 记录预分类错误
+from PIL import Image  # 图像处理库
+
+# OpenCV用于快速的文字区域检测，只在OCR工作进程中使用，首次检测时才导入；未安装时跳过这一步检查
+_cv2 = None  # (cv2, numpy)，未安装时为False
+
+logger = logging.getLogger(__name__)
+
+# 图片尺寸阈值：过小的图片（图标、项目符号等）不可能包含有用的文字
+OCR_MIN_IMAGE_SIDE = int(os.getenv('OCR_MIN_IMAGE_SIDE', 24))  # 最短边像素数
+OCR_MIN_IMAGE_PIXELS = int(os.getenv('OCR_MIN_IMAGE_PIXELS', 6000))  # 最小像素总数
+# 在同一文档中出现次数达到该值的重复图片视为装饰（徽标、背景、横幅）
+OCR_DECORATION_MIN_REPEATS = int(os.getenv('OCR_DECORATION_MIN_REPEATS', 3))
+# 感知哈希的边长（哈希共 边长*边长 位）和汉明距离阈值：距离不超过该值时视为近似重复
+OCR_DEDUP_HASH_SIZE = int(os.getenv('OCR_DEDUP_HASH_SIZE', 16))
+OCR_DEDUP_MAX_DISTANCE = int(os.getenv('OCR_DEDUP_MAX_DISTANCE', 4))
+# 图片细节比例（缩略图中有明显起伏的像素所占比例）低于该值时不做近似比较，只认内容完全相同的图片：
+# 白底文字截图、纯色或渐变背景上的文字缩小后几乎相同，感知哈希无法区分其中的文字
+OCR_DEDUP_MIN_DETAIL = float(os.getenv('OCR_DEDUP_MIN_DETAIL', 0.15))
+_DETAIL_CONTRAST = 8  # 计算细节比例时视为明显起伏的灰度差
+# 是否在OCR之前运行文字区域检测
+OCR_TEXT_DETECTION = os.getenv('OCR_TEXT_DETECTION', '1') == '1'
+# 文字区域检测认为"可能有文字"所需的最少文字行候选数
+OCR_MIN_TEXT_REGIONS = int(os.getenv('OCR_MIN_TEXT_REGIONS', 2))
+
+
+def _load_cv2():
+    """导入OpenCV和numpy，未安装时返回None"""
+    global _cv2
+    if _cv2 is None:
+        try:
+            import cv2  # OpenCV图像处理库
+            import numpy as np  # OpenCV依赖的数组库
+            _cv2 = (cv2, np)
+        except ImportError:
+            _cv2 = False
+    return _cv2 or None
+
+
+def dhash(image, hash_size: int = 16) -> int:
+    """计算图片的差值感知哈希（dHash），用于识别近似重复的图片"""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def image_detail(image, size: int = 16) -> float:
+    """缩略图中有明显起伏的像素所占比例（0~1），用于判断感知哈希是否可信
+
+    按水平方向的二阶差分计算，平滑的渐变背景不计入细节；
+    白底文字截图缩小后只剩很浅的灰色条纹，细节比例很低
+    """
+    small = image.convert('L').resize((size + 2, size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    changes = 0
+    for row in range(size):
+        offset = row * (size + 2)
+        for col in range(size):
+            left, middle, right = pixels[offset + col:offset + col + 3]
+            if abs(left - 2 * middle + right) > _DETAIL_CONTRAST:
+                changes += 1
+    return changes / float(size * size)
+
+
+def _is_repeat(entry: tuple, other: tuple) -> bool:
+    """两张图片是否视为同一张：内容完全相同，或者两者细节都足够丰富且感知哈希接近"""
+    digest, value, detail = entry
+    other_digest, other_value, other_detail = other
+    if digest == other_digest:
+        return True
+    return (detail >= OCR_DEDUP_MIN_DETAIL and other_detail >= OCR_DEDUP_MIN_DETAIL
+            and bin(value ^ other_value).count('1') <= OCR_DEDUP_MAX_DISTANCE)
+
+
+def prefilter_images(blobs: list, seen_hashes: list = None) -> list:
+    """在OCR之前对一个文档中的所有图片做廉价的预分类
+
+    只读取图片头部获取尺寸，过小的图片直接跳过；在文档中反复出现的图片视为装饰跳过。
+    只有内容完全相同、或者细节丰富（徽标、照片横幅等）且感知哈希接近的图片才算重复；
+    细节很少的图片（例如不同的白底文字截图）缩小后看起来都一样，只按内容判断，不会被误判为装饰
+
+    参数:
+        blobs: 原始图片字节列表
+        seen_hashes: 可选，同一文档中之前已处理图片的 (内容摘要, 感知哈希, 细节比例) 列表；
+                     提供时会把本批图片的条目追加进去，并与之前的图片一起统计重复次数
+
+    返回:
+        与blobs一一对应的列表，None表示需要OCR，否则为跳过原因（'small' / 'decoration'）
+    """
+    reasons = [None] * len(blobs)
+    hashes = []  # (图片下标, (内容摘要, 感知哈希, 细节比例))
+
+    for index, blob in enumerate(blobs):
+        try:
+            image = Image.open(io.BytesIO(blob))  # 只解析图片头部，不解码像素
+            width, height = image.size
+            if min(width, height) < OCR_MIN_IMAGE_SIDE or width * height < OCR_MIN_IMAGE_PIXELS:
+                reasons[index] = 'small'
+                continue
+            # JPEG可以按缩小的尺寸解码，计算哈希的开销很小
+            image.draft('L', (64, 64))
+            digest = hashlib.sha256(blob).hexdigest()
+            hashes.append((index, (digest, dhash(image, OCR_DEDUP_HASH_SIZE), image_detail(image))))
+        except Exception as e:
+            logger.warning(f"图片预分类出错: {e}")  # 无法判断时交给OCR处理
+
+    # 参与统计的图片：本批图片，或者同一文档中到目前为止的所有图片
+    if seen_hashes is None:
+        population = [value for _, value in hashes]
+    else:
+        seen_hashes.extend(value for _, value in hashes)
+        population = seen_hashes
+
+    # 统计每张图片在文档中的重复次数
+    if OCR_DECORATION_MIN_REPEATS > 1:
+        for index, entry in hashes:
+            repeats = sum(1 for other in population if _is_repeat(entry, other))
+            if repeats >= OCR_DECORATION_MIN_REPEATS:
+                reasons[index] = 'decoration'
+    return reasons
+
+
+def likely_has_text(image) -> bool:
+    """使用OpenCV快速判断图片中是否可能包含文字
+
+    通过形态学梯度 + 水平闭运算把文字笔画连成文字行，
+    统计形状像文字行的连通区域数量；OpenCV不可用时总是返回True
+
+    参数:
+        image: PIL图像对象
+
+    返回:
+        可能包含文字时返回True
+    """
+    modules = _load_cv2() if OCR_TEXT_DETECTION else None
+    if modules is None:
+        return True
+    cv2, np = modules
+
+    gray = np.array(image.convert('L'))
+    # 缩小大图，检测只需要大致的结构
+    height, width = gray.shape
+    scale = 1000.0 / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        height, width = gray.shape
+
+    # 形态学梯度突出笔画边缘，Otsu二值化后用水平结构元素把字符连成行
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    text_regions = 0
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        # 文字行：高度适中、宽大于高，且区域内笔画像素占比合适
+        if h < 8 or h > height * 0.3 or w < h * 1.5:
+            continue
+        fill_ratio = cv2.countNonZero(binary[y:y + h, x:x + w]) / float(w * h)
+        if 0.2 < fill_ratio < 0.9:
+            text_regions += 1
+            if text_regions >= OCR_MIN_TEXT_REGIONS:
+                return True
+    return False
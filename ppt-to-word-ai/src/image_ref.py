@@ -0,0 +1,54 @@
+# 导入必要的库和模块
+import io  # 用于处理二进制流
+import hashlib  # 用于计算图片内容摘要
+
+
+class ImageRef:
+    """对文档中原始图片数据的惰性引用
+
+    提取阶段只保存原始图片字节（或按需读取它们的函数），
+    不解码、不转码；只有真正需要像素或PNG数据时才进行转换
+    """
+
+    __slots__ = ('_blob', '_loader', '_digest', 'content_type')
+
+    def __init__(self, blob: bytes = None, loader=None, content_type: str = None):
+        """
+        参数:
+            blob: 原始图片字节（PPT/PDF中存储的格式，不做转换）
+            loader: 可选的无参函数，首次访问时才读取图片字节
+            content_type: 图片的MIME类型，例如 'image/jpeg'
+        """
+        self._blob = blob
+        self._loader = loader
+        self._digest = None
+        self.content_type = content_type
+
+    @property
+    def blob(self) -> bytes:
+        """原始图片字节，首次访问时才读取"""
+        if self._blob is None and self._loader is not None:
+            self._blob = self._loader()
+            self._loader = None
+        return self._blob
+
+    @property
+    def digest(self) -> str:
+        """原始图片字节的SHA-256摘要"""
+        if self._digest is None:
+            self._digest = hashlib.sha256(self.blob).hexdigest()
+        return self._digest
+
+    def open(self):
+        """按需解码为PIL图像对象"""
+        from PIL import Image  # 只有需要像素时才导入图像库
+        return Image.open(io.BytesIO(self.blob))
+
+    def to_png(self) -> bytes:
+        """按需转码为PNG字节，原图已经是PNG时直接返回原始字节"""
+        if self.content_type == 'image/png':
+            return self.blob
+        output = io.BytesIO()
+        self.open().save(output, format='PNG')
+        return output.getvalue()
+
@@ -0,0 +1,211 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取并发配置
+import time  # 用于记录任务的时间戳
+import uuid  # 用于生成唯一的任务ID
+import logging  # 记录任务失败时的调用栈
+import threading  # 线程锁，保护共享的任务表
+import traceback  # 任务失败时的调用栈保存到分析结果中
+from concurrent.futures import ThreadPoolExecutor  # 有界的本地工作线程池
+from .metrics import STAGE_SECONDS, ERRORS, timed, register_collector  # 排队耗时和任务数量指标
+from .profiling import job_profiler, remove_profile  # 按需启用的任务性能分析
+
+logger = logging.getLogger(__name__)
+
+# 同时运行的转换任务数量上限（默认与CPU核心数一致）
+MAX_CONCURRENT_JOBS = int(os.getenv('MAX_CONCURRENT_JOBS', os.cpu_count() or 1))
+# 已结束的任务在内存中保留的秒数，超时后自动清理
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', 3600))
+# 每个任务最多保留的实时输出事件数量，超出后丢弃最早的事件
+JOB_MAX_EVENTS = int(os.getenv('JOB_MAX_EVENTS', 2000))
+
+_executor = None  # 进程内共享的任务线程池（首次提交时创建）
+_executor_lock = threading.Lock()  # 保护线程池的创建
+_jobs = {}  # 任务ID -> 任务状态字典
+_jobs_lock = threading.Lock()  # 保护任务表的读写
+_first_job_pending = True  # 本进程的第一个任务尚未开始（首个任务的耗时单独记录，用于衡量冷启动的影响）
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """获取（必要时创建）进程内共享的任务线程池"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, MAX_CONCURRENT_JOBS),
+                thread_name_prefix='convert-job'
+            )
+        return _executor
+
+
+def _cleanup_expired_jobs():
+    """清理已结束且超过保留时间的任务，避免任务表无限增长"""
+    now = time.time()
+    with _jobs_lock:
+        expired = [
+            job_id for job_id, job in _jobs.items()
+            if job["finished_at"] and now - job["finished_at"] > JOB_TTL_SECONDS
+        ]
+        for job_id in expired:
+            profiled = _jobs.pop(job_id)["profile"]
+            if profiled:
+                remove_profile(job_id)
+
+
+def _update_job(job_id: str, **fields):
+    """原子地更新任务状态中的字段"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+
+def _make_progress_callback(job_id: str):
+    """为任务创建进度回调函数
+
+    回调签名为 callback(done, total, stage=None)，
+    处理流程中的各个阶段可以调用它来报告逐页/逐张幻灯片的进度
+    """
+    def callback(done: int, total: int, stage: str = None):
+        with _jobs_lock:
+            job = _jobs.get(job_id)
+            if job is None:
+                return
+            job["progress"]["done"] = done
+            job["progress"]["total"] = total
+            if stage:
+                job["progress"]["stage"] = stage
+    return callback
+
+
+def _make_event_callback(job_id: str):
+    """为任务创建实时输出回调函数
+
+    回调签名为 callback(slide, text)，每收到一段AI生成的文本调用一次，
+    事件按顺序编号保存，供 /jobs/<id>/events 推送给前端
+    """
+    def callback(slide: int, text: str):
+        with _jobs_lock:
+            job = _jobs.get(job_id)
+            if job is None:
+                return
+            job["event_seq"] += 1
+            job["events"].append({"seq": job["event_seq"], "slide": slide, "text": text})
+            if len(job["events"]) > JOB_MAX_EVENTS:
+                del job["events"][:len(job["events"]) - JOB_MAX_EVENTS]
+    return callback
+
+
+def _run_job(job_id: str, func, args, kwargs, profile: bool = False):
+    """在工作线程中执行任务，并记录结果或错误"""
+    global _first_job_pending
+    started_at = time.time()
+    with _jobs_lock:
+        created_at = _jobs[job_id]["created_at"] if job_id in _jobs else started_at
+        first_job, _first_job_pending = _first_job_pending, False
+    STAGE_SECONDS.observe(started_at - created_at, stage="job_queue_wait")
+    _update_job(job_id, status="running", started_at=started_at)
+    # 请求了分析的任务立即开始采样；否则配置了慢任务阈值时，超过阈值才开始
+    try:
+        profiler = job_profiler(job_id, requested=profile)
+    except Exception as e:
+        # 分析器无法启动（例如无法创建线程）时照常执行任务，不能让任务停在running状态
+        logger.warning(f"任务 {job_id} 的性能分析启动失败: {e}")
+        profiler = None
+    error = None
+    try:
+        with timed("job"):
+            result = func(
+                *args,
+                progress_callback=_make_progress_callback(job_id),
+                event_callback=_make_event_callback(job_id),
+                **kwargs
+            )
+        status = {"status": "completed", "result": result}
+    except Exception as e:
+        # 任务失败时保存错误信息，供状态接口返回给前端；完整的调用栈只写入日志和分析结果
+        ERRORS.inc(stage='job')
+        logger.exception(f"任务 {job_id} 失败")
+        error = traceback.format_exc()
+        status = {"status": "failed", "error": str(e)}
+    # 分析结果在任务结束之前保存，前端看到任务结束时即可下载
+    profile_file = profiler.finish(error=error) if profiler is not None else None
+    _update_job(job_id, profile=profile_file, finished_at=time.time(), **status)
+    if first_job:
+        STAGE_SECONDS.observe(time.time() - started_at, stage="first_job")
+
+
+def submit_job(func, *args, filename: str = "", profile: bool = False, **kwargs) -> str:
+    """将转换任务加入队列，立即返回任务ID
+
+    参数:
+        func: 任务函数，会以 func(*args, progress_callback=..., event_callback=..., **kwargs)
+              的形式调用，返回值会作为任务结果保存
+        filename: 原始文件名，仅用于状态展示
+        profile: 是否分析该任务的性能（见 profiling 模块）
+
+    返回:
+        新任务的唯一ID
+    """
+    _cleanup_expired_jobs()
+
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _jobs[job_id] = {
+            "job_id": job_id,  # 任务ID
+            "status": "queued",  # 状态: queued / running / completed / failed
+            "filename": filename,  # 原始文件名
+            "progress": {"done": 0, "total": 0, "stage": "queued"},  # 逐页进度
+            "result": None,  # 任务成功时的结果
+            "error": None,  # 任务失败时的错误信息
+            "profile": None,  # 性能分析结果的路径（只有分析过的任务才有）
+            "events": [],  # 实时输出事件: {"seq", "slide", "text"}
+            "event_seq": 0,  # 最后一个事件的编号
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None
+        }
+
+    _get_executor().submit(_run_job, job_id, func, args, kwargs, profile)
+    return job_id
+
+
+def _collect_job_metrics() -> list:
+    """当前排队和运行中的任务数量，用于 /metrics"""
+    with _jobs_lock:
+        statuses = [job["status"] for job in _jobs.values()]
+    return [
+        ("ppt2word_jobs_queued", 'gauge', "排队中的转换任务数", statuses.count("queued")),
+        ("ppt2word_jobs_running", 'gauge', "运行中的转换任务数", statuses.count("running"))
+    ]
+
+
+register_collector(_collect_job_metrics)
+
+
+def get_job(job_id: str):
+    """获取任务状态的快照
+
+    返回:
+        任务状态字典的副本，任务不存在时返回None
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        snapshot = dict(job)
+        snapshot["progress"] = dict(job["progress"])
+        del snapshot["events"]  # 事件通过get_job_events单独获取
+        return snapshot
+
+
+def get_job_events(job_id: str, since: int = 0) -> list:
+    """获取任务中编号大于since的实时输出事件
+
+    返回:
+        事件列表（可能为空），任务不存在时返回None
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return [event for event in job["events"] if event["seq"] > since]
@@ -0,0 +1,307 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于获取环境变量
+import time  # 用于本地桩模型模拟网络延迟
+import re  # 用于本地桩模型识别批量请求中的各部分
+import random  # 用于模拟模型随机注入延迟和错误
+import hashlib  # 用于本地桩模型生成确定性的输出
+import threading  # 线程锁，保证注册表在多线程下只创建一次客户端
+from .metrics import record_tokens  # 记录服务商返回的标记数
+
+# 模型SDK在创建对应的客户端时才导入，只使用其中一个服务商时不加载另一个SDK，
+# 也不拖慢Web进程的启动
+
+
+def _import_genai():
+    """导入Google Gemini SDK，未安装时返回None"""
+    try:
+        import google.generativeai as genai  # Google Gemini AI接口
+    except ImportError:
+        return None
+    return genai
+
+
+def _import_ark():
+    """导入火山引擎大模型SDK，未安装时返回None"""
+    try:
+        from volcenginesdkarkruntime import Ark  # 火山引擎大模型SDK
+    except ImportError:
+        return None
+    return Ark
+
+
+class GeminiProvider:
+    """Google Gemini 模型，进程内只配置一次并复用同一个模型实例"""
+
+    name = 'gemini'
+
+    def __init__(self):
+        genai = self.genai = _import_genai()
+        if genai is None:
+            raise ValueError("不支持的模型类型: gemini 或所需SDK未安装")
+        api_key = os.getenv('GEMINI_API_KEY')  # 从环境变量获取API密钥
+        if not api_key:
+            raise ValueError("环境变量中未设置GEMINI_API_KEY")  # 如果未设置API密钥则抛出错误
+
+        self.model_id = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        # 使用API密钥配置Gemini（全局配置，只需执行一次）
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(self.model_id)  # 创建生成式模型实例，后续调用复用其连接
+        self.generation_config = genai.types.GenerationConfig(
+            temperature=0.3,  # 较低的温度值，使输出更保守、更可预测，适合学术内容
+            max_output_tokens=2048,  # 最大输出标记数
+            top_p=0.9  # 控制输出多样性的参数
+        )
+
+    def generate(self, prompt: str, max_output_tokens: int = None) -> str:
+        """调用Gemini模型生成内容
+
+        max_output_tokens用于临时提高输出上限（例如多张幻灯片的批量请求）
+        """
+        generation_config = self.generation_config
+        if max_output_tokens:
+            generation_config = self.genai.types.GenerationConfig(
+                temperature=0.3,
+                max_output_tokens=max_output_tokens,
+                top_p=0.9
+            )
+        response = self.model.generate_content(prompt, generation_config=generation_config)
+        self._record_usage(response)
+        return response.text  # 返回生成的文本
+
+    def stream(self, prompt: str):
+        """流式调用Gemini模型，逐段产出生成的文本"""
+        response = self.model.generate_content(prompt, generation_config=self.generation_config, stream=True)
+        chunk = None
+        for chunk in response:
+            # 没有内容的片段（例如只包含用量的最后一段、被安全过滤的片段）读取 .text 会抛出ValueError
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield chunk.text
+        if chunk is not None:
+            self._record_usage(chunk)  # 最后一段中包含整个请求的用量
+
+    def _record_usage(self, response):
+        """记录Gemini返回的标记数（usage_metadata）"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            record_tokens(self.name, usage.prompt_token_count, usage.candidates_token_count)
+
+
+class ArkProvider:
+    """火山引擎大模型，进程内复用同一个客户端及其HTTP连接池"""
+
+    name = 'volcengine'
+
+    def __init__(self):
+        Ark = _import_ark()
+        if Ark is None:
+            raise ValueError("不支持的模型类型: volcengine 或所需SDK未安装")
+        api_key = os.getenv('ARK_API_KEY')  # 从环境变量获取API密钥
+        if not api_key:
+            raise ValueError("环境变量中未设置ARK_API_KEY")  # 如果未设置API密钥则抛出错误
+
+        self.model_id = os.getenv('model_id')  # 火山引擎的推理接入点ID
+        # 客户端内部维护带keep-alive的HTTP连接池，可在多个线程之间共享
+        self.client = Ark(api_key=api_key)
+
+    def generate(self, prompt: str, max_output_tokens: int = None) -> str:
+        """调用火山引擎大模型生成内容"""
+        options = {}
+        if max_output_tokens:
+            options["max_tokens"] = max_output_tokens  # 批量请求时提高输出上限
+        response = self.client.chat.completions.create(
+            model=self.model_id,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            thinking={"type": "disabled"},
+            temperature=0.3,  # 较低的温度值，使输出更保守、更可预测，适合学术内容
+            top_p=0.9,  # 控制输出多样性的参数
+            **options
+        )
+        self._record_usage(response)
+        return response.choices[0].message.content  # 返回生成的文本
+
+    def stream(self, prompt: str):
+        """流式调用火山引擎大模型，逐段产出生成的文本"""
+        response = self.client.chat.completions.create(
+            model=self.model_id,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            thinking={"type": "disabled"},
+            temperature=0.3,
+            top_p=0.9,
+            stream=True,  # 服务端以SSE方式逐段返回
+            stream_options={"include_usage": True}  # 在最后一段中返回标记用量
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            self._record_usage(chunk)
+
+    def _record_usage(self, response):
+        """记录火山引擎返回的标记数（usage）"""
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            record_tokens(self.name, usage.prompt_tokens, usage.completion_tokens)
+
+
+class StubProvider:
+    """本地桩模型，不访问网络，用于压测和基准测试
+
+    根据提示词生成确定性的结构化文本，延迟可通过 AI_STUB_LATENCY（秒）配置
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency: float = None):
+        self.model_id = 'local-stub'
+        self.latency = float(os.getenv('AI_STUB_LATENCY', 0)) if latency is None else latency
+
+    def generate(self, prompt: str, max_output_tokens: int = None) -> str:
+        """返回与提示词一一对应的固定格式内容
+
+        提示词是多张幻灯片的批量请求时，按 ===第N部分=== 分隔输出每一部分
+        """
+        if self.latency > 0:
+            time.sleep(self.latency)  # 模拟网络往返时间
+        return self._render(prompt)
+
+    def stream(self, prompt: str):
+        """逐行产出generate的结果，把延迟平均分摊到每一行，模拟流式输出"""
+        lines = self._render(prompt).splitlines(keepends=True)
+        for line in lines:
+            if self.latency > 0:
+                time.sleep(self.latency / len(lines))
+            yield line
+
+    def _render(self, prompt: str) -> str:
+        """根据提示词生成确定性的输出文本"""
+        parts = re.findall(r'【第(\d+)部分】\n(.*?)(?=\n\n【第\d+部分】|\n\n指令：)', prompt, re.S)
+        if parts:
+            return "\n".join(f"===第{number}部分===\n{self._section(text)}" for number, text in parts)
+        return self._section(prompt)
+
+    def _section(self, text: str) -> str:
+        """为一段内容生成确定性的结构化文本"""
+        digest = hashlib.sha1(text.encode('utf-8')).hexdigest()[:8]
+        return (
+            f"## 内容解析 {digest}\n"
+            f"### 核心概念\n"
+            f"• 这是本地桩模型生成的要点内容，用于测试。\n"
+            f"• 内容长度为 {len(text)} 个字符。\n"
+            f"#### 思考题\n"
+            f"1. 请根据本节内容总结主要知识点。\n"
+        )
+
+
+class FakeProviderError(RuntimeError):
+    """模拟模型注入的错误，带有HTTP状态码（与服务商SDK的异常一样通过status_code属性读取）"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"模拟的服务商错误: HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeProvider(StubProvider):
+    """带延迟和错误注入的本地模拟模型，用于测试和压测多服务商路由
+
+    每次调用按概率注入错误（例如429限流、503不可用）或慢请求（长尾延迟），
+    其余调用与桩模型相同；未指定的参数从 AI_FAKE_* 环境变量读取
+    """
+
+    def __init__(self, name: str = 'fake', latency: float = None, slow_rate: float = None,
+                 slow_latency: float = None, error_rate: float = None, error_status: int = None,
+                 seed: int = None):
+        """
+        参数:
+            name: 服务商名称（可以注册多个不同名称的模拟模型）
+            latency: 正常请求的延迟（秒）
+            slow_rate: 慢请求的比例
+            slow_latency: 慢请求的延迟（秒）
+            error_rate: 出错请求的比例
+            error_status: 出错时的HTTP状态码
+            seed: 随机数种子，用于得到可重复的结果
+        """
+        super().__init__(float(os.getenv('AI_FAKE_LATENCY', 0)) if latency is None else latency)
+        self.name = name
+        self.model_id = 'local-fake'
+        self.slow_rate = float(os.getenv('AI_FAKE_SLOW_RATE', 0)) if slow_rate is None else slow_rate
+        self.slow_latency = float(os.getenv('AI_FAKE_SLOW_LATENCY', 0)) if slow_latency is None else slow_latency
+        self.error_rate = float(os.getenv('AI_FAKE_ERROR_RATE', 0)) if error_rate is None else error_rate
+        self.error_status = int(os.getenv('AI_FAKE_ERROR_STATUS', 503)) if error_status is None else error_status
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()  # random.Random实例不保证多线程下的可重复性
+
+    def _inject(self):
+        """按配置的概率等待并注入错误"""
+        with self._random_lock:
+            fails = self._random.random() < self.error_rate
+            slow = self._random.random() < self.slow_rate
+        if fails:
+            time.sleep(self.latency / 10)  # 错误响应通常比正常响应快
+            raise FakeProviderError(self.error_status)
+        time.sleep(self.slow_latency if slow else self.latency)
+
+    def generate(self, prompt: str, max_output_tokens: int = None) -> str:
+        self._inject()
+        return self._render(prompt)
+
+    def stream(self, prompt: str):
+        self._inject()  # 延迟和错误都发生在第一段输出之前
+        yield from self._render(prompt).splitlines(keepends=True)
+
+
+# 服务商名称 -> 创建客户端的工厂函数
+_factories = {
+    'gemini': GeminiProvider,
+    'volcengine': ArkProvider,
+    'stub': StubProvider,
+    'fake': FakeProvider
+}
+_providers = {}  # 服务商名称 -> 已创建的客户端实例
+_providers_lock = threading.Lock()
+
+
+def register_provider(name: str, factory):
+    """注册（或替换）一个服务商的工厂函数
+
+    可用于在测试和基准测试中换入本地桩模型，例如
+    register_provider('gemini', StubProvider)
+
+    参数:
+        name: 服务商名称（与AI_MODEL_TYPE一致）
+        factory: 无参可调用对象，返回带有 name、model_id、generate(prompt, max_output_tokens=None)
+                 和 stream(prompt) 的实例
+    """
+    with _providers_lock:
+        _factories[name.lower()] = factory
+        _providers.pop(name.lower(), None)  # 丢弃旧的实例，下次使用时重新创建
+
+
+def get_provider(name: str):
+    """获取指定服务商的共享客户端，首次使用时创建
+
+    参数:
+        name: 服务商名称（gemini / volcengine / stub / fake）
+
+    返回:
+        进程内共享、线程安全的服务商实例
+    """
+    key = name.lower()
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            factory = _factories.get(key)
+            if factory is None:
+                raise ValueError(f"不支持的模型类型: {name} 或所需SDK未安装")
+            # 创建失败时不缓存，配置修正后下次调用可以重试
+            provider = factory()
+            _providers[key] = provider
+        return provider
+
+
+def reset_providers():
+    """丢弃所有已创建的客户端（例如在进程fork之后重新建立连接）"""
+    with _providers_lock:
+        _providers.clear()
@@ -0,0 +1,348 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取路由配置
+import time  # 用于计时和退避等待
+import random  # 退避时间的随机抖动
+import logging  # 记录重试和故障转移
+import threading  # 并发上限和耗时统计的线程锁
+from collections import deque  # 最近的请求耗时
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # 对冲请求在后台线程中执行
+from .rate_limiter import get_rate_limiter  # 按服务商共享的限流器
+from .llm_providers import get_provider  # 进程内共享的模型客户端注册表
+from .metrics import Counter, LLM_SECONDS, timed, register_collector  # 路由相关指标
+
+logger = logging.getLogger(__name__)
+
+# 每个服务商的最多尝试次数（包括第一次），以及退避时间的基数和上限（秒）
+AI_RETRY_ATTEMPTS = int(os.getenv('AI_RETRY_ATTEMPTS', 3))
+AI_RETRY_BASE_DELAY = float(os.getenv('AI_RETRY_BASE_DELAY', 0.5))
+AI_RETRY_MAX_DELAY = float(os.getenv('AI_RETRY_MAX_DELAY', 20))
+# 每个服务商的自适应并发上限：初始值和最大值
+AI_CONCURRENCY_INITIAL = int(os.getenv('AI_CONCURRENCY_INITIAL', 4))
+AI_CONCURRENCY_MAX = int(os.getenv('AI_CONCURRENCY_MAX', 16))
+# 对冲请求
+AI_HEDGE_ENABLED = os.getenv('AI_HEDGE_ENABLED', '0') == '1'
+AI_HEDGE_PERCENTILE = float(os.getenv('AI_HEDGE_PERCENTILE', 0.95))  # 超过该分位数的耗时后发送对冲请求
+AI_HEDGE_MIN_SAMPLES = int(os.getenv('AI_HEDGE_MIN_SAMPLES', 20))  # 积累足够的耗时样本之前不对冲
+
+_RETRYABLE_STATUS = (408, 409, 425, 429, 500, 502, 503, 504)  # 可以重试的HTTP状态码
+_THROTTLED_NAMES = ('RateLimit', 'ResourceExhausted', 'TooManyRequests')  # 表示限流的异常类名
+_TRANSIENT_NAMES = ('Timeout', 'Connection', 'Unavailable', 'DeadlineExceeded', 'InternalServerError')
+_LATENCY_WINDOW = 200  # 计算耗时分位数时保留的最近样本数
+_DECREASE_INTERVAL = 1.0  # 同一批并发请求同时被限流时只减半一次（秒）
+
+LLM_ATTEMPTS = Counter('ppt2word_llm_attempts_total', 'AI接口调用次数（包括重试）', labels=('provider', 'result'))
+LLM_FAILOVERS = Counter('ppt2word_llm_failovers_total', '从该服务商转到下一个服务商的次数', labels=('provider',))
+LLM_HEDGES = Counter('ppt2word_llm_hedges_total', '对冲请求次数', labels=('result',))
+
+
+def _status_code(error: Exception):
+    """从服务商SDK的异常中读取HTTP状态码，没有时返回None"""
+    for candidate in (error, getattr(error, 'response', None)):
+        for attribute in ('status_code', 'code', 'status', 'http_status'):
+            value = getattr(candidate, attribute, None)
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+    return None
+
+
+def classify_error(error: Exception) -> tuple:
+    """判断一个调用错误是否可以重试、是否为限流
+
+    返回:
+        (是否可以重试, 是否为限流信号)
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in _RETRYABLE_STATUS, status == 429
+    name = type(error).__name__
+    if any(part in name for part in _THROTTLED_NAMES):
+        return True, True
+    if isinstance(error, (TimeoutError, ConnectionError)) or any(part in name for part in _TRANSIENT_NAMES):
+        return True, False
+    return False, False
+
+
+def _retry_after(error: Exception):
+    """服务商要求的等待时间（Retry-After响应头，秒），没有时返回None"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    try:
+        return float(headers.get('retry-after')) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, error: Exception = None) -> float:
+    """第attempt次（从0开始）失败后的等待时间：完全随机抖动的指数退避，不少于Retry-After"""
+    delay = random.uniform(0, min(AI_RETRY_MAX_DELAY, AI_RETRY_BASE_DELAY * 2 ** attempt))
+    retry_after = _retry_after(error) if error is not None else None
+    if retry_after:
+        delay = max(delay, min(retry_after, AI_RETRY_MAX_DELAY))
+    return delay
+
+
+class AdaptiveConcurrency:
+    """按AIMD调整的并发上限，线程安全
+
+    请求成功时上限增加 1/上限（每完成约一轮并发请求增加1），收到限流信号时减半
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """等待直到进行中的请求数低于当前上限"""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, outcome: str):
+        """请求结束，outcome为 ok / throttled / error"""
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == 'ok':
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == 'throttled':
+                now = time.monotonic()
+                if now - self._decreased_at >= _DECREASE_INTERVAL:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._decreased_at = now
+            self._condition.notify_all()
+
+
+class _LatencyWindow:
+    """最近若干次成功请求的耗时，用于计算对冲的等待时间"""
+
+    def __init__(self, size: int = _LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float):
+        """耗时的q分位数，样本不足时返回None"""
+        with self.lock:
+            if len(self.samples) < max(1, AI_HEDGE_MIN_SAMPLES):
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LLMRouter:
+    """按优先级在多个服务商之间路由AI请求，线程安全
+
+    限流（429）或服务端错误（5xx、超时、连接错误）时，按带随机抖动的指数退避在同一服务商上重试；
+    重试次数用完或遇到不可重试的错误时转到下一个服务商。每个服务商的并发上限按AIMD自适应调整。
+    接口与服务商客户端相同（generate / stream），可以直接替换 get_provider() 的返回值
+    """
+
+    def __init__(self, names: list, attempts: int = None, hedge: bool = None, hedge_percentile: float = None):
+        """
+        参数:
+            names: 按优先级排列的服务商名称
+            attempts: 每个服务商的最多尝试次数，默认使用 AI_RETRY_ATTEMPTS
+            hedge: 是否发送对冲请求，默认使用 AI_HEDGE_ENABLED
+            hedge_percentile: 发送对冲请求的耗时分位数，默认使用 AI_HEDGE_PERCENTILE
+        """
+        self.names = [name.strip().lower() for name in names if name.strip()]
+        if not self.names:
+            raise ValueError("没有配置AI服务商")
+        self.attempts = max(1, AI_RETRY_ATTEMPTS if attempts is None else attempts)
+        self.hedge = (AI_HEDGE_ENABLED if hedge is None else hedge) and len(self.names) > 1
+        self.hedge_percentile = AI_HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+        self.concurrency = {name: AdaptiveConcurrency(AI_CONCURRENCY_INITIAL, AI_CONCURRENCY_MAX)
+                            for name in self.names}
+        self.latency = {}  # (服务商, 调用方式) -> 最近的耗时
+        self._latency_lock = threading.Lock()
+        # 对冲时首选请求和对冲请求都在后台线程中执行
+        self._executor = ThreadPoolExecutor(max_workers=AI_CONCURRENCY_MAX * 2,
+                                            thread_name_prefix='llm-hedge') if self.hedge else None
+
+    def model_key(self) -> str:
+        """缓存键中使用的模型标识：第一个可用服务商的 名称:模型ID
+
+        故障转移到其他服务商时，结果同样以该标识缓存
+        """
+        error = None
+        for name in self.names:
+            try:
+                provider = get_provider(name)
+                return f"{provider.name}:{provider.model_id}"
+            except ValueError as e:
+                error = e
+        raise error
+
+    def warm(self):
+        """创建所有服务商的客户端，未配置的服务商只记录警告"""
+        for name in self.names:
+            try:
+                get_provider(name)
+            except ValueError as e:
+                logger.warning(f"AI服务商 {name} 不可用: {e}")
+
+    def _window(self, name: str, mode: str) -> _LatencyWindow:
+        with self._latency_lock:
+            return self.latency.setdefault((name, mode), _LatencyWindow())
+
+    def _attempts(self, names: list):
+        """按顺序产出 (服务商名称, 客户端, 第几次尝试)；无法创建客户端的服务商直接跳过"""
+        for index, name in enumerate(names):
+            try:
+                provider = get_provider(name)
+            except ValueError as e:
+                logger.warning(f"跳过AI服务商 {name}: {e}")
+                continue
+            for attempt in range(self.attempts):
+                yield name, provider, attempt
+            if index + 1 < len(names):
+                LLM_FAILOVERS.inc(provider=name)
+
+    def _failed(self, name: str, attempt: int, error: Exception) -> str:
+        """记录一次失败的调用，可以重试时按退避时间等待
+
+        返回:
+            'retry'（在同一服务商上重试）或 'next'（转到下一个服务商）
+        """
+        retryable, throttled = classify_error(error)
+        LLM_ATTEMPTS.inc(provider=name, result='throttled' if throttled else 'error')
+        if not retryable or attempt + 1 >= self.attempts:
+            logger.warning(f"AI服务商 {name} 调用失败: {error}")
+            return 'next'
+        delay = backoff_delay(attempt, error)
+        logger.info(f"AI服务商 {name} 第{attempt + 1}次调用失败（{error}），{delay:.2f}秒后重试")
+        time.sleep(delay)
+        return 'retry'
+
+    def _generate(self, prompt: str, max_output_tokens, mode: str, names: list) -> str:
+        """按优先级依次尝试各服务商，返回第一个成功的结果"""
+        error = None
+        skip = None  # 转到下一个服务商时跳过当前服务商剩余的尝试次数
+        for name, provider, attempt in self._attempts(names):
+            if name == skip:
+                continue
+            limit = self.concurrency[name]
+            with timed("llm_rate_limit_wait"):
+                limit.acquire()
+                get_rate_limiter(name).acquire()
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                with LLM_SECONDS.time(provider=name, mode=mode):
+                    result = provider.generate(prompt, max_output_tokens=max_output_tokens)
+                outcome = 'ok'
+            except Exception as e:
+                outcome = 'throttled' if classify_error(e)[1] else 'error'
+                error = e
+            finally:
+                limit.release(outcome)
+            if outcome == 'ok':
+                LLM_ATTEMPTS.inc(provider=name, result='ok')
+                self._window(name, mode).add(time.perf_counter() - started)
+                return result
+            if self._failed(name, attempt, error) == 'next':
+                skip = name
+        raise error or ValueError("没有可用的AI服务商")
+
+    def generate(self, prompt: str, max_output_tokens: int = None, mode: str = 'single') -> str:
+        """生成内容；启用对冲时，首选请求过慢会向下一个服务商发送同样的请求
+
+        参数:
+            prompt: 提示词
+            max_output_tokens: 可选的输出标记数上限（批量请求）
+            mode: 调用方式（single / batch），用于耗时指标和对冲的耗时统计
+        """
+        delay = self._window(self.names[0], mode).percentile(self.hedge_percentile) if self.hedge else None
+        if delay is None:
+            return self._generate(prompt, max_output_tokens, mode, self.names)
+
+        primary = self._executor.submit(self._generate, prompt, max_output_tokens, mode, self.names)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        # 首选请求超过了耗时分位数：从下一个服务商开始再发送一次
+        LLM_HEDGES.inc(result='sent')
+        hedged = self._executor.submit(self._generate, prompt, max_output_tokens, mode,
+                                       self.names[1:] + self.names[:1])
+        pending = {primary, hedged}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e  # 等待另一个请求
+                    continue
+                if future is hedged:
+                    LLM_HEDGES.inc(result='won')  # 对冲请求先返回
+                return result  # 未完成的请求在后台结束，结果被丢弃
+        raise error
+
+    def stream(self, prompt: str):
+        """流式生成内容，在产出第一段文本之前可以重试和故障转移；已经输出部分内容后出错时直接抛出"""
+        error = None
+        skip = None
+        for name, provider, attempt in self._attempts(self.names):
+            if name == skip:
+                continue
+            limit = self.concurrency[name]
+            with timed("llm_rate_limit_wait"):
+                limit.acquire()
+                get_rate_limiter(name).acquire()
+            outcome = 'error'
+            started = False  # 是否已经产出了文本
+            try:
+                with LLM_SECONDS.time(provider=name, mode='stream'):
+                    for chunk in provider.stream(prompt):
+                        started = True
+                        yield chunk
+                outcome = 'ok'
+            except Exception as e:
+                outcome = 'throttled' if classify_error(e)[1] else 'error'
+                if started:
+                    LLM_ATTEMPTS.inc(provider=name, result=outcome)
+                    raise  # 已经输出了部分内容，无法切换到其他服务商
+                error = e
+            finally:
+                limit.release(outcome)
+            if outcome == 'ok':
+                LLM_ATTEMPTS.inc(provider=name, result='ok')
+                return
+            if self._failed(name, attempt, error) == 'next':
+                skip = name
+        raise error or ValueError("没有可用的AI服务商")
+
+
+_router = None  # 进程内共享的路由
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """获取（必要时创建）进程内共享的路由，服务商列表来自 AI_PROVIDERS（未设置时为 AI_MODEL_TYPE）"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            names = os.getenv('AI_PROVIDERS') or os.getenv('AI_MODEL_TYPE', 'gemini')
+            _router = LLMRouter(names.split(','))
+        return _router
+
+
+def _collect_metrics():
+    """各服务商当前的自适应并发上限（路由尚未使用时不输出）"""
+    if _router is None:
+        return []
+    return [
+        (f"ppt2word_llm_concurrency_limit_{name.replace('-', '_')}", "gauge",
+         f"AI服务商 {name} 当前的自适应并发上限", round(limit.limit, 3))
+        for name, limit in _router.concurrency.items()
+    ]
+
+
+register_collector(_collect_metrics)
@@ -1,22 +1,49 @@
 # 导入必要的库和模块
 import os  # 操作系统相关功能，用于文件路径处理和目录创建
-from flask import Flask, request, jsonify, send_file, render_template  # Flask Web框架相关组件
+import json  # 用于序列化实时推送的事件
+import time  # 用于实时推送的轮询间隔
+import uuid  # 用于生成不冲突的临时文件名
+import shutil  # 用于清理批量任务的临时目录
+import logging  # 配置各模块的日志输出
+from flask import Flask, Request, Response, request, jsonify, send_file, render_template  # Flask Web框架相关组件
 # 导入自定义模块
-from src.ppt_processor import extract_structured_content  # PPT处理模块，用于提取PPT内容
-from src.pdf_processor import extract_text_from_pdf  # PDF处理模块，用于提取PDF内容
-from src.ai_writer import generate_explanation  # AI写作模块，用于生成解释内容
-from src.word_generator import create_word_document  # Word生成模块，用于创建Word文档
+from src.job_queue import submit_job, get_job, get_job_events  # 异步任务队列模块
+from src.ocr import get_ocr_stats  # OCR统计数据（包括预分类跳过的图片数）
+from src.metrics import render_prometheus, timed  # 阶段耗时指标
+from src.batch import run_batch, extract_zip, zip_outputs, BATCH_MAX_FILES  # 批量转换
+from src.uploads import spool_upload, UploadError, UploadTooLargeError, MAX_UPLOAD_MB, BATCH_MAX_UPLOAD_MB  # 上传文件的流式保存和校验
+from src.artifact_store import get_artifact_store  # 生成文件的存储（去重和过期淘汰）
+from src.profiling import profiling_requested, profile_access_allowed  # 按需启用的任务性能分析
+
+# 各处理模块通过logging记录错误，统一输出到标准错误（gunicorn会收集）
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+
+class UploadRequest(Request):
+    """按路由区分请求体大小上限的请求类
+
+    超出上限时Werkzeug在读取请求体的过程中直接中止，返回413；
+    只有 /batch 使用批量上传的上限，其他路由（包括 /process）使用单个文件的上限
+    """
+
+    @property
+    def max_content_length(self) -> int:
+        limit_mb = BATCH_MAX_UPLOAD_MB if self.endpoint == 'process_batch' else MAX_UPLOAD_MB
+        return int(limit_mb * 1024 * 1024)
 
 # 创建Flask应用实例
 app = Flask(__name__, 
            static_folder='../static',  # 静态文件目录
            template_folder='../templates')  # 模板文件目录
+app.request_class = UploadRequest  # 请求体大小上限按路由检查
 
 # Docker环境下的绝对路径配置
 # 设置基础目录、输入文件目录和输出文件目录
 BASE_DIR = "/app"  # Docker容器内的应用根目录
-INPUT_DIR = os.path.join(BASE_DIR, "assets", "input")  # 上传文件存储目录
-OUTPUT_DIR = os.path.join(BASE_DIR, "assets", "output")  # 生成文件存储目录
+INPUT_DIR = os.getenv('INPUT_DIR', os.path.join(BASE_DIR, "assets", "input"))  # 上传文件存储目录
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', os.path.join(BASE_DIR, "assets", "output"))  # 生成文件存储目录（与word_generator一致）
 
 # 定义根路由，返回前端页面
 @app.route('/')
@@ -31,15 +58,26 @@ def api_status():
     return jsonify({
         "status": "API正常运行",  # API状态信息
         "endpoints": {  # 可用的API端点列表
-            "处理文件": "POST /process",  # 用于上传和处理文件的端点
-            "下载文件": "GET /download/<filename>"  # 用于下载生成文件的端点
-        }
+            "处理文件": "POST /process",  # 用于上传文件并创建转换任务的端点
+            "批量处理": "POST /batch",  # 上传多个文件或一个压缩包，作为一个批量任务转换
+            "任务状态": "GET /jobs/<job_id>",  # 用于查询转换任务进度的端点
+            "实时输出": "GET /jobs/<job_id>/events",  # 以SSE方式推送AI实时生成内容的端点
+            "性能分析": "GET /jobs/<job_id>/profile",  # 下载任务的性能分析结果（上传时带管理员请求头X-Profile-Token或任务超过慢任务阈值时生成）
+            "下载文件": "GET /download/<key>",  # 用于下载生成文件的端点（key由任务结果中的download_url给出）
+            "性能指标": "GET /metrics"  # Prometheus格式的各阶段耗时和资源指标
+        },
+        "ocr": get_ocr_stats()  # OCR统计：识别次数、缓存命中和跳过的图片数量
     })
 
+# 请求体超过大小上限时返回JSON格式的错误，前端据此提示用户
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": "文件太大", "details": f"单个文件不能超过{MAX_UPLOAD_MB:g}MB，批量上传不能超过{BATCH_MAX_UPLOAD_MB:g}MB"}), 413
+
 # 定义处理文件的路由，只接受POST请求
 @app.route('/process', methods=['POST'])
 def process_file():
-    # 检查请求中是否包含文件
+    # 检查请求中是否包含文件（请求体超过单文件上限时，读取表单时由UploadRequest中止并返回413）
     if 'file' not in request.files:
         # 如果没有文件，返回400错误
         return jsonify({"error": "未上传文件"}), 400  # 400表示客户端错误
@@ -51,77 +89,260 @@ def process_file():
         # 如果文件名为空，返回400错误
         return jsonify({"error": "文件名无效"}), 400
     
-    # 验证文件扩展名是否为支持的格式
-    valid_extensions = ('.pptx', '.ppt', '.pdf')  # 支持的文件格式列表
-    if not file.filename.lower().endswith(valid_extensions):
-        # 如果文件格式不支持，返回400错误
-        return jsonify({"error": "仅支持PPT、PPTX或PDF格式"}), 400
+    # 只使用文件名部分，忽略客户端提供的路径
+    original_filename = os.path.basename(file.filename.replace('\\', '/'))
     
     # 创建目录（使用绝对路径）
     # 确保输入和输出目录存在，不存在则创建
     os.makedirs(INPUT_DIR, exist_ok=True)  # exist_ok=True表示目录已存在也不报错
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
     
-    # 构建临时文件路径并保存上传的文件
-    temp_path = os.path.join(INPUT_DIR, file.filename)  # 完整的文件保存路径
-    file.save(temp_path)  # 将上传的文件保存到临时路径
+    # 把上传的文件流式写入唯一的临时文件，同时按文件头校验格式：
+    # 文件名由服务器生成，并发上传同名文件不会互相覆盖；格式不符的文件在解析之前就被拒绝
+    try:
+        with timed("upload"):
+            temp_path = spool_upload(file, INPUT_DIR, max_bytes=int(MAX_UPLOAD_MB * 1024 * 1024))
+    except UploadTooLargeError:
+        return request_too_large(None)
+    except UploadError as e:
+        return jsonify({"error": "仅支持PPT、PPTX或PDF格式", "details": str(e)}), 400
+    
+    # 将转换任务加入后台队列，立即返回任务ID，由前端轮询任务状态
+    # 带有管理员请求头的上传分析该任务的性能
+    job_id = submit_job(_run_conversion, temp_path, original_filename, filename=original_filename,
+                        profile=profiling_requested(request.headers))
+    return jsonify({
+        "success": True,  # 任务已创建
+        "job_id": job_id,  # 任务ID
+        "status_url": f"/jobs/{job_id}"  # 查询任务状态的链接
+    }), 202  # 202表示请求已接受，正在后台处理
+
+def _run_conversion(temp_path: str, original_filename: str, progress_callback=None, event_callback=None) -> dict:
+    """在后台工作线程中执行的转换任务"""
+    # 转换流程依赖python-pptx、PyMuPDF、python-docx和模型SDK，在第一次转换时才导入，
+    # 使Web进程快速启动；预热（src.warmup）会在开始服务之前提前导入
+    from src.converter import convert_file  # 转换流程模块，串联内容提取和Word生成
+    from src.word_generator import output_filename  # 生成的Word文档的文件名
     
+    store = get_artifact_store()
+    # Word文档先写入产物存储的暂存文件，完成后登记到存储中，得到本任务专属的下载键
+    output_path = store.staging_path(suffix='.docx')
     try:
-        # 根据文件类型进行不同处理
-        if file.filename.lower().endswith('.pdf'):
-            # 如果是PDF文件，使用PDF处理器提取文本
-            # extract_text_from_pdf函数会解析PDF文件并提取其中的文本内容
-            content = extract_text_from_pdf(temp_path)
-        else:
-            # 如果是PPT/PPTX文件，使用PPT处理器提取结构化内容
-            # extract_structured_content函数会解析PPT文件并提取其中的文本、图片和结构信息
-            content = extract_structured_content(temp_path)
-        
-        # 生成Word文档
-        # 将提取的内容传递给Word生成器，创建格式化的文档
-        # create_word_document函数接收提取的内容和原始文件名，生成格式化的Word文档
-        # 并返回生成的Word文档路径
-        output_path = create_word_document(content, file.filename)
+        # 提取内容并生成Word文档
+        convert_file(
+            temp_path, original_filename,
+            progress_callback=progress_callback, event_callback=event_callback,
+            output_path=output_path
+        )
         
-        # 返回成功响应
-        # 从输出路径中提取文件名（不包含路径）
-        output_filename = os.path.basename(output_path)
-        return jsonify({
-            "success": True,  # 处理状态
-            "download_url": f"/download/{output_filename}",  # 生成的下载链接，指向download路由
-            "output_file": output_filename  # 生成的文件名
-        })
-    
+        download_name = output_filename(original_filename)  # 用户下载时看到的文件名
+        key = store.put(output_path, download_name)
+        return {
+            "download_url": f"/download/{key}",  # 生成的下载链接，指向download路由
+            "output_file": download_name  # 生成的文件名
+        }
     except Exception as e:
-        # 捕获处理过程中的任何异常
-        app.logger.error(f"处理错误: {str(e)}")  # 记录错误日志
-        # 返回JSON格式的错误响应，包含错误信息和详细说明
-        return jsonify({
-            "error": "文件处理错误",  # 错误类型
-            "details": str(e)  # 错误详情
-        }), 500  # 500表示服务器内部错误
+        # 记录错误日志后继续抛出，由任务队列标记为失败
+        app.logger.error(f"处理错误: {str(e)}")
+        raise
     finally:
         # 无论处理成功还是失败，都会执行finally块中的代码
         # 清理临时文件，避免占用磁盘空间
         if os.path.exists(temp_path):
             os.remove(temp_path)  # 删除临时上传的文件
+        if os.path.exists(output_path):
+            os.remove(output_path)  # 转换失败时删除未完成的暂存文件
+
+# 定义性能指标路由，以Prometheus文本格式输出各阶段耗时直方图和计数器
+@app.route('/metrics')
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# 定义批量处理的路由：接受多个文件（字段名files）或一个zip压缩包
+@app.route('/batch', methods=['POST'])
+def process_batch():
+    uploads = [file for file in request.files.getlist('files') + request.files.getlist('file') if file.filename]
+    if not uploads:
+        return jsonify({"error": "没有上传文件"}), 400
+    
+    # 每个批次使用独立的输入目录
+    batch_id = uuid.uuid4().hex
+    batch_dir = os.path.join(INPUT_DIR, f"batch_{batch_id}")
+    os.makedirs(batch_dir, exist_ok=True)
+    
+    paths = []
+    try:
+        with timed("upload"):
+            for index, file in enumerate(uploads):
+                filename = os.path.basename(file.filename.replace('\\', '/'))
+                # 流式写入临时文件并按文件头校验格式
+                spooled = spool_upload(file, batch_dir, allowed=('pdf', 'ppt', 'pptx', 'zip'))
+                if filename.lower().endswith('.zip'):
+                    # 压缩包解压到批次目录中，保留课程的目录结构
+                    paths.extend(extract_zip(spooled, os.path.join(batch_dir, os.path.splitext(filename)[0])))
+                    os.remove(spooled)
+                else:
+                    # 保留原始文件名（用于输出文档命名），同名文件放到不同的子目录
+                    target_dir = batch_dir if not os.path.exists(os.path.join(batch_dir, filename)) \
+                        else os.path.join(batch_dir, str(index))
+                    os.makedirs(target_dir, exist_ok=True)
+                    path = os.path.join(target_dir, filename)
+                    os.replace(spooled, path)
+                    paths.append(path)
+    except Exception as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        app.logger.error(f"批量上传错误: {str(e)}")
+        return jsonify({"error": "无法读取上传的文件", "details": str(e)}), 400
+    
+    if not paths:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        return jsonify({"error": "没有找到PPT、PPTX或PDF文件"}), 400
+    if len(paths) > BATCH_MAX_FILES:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        return jsonify({"error": f"文件数量超过上限（{BATCH_MAX_FILES}）"}), 400
+    
+    job_id = submit_job(_run_batch, batch_dir, paths, batch_id, filename=f"{len(paths)}个文件",
+                        profile=profiling_requested(request.headers))
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "files": len(paths),
+        "status_url": f"/jobs/{job_id}"
+    }), 202
+
+def _run_batch(batch_dir: str, paths: list, batch_id: str, progress_callback=None, event_callback=None) -> dict:
+    """在后台工作线程中执行的批量转换任务，所有文档和报告打包为一个压缩包"""
+    store = get_artifact_store()
+    output_dir = os.path.join(OUTPUT_DIR, f"batch_{batch_id}")  # 单独的输出文档，打包后删除
+    zip_path = store.staging_path(suffix='.zip')
+    try:
+        report = run_batch(paths, output_dir=output_dir, base_dir=batch_dir, progress_callback=progress_callback)
+        zip_filename = f"批量学习文档_{batch_id}.zip"
+        zip_outputs(report, output_dir, zip_path)
+        key = store.put(zip_path, zip_filename)
+        return {
+            "download_url": f"/download/{key}",
+            "output_file": zip_filename,
+            "report": report
+        }
+    finally:
+        # 清理上传的文件和单独的输出文档（已打包到压缩包中）
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        shutil.rmtree(output_dir, ignore_errors=True)
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
+
+# 定义查询任务状态的路由
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        # 任务不存在或已过期
+        return jsonify({"error": "任务未找到"}), 404
+    
+    response = {
+        "job_id": job["job_id"],
+        "status": job["status"],  # queued / running / completed / failed
+        "filename": job["filename"],
+        "progress": job["progress"]  # 逐张幻灯片的进度: done / total / stage
+    }
+    if job["status"] == "completed":
+        # 任务完成时返回下载信息
+        response.update(job["result"])
+    elif job["status"] == "failed":
+        # 任务失败时返回错误信息
+        response["error"] = "文件处理错误"
+        response["details"] = job["error"]
+    if job["profile"]:
+        # 任务有性能分析结果时返回下载链接
+        response["profile_url"] = f"/jobs/{job_id}/profile"
+    
+    # 轮询方式获取实时输出：?since=<最后收到的事件编号>
+    since = request.args.get('since', type=int)
+    if since is not None:
+        response["events"] = get_job_events(job_id, since) or []
+    return jsonify(response)
+
+# 定义实时输出的路由，以Server-Sent Events方式推送AI边生成边输出的文本
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    if get_job(job_id) is None:
+        return jsonify({"error": "任务未找到"}), 404
+    
+    # 断线重连时浏览器会通过Last-Event-ID告知最后收到的事件编号
+    since = request.args.get('since', type=int)
+    if since is None:
+        since = int(request.headers.get('Last-Event-ID', 0) or 0)
+    
+    def stream():
+        cursor = since
+        last_progress = None
+        while True:
+            job = get_job(job_id)
+            if job is None:
+                break
+            # 推送新的AI输出片段
+            for event in get_job_events(job_id, cursor) or []:
+                cursor = event["seq"]
+                yield f"id: {cursor}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            # 进度变化时推送进度事件
+            progress = (job["status"], job["progress"])
+            if progress != last_progress:
+                last_progress = progress
+                status = {"status": job["status"], "progress": job["progress"]}
+                yield f"event: status\ndata: {json.dumps(status, ensure_ascii=False)}\n\n"
+            if job["status"] in ("completed", "failed"):
+                break
+            time.sleep(0.5)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"  # 禁止反向代理缓冲，保证实时推送
+    })
+
+# 定义下载任务性能分析结果的路由：默认返回JSON，?format=folded 返回可直接生成火焰图的折叠调用栈
+@app.route('/jobs/<job_id>/profile')
+def job_profile(job_id):
+    if not profile_access_allowed(request.headers):
+        return jsonify({"error": "需要管理员令牌"}), 403
+    job = get_job(job_id)
+    if job is None or not job["profile"]:
+        return jsonify({"error": "该任务没有性能分析结果"}), 404
+    try:
+        if request.args.get('format') == 'folded':
+            with open(job["profile"], encoding='utf-8') as f:
+                folded = json.load(f)["folded"]
+            return Response("\n".join(folded) + "\n", mimetype='text/plain; charset=utf-8')
+        return send_file(job["profile"], mimetype='application/json', as_attachment=True,
+                         download_name=f"profile_{job_id}.json")
+    except FileNotFoundError:
+        return jsonify({"error": "该任务没有性能分析结果"}), 404
 
-# 定义下载文件的路由，接受文件名作为URL参数
-@app.route('/download/<filename>')
-def download_file(filename):
-    # 构建完整的文件路径
-    file_path = os.path.join(OUTPUT_DIR, filename)
-    # 检查文件是否存在
-    if os.path.exists(file_path):
-        # 如果文件存在，使用Flask的send_file函数发送文件
-        # as_attachment=True参数会让浏览器下载文件而不是在浏览器中打开
-        return send_file(file_path, as_attachment=True)
+# 定义下载文件的路由，接受任务结果中的下载键作为URL参数
+@app.route('/download/<key>')
+def download_file(key):
+    # 在产物存储中查找下载键对应的文件（不存在或已过期时返回None）
+    artifact = get_artifact_store().get(key)
+    if artifact is not None:
+        try:
+            # as_attachment=True参数会让浏览器下载文件而不是在浏览器中打开；
+            # 以内容哈希作为ETag并启用条件请求：重复下载返回304，断点续传返回206
+            return send_file(
+                artifact["path"], as_attachment=True, download_name=artifact["download_name"],
+                etag=artifact["digest"], conditional=True, max_age=0
+            )
+        except FileNotFoundError:
+            pass  # 文件恰好在查找之后被淘汰
     # 如果文件不存在，记录错误并返回404错误
-    app.logger.error(f"文件未找到: {file_path}")  # 记录错误日志
+    app.logger.error(f"文件未找到: {key}")  # 记录错误日志
     return jsonify({"error": "文件未找到"}), 404  # 404表示资源未找到
 
 # 程序入口点，只有直接运行此文件时才会执行
 if __name__ == '__main__':
+    # 开发服务器没有gunicorn的钩子，直接在当前进程中预热
+    from src.warmup import WARMUP, preload, warm_worker
+    if WARMUP:
+        preload()
+        warm_worker()
     # 启动Flask应用
     # host='0.0.0.0'表示监听所有网络接口，允许外部访问
     # port=5000指定服务运行的端口号
@@ -0,0 +1,190 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取配置和保存清单文件
+import bisect  # 用于计算最长递增子序列
+import json  # 清单以JSON格式保存
+import hashlib  # 用于计算幻灯片指纹和清单文件名
+import logging  # 记录读取清单时的错误
+import tempfile  # 先写入临时文件再替换，避免清单文件写到一半
+from .disk_cache import CACHE_DIR  # 清单与其他缓存放在同一目录下
+from .ai_writer import PROMPT_VERSION, GENERATION_ERROR_MARKER  # 提示词变化时旧清单中的章节失效
+from .llm_router import get_router  # 服务商或模型变化时旧清单中的章节失效
+from .metrics import ERRORS  # 错误指标
+
+logger = logging.getLogger(__name__)
+
+# 是否启用增量转换（重新上传同名文档时只处理变化的幻灯片）
+INCREMENTAL_ENABLED = os.getenv('INCREMENTAL_ENABLED', '1') == '1'
+# 清单文件的存放目录
+MANIFEST_DIR = os.getenv('MANIFEST_DIR', os.path.join(CACHE_DIR, 'manifests'))
+
+
+def slide_fingerprint(unit: dict) -> str:
+    """计算一张幻灯片/页面的指纹：标题 + 文本/表格内容 + 图片内容哈希
+
+    只使用提取阶段就能得到的信息，因此可以在OCR之前判断幻灯片是否变化
+
+    参数:
+        unit: 单张幻灯片或单个页面的结构化内容
+
+    返回:
+        十六进制的SHA-256指纹
+    """
+    digest = hashlib.sha256()
+    digest.update((unit.get('title') or '').encode('utf-8'))
+    for element in unit.get('content', []):
+        digest.update(b'\x00' + str(element.get('type')).encode('utf-8'))
+        digest.update(b'\x00' + str(element.get('data')).encode('utf-8'))
+    for image_data in unit.get('images', []):
+        digest.update(b'\x01' + image_data['image'].digest.encode('ascii'))
+    return digest.hexdigest()
+
+
+def _longest_increasing(values: list) -> set:
+    """返回values中一个最长严格递增子序列的下标集合（O(n log n)）"""
+    tails = []  # tails[k]: 长度为k+1的递增子序列的最小结尾值
+    tail_indices = []  # 与tails对应的下标
+    parents = [-1] * len(values)  # 每个元素在子序列中的前一个元素下标
+    for index, value in enumerate(values):
+        position = bisect.bisect_left(tails, value)
+        if position == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[position] = value
+            tail_indices[position] = index
+        parents[index] = tail_indices[position - 1] if position > 0 else -1
+    result = set()
+    index = tail_indices[-1] if tail_indices else -1
+    while index != -1:
+        result.add(index)
+        index = parents[index]
+    return result
+
+
+class DocumentManifest:
+    """一个文档最近一次转换的清单：每张幻灯片的指纹、发送给AI的内容和生成的章节
+
+    重新上传同名文档时，指纹未变化的幻灯片直接复用上次生成的章节，
+    跳过OCR和AI调用；转换结束后用本次的结果覆盖清单
+    """
+
+    def __init__(self, path: str, version: str, slides: list = None):
+        """
+        参数:
+            path: 清单文件路径
+            version: 清单版本（提示词版本 + 模型类型），版本不同的旧清单会被忽略
+            slides: 上次转换的幻灯片列表 [{"fingerprint", "content", "section"}]
+        """
+        self.path = path
+        self.version = version
+        self.previous = slides or []
+        # 指纹 -> 上次的幻灯片记录（只保留有可复用章节的记录）
+        self._by_fingerprint = {}
+        for slide in self.previous:
+            if slide.get('section') is not None:
+                self._by_fingerprint.setdefault(slide['fingerprint'], slide)
+        self.slides = []  # 本次转换按顺序记录的幻灯片
+
+    @classmethod
+    def load(cls, original_filename: str):
+        """加载文档的清单，不存在或无法读取时返回空清单
+
+        参数:
+            original_filename: 原始文件名，同名的文档视为同一文档的不同版本
+
+        返回:
+            清单对象；没有可用的AI服务商时返回None（不做增量转换，各幻灯片照常写入错误提示章节）
+        """
+        key = hashlib.sha256(original_filename.encode('utf-8')).hexdigest()
+        path = os.path.join(MANIFEST_DIR, f"{key}.json")
+        # 与LLM缓存键使用相同的模型标识（由 AI_PROVIDERS 路由决定）
+        try:
+            version = f"{PROMPT_VERSION}:{get_router().model_key()}"
+        except Exception as e:
+            ERRORS.inc(stage='manifest')
+            logger.warning(f"无法确定AI模型，跳过增量转换: {e}")
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == version:
+                return cls(path, version, data.get('slides'))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取转换清单时出错，将完整转换: {e}")
+        return cls(path, version)
+
+    def lookup(self, fingerprint: str):
+        """查找指纹相同的上次幻灯片记录，没有时返回None"""
+        return self._by_fingerprint.get(fingerprint)
+
+    def record(self, unit: dict, combined_content: str, section):
+        """按顺序记录本次转换中的一张幻灯片
+
+        参数:
+            unit: 幻灯片结构化内容（需要包含fingerprint）
+            combined_content: 发送给AI的合并文本
+            section: AI生成的章节文本；没有内容时为空字符串，生成失败时为None（下次重新生成）
+        """
+        if section and GENERATION_ERROR_MARKER in section:
+            section = None  # AI生成失败的章节不复用
+        self.slides.append({
+            "fingerprint": unit.get('fingerprint') or slide_fingerprint(unit),
+            "content": combined_content,
+            "section": section
+        })
+
+    def diff(self) -> dict:
+        """比较本次与上次转换的幻灯片
+
+        返回:
+            {"unchanged", "added", "removed", "changed", "reordered"}，
+            除unchanged为数量外均为幻灯片序号（从1开始）列表；
+            removed使用上次的序号，其余使用本次的序号
+        """
+        old = [slide['fingerprint'] for slide in self.previous]
+        new = [slide['fingerprint'] for slide in self.slides]
+        old_positions = {}
+        for index, fingerprint in enumerate(old):
+            old_positions.setdefault(fingerprint, index)
+        new_set = set(new)
+
+        result = {"unchanged": 0, "added": [], "removed": [], "changed": [], "reordered": []}
+        replaced = set()  # 被修改的旧幻灯片位置，不再计为删除
+        # 保留下来的幻灯片在旧版本中的位置；其中最长的递增子序列保持了原有顺序，
+        # 不在该子序列中的幻灯片视为被移动
+        kept = [old_positions[fingerprint] for fingerprint in new if fingerprint in old_positions]
+        in_order = _longest_increasing(kept)
+        kept_index = 0
+        for index, fingerprint in enumerate(new):
+            if fingerprint in old_positions:
+                if kept_index in in_order:
+                    result["unchanged"] += 1
+                else:
+                    result["reordered"].append(index + 1)
+                kept_index += 1
+            elif index < len(old) and old[index] not in new_set and index not in replaced:
+                # 同一位置的旧幻灯片已不存在，视为修改
+                result["changed"].append(index + 1)
+                replaced.add(index)
+            else:
+                result["added"].append(index + 1)
+        result["removed"] = [
+            index + 1 for index, fingerprint in enumerate(old)
+            if fingerprint not in new_set and index not in replaced
+        ]
+        return result
+
+    def save(self):
+        """保存本次转换的清单（原子替换旧文件）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.version, "slides": self.slides}, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -0,0 +1,189 @@
+# 导入必要的库和模块
+import time  # 用于计时
+import threading  # 线程锁，保护指标数据
+from contextlib import contextmanager  # 用于实现计时上下文管理器
+
+# 默认的耗时直方图分桶（秒），覆盖从单个形状解析到整份文档转换的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    """转义Prometheus文本格式中的标签值"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    """把标签名和标签值格式化为 {a="1",b="2"}"""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    """只增不减的计数器，按标签分别计数，线程安全"""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = {}  # 标签值元组 -> 累计值
+        self.lock = threading.Lock()
+        _register(self)
+
+    def inc(self, value: float = 1, **labels):
+        """累加计数"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self) -> list:
+        """输出Prometheus文本格式的行"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """耗时直方图，按标签分别统计，线程安全
+
+    与Prometheus的histogram类型一致（累积分桶 + 总和 + 次数），
+    可在Prometheus中用 histogram_quantile 计算p50/p95
+    """
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}  # 标签值元组 -> [各分桶计数..., 总和, 次数]
+        self.lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value: float, **labels):
+        """记录一次观测值"""
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """计时上下文管理器，代码块结束时（包括抛出异常时）记录耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        """输出Prometheus文本格式的行"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {key: list(series) for key, series in self.series.items()}
+        for key, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {series[-1]}")
+        return lines
+
+
+_metrics = []  # 已注册的指标
+_collectors = []  # 在输出时才读取当前值的采集函数
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _metrics.append(metric)
+
+
+def register_collector(collect):
+    """注册一个采集函数，在输出指标时调用
+
+    参数:
+        collect: 无参函数，返回 [(指标名, 类型(gauge/counter), 说明, 值), ...]
+    """
+    with _registry_lock:
+        _collectors.append(collect)
+
+
+def render_prometheus() -> str:
+    """以Prometheus文本格式输出所有指标"""
+    with _registry_lock:
+        metrics = list(_metrics)
+        collectors = list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collect in collectors:
+        try:
+            for name, kind, help_text, value in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        except Exception:
+            continue  # 单个采集函数出错不影响其他指标
+    return "\n".join(lines) + "\n"
+
+
+# 各处理阶段的耗时：上传、排队、页数统计、逐张提取、逐张图片OCR、Word写入和保存等
+STAGE_SECONDS = Histogram('ppt2word_stage_seconds', '各处理阶段的耗时（秒）', labels=('stage',))
+# 每次AI调用的耗时，按服务商和调用方式（single / stream / batch）区分
+LLM_SECONDS = Histogram('ppt2word_llm_request_seconds', 'AI接口调用耗时（秒）', labels=('provider', 'mode'))
+# 服务商返回的标记数（prompt / completion）
+LLM_TOKENS = Counter('ppt2word_llm_tokens_total', 'AI接口消耗的标记数', labels=('provider', 'kind'))
+# 各阶段发生的错误数
+ERRORS = Counter('ppt2word_errors_total', '各处理阶段发生的错误数', labels=('stage',))
+
+
+# 线程ID -> 该线程当前所在的处理阶段（嵌套时按进入顺序排列），供采样分析器判断样本属于哪个阶段；
+# 每个线程只修改自己的条目
+_active_stages = {}
+
+
+@contextmanager
+def timed(stage: str):
+    """记录一个处理阶段耗时的上下文管理器，例如 with timed("docx_save"): ..."""
+    ident = threading.get_ident()
+    stages = _active_stages.setdefault(ident, [])
+    stages.append(stage)
+    try:
+        with STAGE_SECONDS.time(stage=stage):
+            yield
+    finally:
+        stages.pop()
+        if not stages:
+            del _active_stages[ident]
+
+
+def current_stage(ident: int):
+    """指定线程当前所在的最内层处理阶段，不在任何阶段中时返回None"""
+    stages = _active_stages.get(ident)
+    try:
+        return stages[-1] if stages else None
+    except IndexError:
+        return None  # 读取的同时该线程刚好离开了阶段
+
+
+def record_tokens(provider: str, prompt_tokens=None, completion_tokens=None):
+    """记录服务商返回的标记数，服务商没有返回时忽略"""
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, provider=provider, kind='prompt')
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, provider=provider, kind='completion')
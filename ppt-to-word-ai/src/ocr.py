@@ -0,0 +1,367 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取缓存配置
+import io  # 用于处理二进制流
+import hashlib  # 用于计算图片内容摘要
+import time  # 用于统计OCR耗时
+import logging  # 记录OCR错误
+import threading  # 线程锁，保护内存缓存和统计数据
+import multiprocessing  # 用于创建OCR进程池
+from collections import OrderedDict  # 用于实现LRU内存缓存
+from concurrent.futures import ProcessPoolExecutor  # 跨请求复用的OCR进程池
+from concurrent.futures.process import BrokenProcessPool  # 工作进程异常退出
+from .disk_cache import DiskCache, CACHE_DIR  # 持久化缓存
+from .image_filter import prefilter_images, likely_has_text, OCR_TEXT_DETECTION  # OCR前的图片预分类
+from .metrics import STAGE_SECONDS, ERRORS, register_collector  # 耗时和错误指标
+
+logger = logging.getLogger(__name__)
+
+# OCR结果缓存配置
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', '1') == '1'  # 是否启用缓存
+OCR_CACHE_MEMORY_ENTRIES = int(os.getenv('OCR_CACHE_MEMORY_ENTRIES', 1024))  # 内存中保留的条目数
+OCR_CACHE_MAX_MB = float(os.getenv('OCR_CACHE_MAX_MB', 50))  # 磁盘缓存总大小上限（MB）
+
+# OCR进程池配置（Tesseract是CPU密集型的，按核心数并行）
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', os.cpu_count() or 1))  # 工作进程数量
+OCR_TIMEOUT = float(os.getenv('OCR_TIMEOUT', 60))  # 单张图片的识别超时（秒）
+
+
+class _MemoryLRU:
+    """有界的内存LRU缓存，线程安全"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)  # 标记为最近使用
+            return value
+
+    def set(self, key: str, value: str):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)  # 淘汰最久未使用的条目
+
+
+_memory_cache = _MemoryLRU(OCR_CACHE_MEMORY_ENTRIES)
+_disk_cache = None  # 跨请求、跨进程共享的持久化缓存
+_disk_cache_lock = threading.Lock()
+_pool = None  # 进程内共享的OCR进程池（首次使用时创建）
+_pool_lock = threading.Lock()
+# 正在识别的图片：缓存键 -> Future；内容相同的图片在识别完成之前再次提交时共用同一次识别
+_inflight = {}
+_inflight_lock = threading.Lock()
+# OCR统计数据，用于衡量预分类节省了多少OCR
+_stats = {
+    "images": 0,  # 提交识别的图片总数
+    "cache_hits": 0,  # 命中缓存的图片数
+    "ocr_runs": 0,  # 实际运行Tesseract的次数
+    "ocr_seconds": 0.0,  # Tesseract累计耗时（秒）
+    "skipped_small": 0,  # 因尺寸过小跳过
+    "skipped_decoration": 0,  # 因是重复的装饰图片跳过
+    "skipped_no_text": 0  # 因未检测到文字区域跳过
+}
+_stats_lock = threading.Lock()
+
+
+def _get_disk_cache():
+    """获取OCR磁盘缓存，无法创建时返回None"""
+    global _disk_cache
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            try:
+                _disk_cache = DiskCache(
+                    os.path.join(CACHE_DIR, 'ocr_cache.sqlite3'),
+                    max_bytes=int(OCR_CACHE_MAX_MB * 1024 * 1024)
+                )
+            except Exception as e:
+                logger.warning(f"OCR缓存初始化失败，已禁用磁盘缓存: {e}")
+                return None
+        return _disk_cache
+
+
+def ocr_cache_key(blob: bytes, lang: str = None, config: str = '') -> str:
+    """计算OCR缓存键：图片内容摘要 + 识别语言 + Tesseract配置"""
+    digest = hashlib.sha256(blob).hexdigest()
+    return f"{digest}:{lang or ''}:{config}"
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """获取（必要时创建）OCR进程池，进程池在所有请求之间复用"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 使用spawn启动方式，避免在多线程的Web进程中fork
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, OCR_WORKERS),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+
+def _reset_ocr_pool(broken_pool: ProcessPoolExecutor):
+    """丢弃已损坏的进程池，下次使用时重新创建"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken_pool:  # 其他请求可能已经重建了进程池
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _record(**increments):
+    """累加OCR统计数据"""
+    with _stats_lock:
+        for name, value in increments.items():
+            _stats[name] += value
+
+
+def get_ocr_stats() -> dict:
+    """获取OCR统计数据的快照，包括预分类跳过的图片数量"""
+    with _stats_lock:
+        stats = dict(_stats)
+    # 按平均识别耗时估算跳过的图片节省的时间
+    skipped = stats["skipped_small"] + stats["skipped_decoration"] + stats["skipped_no_text"]
+    average = stats["ocr_seconds"] / stats["ocr_runs"] if stats["ocr_runs"] else 0.0
+    stats["estimated_seconds_saved"] = round(skipped * average, 3)
+    return stats
+
+
+def _collect_ocr_metrics() -> list:
+    """把OCR统计数据转换为 /metrics 中的计数器"""
+    stats = get_ocr_stats()
+    return [
+        (f"ppt2word_ocr_{name}_total", 'counter', f"OCR统计: {name}", value)
+        for name, value in stats.items() if name != "estimated_seconds_saved"
+    ]
+
+
+register_collector(_collect_ocr_metrics)
+
+
+def _ocr_task(blob: bytes, lang: str, config: str, timeout: float) -> tuple:
+    """OCR工作进程中执行的任务：先检测文字区域，再运行Tesseract
+
+    返回:
+        (识别文本, 是否因未检测到文字而跳过, Tesseract耗时)
+    """
+    # 只在OCR工作进程中使用，Web进程不需要加载
+    import pytesseract  # OCR工具，用于从图像中提取文本
+    from PIL import Image  # 图像处理库
+
+    image = Image.open(io.BytesIO(blob))
+    if not likely_has_text(image):
+        return "", True, 0.0
+    started = time.perf_counter()
+    text = pytesseract.image_to_string(image, lang=lang, config=config, timeout=timeout)
+    return (text.strip() if text else ""), False, time.perf_counter() - started
+
+
+def _warm_task(lang: str) -> float:
+    """在OCR工作进程中导入依赖并识别一张小图片，返回耗时
+
+    第一次识别需要读取Tesseract的语言数据，预热后这些文件已在系统的页缓存中
+    """
+    started = time.perf_counter()
+    import pytesseract  # OCR工具，用于从图像中提取文本
+    from PIL import Image, ImageDraw  # 生成预热用的图片
+
+    image = Image.new('L', (160, 40), 255)
+    ImageDraw.Draw(image).text((10, 10), "warmup", fill=0)
+    likely_has_text(image)  # 同时导入OpenCV
+    try:
+        pytesseract.image_to_string(image, lang=lang, timeout=OCR_TIMEOUT)
+    except Exception as e:
+        # pytesseract的部分异常无法在进程间传递（会使进程池损坏），转换为普通异常
+        raise RuntimeError(f"OCR预热失败: {e}") from None
+    time.sleep(0.05)  # 保持当前进程忙碌，使其余预热任务分配到其他工作进程
+    return time.perf_counter() - started
+
+
+def warm_ocr_pool(lang: str = None):
+    """启动OCR进程池的所有工作进程，并在每个进程中完成一次识别；同时打开磁盘缓存
+
+    返回:
+        各预热任务的耗时（秒）列表
+    """
+    if OCR_CACHE_ENABLED:
+        _get_disk_cache()
+    pool = get_ocr_pool()
+    futures = [pool.submit(_warm_task, lang) for _ in range(max(1, OCR_WORKERS))]
+    return [future.result(timeout=OCR_TIMEOUT) for future in futures]
+
+
+def _cache_get(key: str):
+    """依次查询内存缓存和磁盘缓存；磁盘缓存出错（例如数据库被锁、磁盘已满）时记录错误并按未命中处理"""
+    text = _memory_cache.get(key)
+    if text is not None:
+        return text
+    disk_cache = _get_disk_cache()
+    if disk_cache is not None:
+        try:
+            text = disk_cache.get(key)
+        except Exception as e:
+            ERRORS.inc(stage='ocr_cache')
+            logger.warning(f"读取OCR磁盘缓存出错: {e}")
+            return None
+        if text is not None:
+            _memory_cache.set(key, text)
+    return text
+
+
+def _cache_set(key: str, text: str):
+    """同时写入内存缓存和磁盘缓存；磁盘缓存出错时只记录错误，识别结果照常返回"""
+    _memory_cache.set(key, text)
+    disk_cache = _get_disk_cache()
+    if disk_cache is not None:
+        try:
+            disk_cache.set(key, text)
+        except Exception as e:
+            ERRORS.inc(stage='ocr_cache')
+            logger.warning(f"写入OCR磁盘缓存出错: {e}")
+
+
+class OcrBatch:
+    """一批已提交到OCR进程池的图片，调用result()等待并获取识别结果"""
+
+    def __init__(self, size: int, pool: ProcessPoolExecutor):
+        self.results = [""] * size  # 与输入图片一一对应的识别文本
+        self.pending = {}  # 缓存键 -> (Future, [需要该结果的图片下标])
+        self.shared = set()  # 由其他批次提交的识别（统计和缓存由提交的批次负责）
+        self.pool = pool
+
+    def result(self) -> list:
+        """等待所有图片识别完成，返回与输入一一对应的文本列表"""
+        for key, (future, indices) in self.pending.items():
+            shared = key in self.shared
+            try:
+                # Tesseract自身会在OCR_TIMEOUT后被终止，这里再留出解码图片的余量
+                text, no_text, seconds = future.result(timeout=OCR_TIMEOUT * 2 if OCR_TIMEOUT else None)
+            except BrokenProcessPool as e:
+                if not shared:  # 共用的识别出错时由提交的批次记录
+                    ERRORS.inc(stage='ocr')
+                    logger.error(f"OCR进程池异常，将重新创建: {e}")
+                    _reset_ocr_pool(self.pool)
+                continue
+            except Exception as e:
+                if not shared:
+                    ERRORS.inc(stage='ocr')
+                    logger.warning(f"OCR识别错误: {e}")
+                continue  # 识别失败不写入缓存
+            if not shared:
+                if no_text:
+                    _record(skipped_no_text=1)
+                else:
+                    _record(ocr_runs=1, ocr_seconds=seconds)
+                    # 工作进程中Tesseract识别单张图片的耗时
+                    STAGE_SECONDS.observe(seconds, stage="ocr_image")
+                if OCR_CACHE_ENABLED:
+                    _cache_set(key, text)
+            for index in indices:
+                self.results[index] = text
+        self.pending = {}
+        return self.results
+
+
+def _submit(pool: ProcessPoolExecutor, key: str, blob: bytes, lang: str, config: str):
+    """提交一张图片识别，返回 (Future, 是否共用其他批次已提交的识别)"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future, True
+        future = pool.submit(_ocr_task, blob, lang, config, OCR_TIMEOUT)
+        _inflight[key] = future
+    # 识别完成后不再共用：之后提交的相同图片从缓存中读取结果（失败的图片重新识别）
+    future.add_done_callback(lambda done: _forget_inflight(key, done))
+    return future, False
+
+
+def _forget_inflight(key: str, future):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def ocr_images_async(blobs: list, lang: str = None, config: str = '', seen_hashes: list = None,
+                     prefilter: bool = True) -> OcrBatch:
+    """提交一批图片进行识别，不等待结果
+
+    过小的图片和反复出现的装饰图片直接跳过；已缓存的图片直接得到结果；
+    同一批中重复的图片只识别一次；其余图片分发到共享的OCR进程池，
+    先做文字区域检测再并行识别，单张图片超时或出错时结果为空字符串
+
+    参数:
+        blobs: 原始图片字节列表
+        lang: Tesseract识别语言，例如 'chi_sim+eng'
+        config: 额外的Tesseract配置参数
+        seen_hashes: 可选，同一文档之前各批图片的预分类条目列表（流式逐页提交时用于识别装饰图片）
+        prefilter: 是否做尺寸和装饰图片预分类；整页扫描图像之间很相似，不能按装饰图片跳过
+
+    返回:
+        OcrBatch对象，调用其result()获取识别文本列表
+    """
+    pool = get_ocr_pool()
+    batch = OcrBatch(len(blobs), pool)
+    # 文字区域检测会影响结果（可能返回空文本），因此计入缓存键
+    cache_config = f"{config}|textdetect" if OCR_TEXT_DETECTION else config
+
+    # 廉价的预分类：跳过过小的图片和反复出现的装饰图片
+    skip_reasons = prefilter_images(blobs, seen_hashes=seen_hashes) if prefilter else [None] * len(blobs)
+    _record(images=len(blobs))
+
+    for index, blob in enumerate(blobs):
+        if skip_reasons[index]:
+            _record(**{f"skipped_{skip_reasons[index]}": 1})
+            continue
+        key = ocr_cache_key(blob, lang, cache_config)
+        if key in batch.pending:
+            batch.pending[key][1].append(index)  # 同一批中的重复图片
+            continue
+        if OCR_CACHE_ENABLED:
+            text = _cache_get(key)
+            if text is not None:
+                batch.results[index] = text
+                _record(cache_hits=1)
+                continue
+        # 内容相同的图片（例如每张幻灯片上的同一张截图）只识别一次，其他批次共用识别结果
+        future, shared = _submit(pool, key, blob, lang, config)
+        if shared:
+            batch.shared.add(key)
+        batch.pending[key] = (future, [index])
+    return batch
+
+
+def ocr_images(blobs: list, lang: str = None, config: str = '', prefilter: bool = True) -> list:
+    """批量识别一个文档中的所有图片，结果顺序与输入一致
+
+    参数:
+        blobs: 原始图片字节列表
+        lang: Tesseract识别语言，例如 'chi_sim+eng'
+        config: 额外的Tesseract配置参数
+        prefilter: 是否做尺寸和装饰图片预分类
+
+    返回:
+        与blobs一一对应的识别文本列表
+    """
+    return ocr_images_async(blobs, lang=lang, config=config, prefilter=prefilter).result()
+
+
+def ocr_image_bytes(blob: bytes, lang: str = None, config: str = '') -> str:
+    """从单张图片字节中提取文本，相同图片的结果会被缓存
+
+    学校模板在每张幻灯片上重复相同的徽标和背景图片，
+    缓存使这些图片在同一文档内和多次上传之间只识别一次
+
+    参数:
+        blob: 原始图片字节（PNG、JPEG等）
+        lang: Tesseract识别语言，例如 'chi_sim+eng'
+        config: 额外的Tesseract配置参数
+
+    返回:
+        识别出的文本，识别失败时返回空字符串
+    """
+    return ocr_images([blob], lang=lang, config=config)[0]
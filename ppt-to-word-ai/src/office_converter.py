@@ -0,0 +1,289 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取配置和管理缓存文件
+import time  # 用于等待进程启动
+import queue  # 空闲进程队列
+import shlex  # 解析启动命令
+import shutil  # 检查命令是否存在、复制缓存文件
+import signal  # 结束转换进程及其启动的LibreOffice
+import socket  # 分配端口、检查进程是否就绪
+import atexit  # 退出时结束常驻进程
+import hashlib  # 计算输入文件内容的哈希值
+import logging  # 记录进程启动和转换错误
+import tempfile  # 转换结果先写入临时文件
+import threading  # 保护进程池的创建和缓存淘汰
+import subprocess  # 启动 unoserver 进程
+import xmlrpc.client  # 与 unoserver 通信
+from .disk_cache import CACHE_DIR  # 缓存文件的存放目录
+from .metrics import Counter, ERRORS, timed  # 转换次数、重启次数和耗时指标
+
+logger = logging.getLogger(__name__)
+
+# 启动转换进程的命令（unoserver，需要能导入LibreOffice的uno模块的Python环境）
+OFFICE_SERVER_CMD = os.getenv('OFFICE_SERVER_CMD', 'unoserver')
+OFFICE_WORKERS = int(os.getenv('OFFICE_WORKERS', 1))  # 常驻进程数量
+OFFICE_MAX_JOBS = int(os.getenv('OFFICE_MAX_JOBS', 50))  # 每个进程完成多少次转换后重启，0表示不重启
+OFFICE_TIMEOUT = float(os.getenv('OFFICE_TIMEOUT', 120))  # 单次转换的超时（秒）
+OFFICE_START_TIMEOUT = float(os.getenv('OFFICE_START_TIMEOUT', 60))  # 等待进程启动的超时（秒）
+# 转换结果缓存
+OFFICE_CACHE_DIR = os.getenv('OFFICE_CACHE_DIR', os.path.join(CACHE_DIR, 'office'))
+OFFICE_CACHE_MAX_MB = float(os.getenv('OFFICE_CACHE_MAX_MB', 512))  # 缓存总大小上限（MB），0表示不限制
+# 无法解析的 .pptx 是否转换为PDF后再处理
+PPTX_PDF_FALLBACK = os.getenv('PPTX_PDF_FALLBACK', '1') == '1'
+
+OFFICE_CONVERSIONS = Counter('ppt2word_office_conversions_total', 'Office格式转换次数',
+                             labels=('format', 'result'))
+OFFICE_RESTARTS = Counter('ppt2word_office_restarts_total', 'Office转换进程的启动次数',
+                          labels=('reason',))
+
+_CHUNK_SIZE = 1024 * 1024  # 计算哈希时每次读取的字节数
+
+
+class OfficeConversionError(RuntimeError):
+    """Office格式转换失败（未安装LibreOffice、转换超时或转换出错）"""
+
+
+def office_available() -> bool:
+    """是否可以启动Office转换进程"""
+    command = shlex.split(OFFICE_SERVER_CMD)
+    return bool(command) and shutil.which(command[0]) is not None
+
+
+def _free_port() -> int:
+    """向系统申请一个空闲的本机端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """带超时的XML-RPC传输"""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class _OfficeWorker:
+    """一个常驻的 unoserver 进程（管理一个无界面的LibreOffice实例，通过本机的XML-RPC接口接受转换请求）"""
+
+    def __init__(self):
+        self.process = None
+        self.port = None
+        self.jobs = 0  # 当前进程已完成的转换次数
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self, reason: str):
+        """启动进程并等待其开始接受请求"""
+        self.stop()
+        self.port = _free_port()
+        command = shlex.split(OFFICE_SERVER_CMD) + [
+            '--interface', '127.0.0.1', '--port', str(self.port), '--uno-port', str(_free_port())
+        ]
+        # 独立的进程组，结束时连同它启动的LibreOffice一起结束
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                        start_new_session=True)
+        self.jobs = 0
+        OFFICE_RESTARTS.inc(reason=reason)
+        deadline = time.time() + OFFICE_START_TIMEOUT
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise OfficeConversionError(f"Office转换进程启动失败，退出码 {self.process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                logger.info(f"Office转换进程已启动: pid={self.process.pid} port={self.port}")
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.stop()
+        raise OfficeConversionError("等待Office转换进程启动超时")
+
+    def stop(self):
+        """结束进程（包括它启动的LibreOffice）"""
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        if process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.wait()
+        except ProcessLookupError:
+            pass
+
+    def convert(self, input_path: str, output_path: str, fmt: str):
+        """通过XML-RPC请求进程转换一个文件"""
+        proxy = xmlrpc.client.ServerProxy(
+            f'http://127.0.0.1:{self.port}', transport=_TimeoutTransport(OFFICE_TIMEOUT), allow_none=True
+        )
+        # unoserver的接口: convert(inpath, indata, outpath, convert_to, ...)
+        proxy.convert(input_path, None, output_path, fmt)
+        self.jobs += 1
+
+
+class OfficePool:
+    """常驻转换进程池，线程安全；所有进程都在使用时，新的转换请求排队等待
+
+    旧版二进制 .ppt 需要先用LibreOffice转换为 .pptx，每次转换都启动一次 soffice 需要数秒，
+    因此进程在第一次转换时（或预热时）启动，之后在所有请求之间复用；
+    超时或出错的进程被结束，下次使用时重新启动；完成 OFFICE_MAX_JOBS 次转换后重启，
+    避免LibreOffice长期运行占用的内存持续增长
+    """
+
+    def __init__(self, size: int):
+        self.workers = [_OfficeWorker() for _ in range(max(1, size))]
+        self._idle = queue.Queue()
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def start(self):
+        """启动所有尚未运行的进程（用于预热）"""
+        for _ in self.workers:
+            worker = self._idle.get()
+            try:
+                if not worker.alive():
+                    worker.start(reason='start')
+            finally:
+                self._idle.put(worker)
+
+    def convert(self, input_path: str, output_path: str, fmt: str):
+        """用一个空闲进程转换文件，出错或超时时结束该进程"""
+        try:
+            worker = self._idle.get(timeout=OFFICE_TIMEOUT)
+        except queue.Empty:
+            raise OfficeConversionError("等待空闲的Office转换进程超时")
+        try:
+            if not worker.alive():
+                worker.start(reason='start' if worker.jobs == 0 else 'failure')
+            elif OFFICE_MAX_JOBS and worker.jobs >= OFFICE_MAX_JOBS:
+                worker.start(reason='recycle')  # 达到转换次数上限，重启以释放LibreOffice占用的内存
+            worker.convert(input_path, output_path, fmt)
+        except socket.timeout:
+            worker.stop()  # 卡住的LibreOffice无法继续使用
+            raise OfficeConversionError(f"Office转换超时（{OFFICE_TIMEOUT:.0f}秒）")
+        except (OSError, xmlrpc.client.Error) as e:
+            worker.stop()
+            raise OfficeConversionError(f"Office转换失败: {e}")
+        finally:
+            self._idle.put(worker)
+
+    def shutdown(self):
+        """结束所有进程"""
+        for worker in self.workers:
+            worker.stop()
+
+
+_pool = None  # 进程内共享的转换进程池（首次使用时创建）
+_pool_lock = threading.Lock()
+_cache_lock = threading.Lock()
+
+
+def get_office_pool() -> OfficePool:
+    """获取（必要时创建）转换进程池，进程池在所有请求之间复用"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OfficePool(OFFICE_WORKERS)
+            atexit.register(_pool.shutdown)  # 退出时结束LibreOffice，避免遗留进程
+        return _pool
+
+
+def warm_office_pool():
+    """启动所有转换进程；未安装LibreOffice/unoserver时跳过"""
+    if not office_available():
+        logger.info("未找到Office转换命令，跳过预热")
+        return
+    get_office_pool().start()
+
+
+def _file_digest(path: str) -> str:
+    """计算文件内容的SHA-256哈希值"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _evict_cache():
+    """缓存总大小超过上限时，从最久未使用的转换结果开始删除"""
+    if not OFFICE_CACHE_MAX_MB:
+        return
+    with _cache_lock:
+        entries = []
+        for name in os.listdir(OFFICE_CACHE_DIR):
+            if name.startswith('tmp'):
+                continue  # 正在写入的临时文件
+            try:
+                stat = os.stat(os.path.join(OFFICE_CACHE_DIR, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= OFFICE_CACHE_MAX_MB * 1024 * 1024:
+                break
+            try:
+                os.remove(os.path.join(OFFICE_CACHE_DIR, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def convert_document(input_path: str, fmt: str) -> str:
+    """把文件转换为指定格式（例如 'pptx'、'pdf'），相同内容的文件只转换一次
+
+    参数:
+        input_path: 输入文件路径
+        fmt: 目标格式的扩展名
+
+    返回:
+        转换结果的临时文件路径（调用方使用完后负责删除）
+    """
+    if not office_available():
+        raise OfficeConversionError("无法转换该文件：未安装LibreOffice/unoserver")
+    os.makedirs(OFFICE_CACHE_DIR, exist_ok=True)
+    cached = os.path.join(OFFICE_CACHE_DIR, f"{_file_digest(input_path)}.{fmt}")
+
+    if os.path.exists(cached):
+        try:
+            os.utime(cached)  # 更新使用时间，用于LRU淘汰
+            OFFICE_CONVERSIONS.inc(format=fmt, result='cache_hit')
+        except FileNotFoundError:
+            pass  # 刚好被淘汰，重新转换
+    if not os.path.exists(cached):
+        fd, converting = tempfile.mkstemp(prefix='tmp', suffix=f'.{fmt}', dir=OFFICE_CACHE_DIR)
+        os.close(fd)
+        try:
+            with timed("office_convert"):
+                get_office_pool().convert(os.path.abspath(input_path), converting, fmt)
+            if not os.path.getsize(converting):
+                raise OfficeConversionError("Office转换没有产生输出")
+            os.replace(converting, cached)  # 原子地放入缓存
+        except Exception:
+            ERRORS.inc(stage='office_convert')
+            OFFICE_CONVERSIONS.inc(format=fmt, result='failed')
+            if os.path.exists(converting):
+                os.remove(converting)
+            raise
+        OFFICE_CONVERSIONS.inc(format=fmt, result='converted')
+        _evict_cache()
+
+    # 复制一份给调用方，缓存中的文件随时可能被淘汰
+    fd, output_path = tempfile.mkstemp(suffix=f'.{fmt}')
+    os.close(fd)
+    try:
+        shutil.copyfile(cached, output_path)
+    except FileNotFoundError:
+        os.remove(output_path)
+        return convert_document(input_path, fmt)  # 复制前被淘汰，重新转换
+    return output_path
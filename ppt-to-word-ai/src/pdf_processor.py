@@ -1,9 +1,27 @@
 # 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取配置
+import time  # 用于统计逐页的提取耗时
+import logging  # 记录提取过程中的错误
+import statistics  # 用于计算正文字号
 import fitz  # PyMuPDF，用于PDF文件处理
-from pdf2image import convert_from_bytes  # 用于将PDF转换为图像
-import pytesseract  # 用于OCR（光学字符识别）
-from PIL import Image  # Python图像处理库
-import io  # 用于处理二进制流数据
+from .ocr import ocr_images  # 带缓存、基于进程池的批量OCR（光学字符识别）
+from .ppt_processor import OCR_LANG  # PDF图像与PPT图片使用相同的OCR识别语言（中文+英文）
+from .image_ref import ImageRef  # 对原始图像数据的惰性引用
+from .metrics import STAGE_SECONDS, ERRORS, timed  # 耗时和错误指标
+
+logger = logging.getLogger(__name__)
+
+# 文本层字符数少于该值、且有一张图像覆盖页面大部分面积的页面视为扫描页，整页渲染后做一次OCR
+PDF_MIN_TEXT_CHARS = int(os.getenv('PDF_MIN_TEXT_CHARS', 50))
+# 单张图像覆盖页面面积的比例达到该值时才可能是扫描页（带徽标的标题页、章节页不算）
+PDF_SCAN_IMAGE_COVERAGE = float(os.getenv('PDF_SCAN_IMAGE_COVERAGE', 0.8))
+# 扫描页渲染的分辨率（DPI），以及渲染图像的最大像素数（超出时自动降低DPI以控制OCR耗时）
+OCR_DPI = int(os.getenv('OCR_DPI', 200))
+OCR_MAX_PIXELS = int(os.getenv('OCR_MAX_PIXELS', 8000000))
+# 字号达到正文字号的该倍数且较短的文本块视为标题
+PDF_HEADING_RATIO = float(os.getenv('PDF_HEADING_RATIO', 1.2))
+# 是否仍然对有文本层页面中的嵌入图片做OCR（默认关闭：这类图片多为图标和装饰）
+PDF_OCR_EMBEDDED_IMAGES = os.getenv('PDF_OCR_EMBEDDED_IMAGES', '0') == '1'
 
 def extract_text_from_pdf(file_path: str) -> list:
     """从PDF中提取结构化文本和图像
@@ -12,42 +30,173 @@ def extract_text_from_pdf(file_path: str) -> list:
         file_path: PDF文件的路径
         
     返回:
-        包含页面数据的列表，每个页面包含文本内容和图像
+        包含页面数据的列表，每个页面包含标题、文本内容和图像
     """
-    doc = fitz.open(file_path)  # 打开PDF文档
-    pages_data = []  # 存储所有页面数据的列表
-    
-    for page_num in range(len(doc)):  # 遍历PDF中的每一页
-        page = doc.load_page(page_num)  # 加载当前页面
-        page_data = {  # 创建当前页面的数据结构
-            "page_number": page_num+1,  # 页码（从1开始）
-            "content": [],  # 存储文本内容
-            "images": []  # 存储图像数据
-        }
-        
-        # 提取文本内容
-        text = page.get_text("text")  # 获取页面中的文本
-        if text.strip():  # 如果文本不为空（去除空白后）
-            page_data["content"].append({  # 添加到内容列表
-                "type": "text",  # 类型为文本
-                "data": text  # 文本数据
-            })
-        
-        # 处理页面中的图像
-        for img in page.get_images():  # 遍历页面中的所有图像
-            try:
-                base_image = doc.extract_image(img[0])  # 提取图像数据
-                image_bytes = base_image["image"]  # 获取图像的二进制数据
-                
-                # 对图像进行OCR（光学字符识别）
-                text = pytesseract.image_to_string(Image.open(io.BytesIO(image_bytes)))  # 将图像转换为文本
-                page_data["images"].append({  # 添加到图像列表
-                    "image": image_bytes,  # 图像二进制数据
-                    "text": text.strip()  # OCR识别出的文本（去除空白）
-                })
-            except Exception as e:
-                print(f"处理PDF图像时出错: {e}")  # 打印图像处理错误信息
+    pages_data = list(iter_text_from_pdf(file_path))  # 存储所有页面数据的列表
+    
+    # 对整个文档的图像进行OCR（光学字符识别）：分发到进程池并行识别，
+    # 重复出现的图像只识别一次，结果按顺序对应回各自的页面；
+    # 扫描页的整页图像不做装饰图片预分类
+    for scanned in (True, False):
+        images = [
+            image_data for page_data in pages_data if bool(page_data.get("scanned")) == scanned
+            for image_data in page_data["images"]
+        ]
+        if not images:
+            continue
+        texts = ocr_images([image_data["image"].blob for image_data in images], lang=OCR_LANG, prefilter=not scanned)
+        for image_data, text in zip(images, texts):
+            image_data["text"] = text
+    
+    return pages_data
+
+def iter_text_from_pdf(file_path: str):
+    """逐页提取PDF结构化内容的生成器（不做OCR）
+    
+    每页根据文本层决定处理方式：
+    - 有文本层的页面（原生PDF）：按文本块恢复阅读顺序和标题，不经过Tesseract
+    - 没有文本层、且被一张图像铺满的页面（扫描件）：保留已有的文本块，并按 OCR_DPI
+      整页渲染为一张图像，由调用方做一次整页OCR，识别文本追加在文本块之后
+    图像的"text"字段为空，由调用方负责填充
+    
+    参数:
+        file_path: PDF文件的路径
         
-        pages_data.append(page_data)
+    返回:
+        逐个产出页面数据的生成器
+    """
+    with timed("pdf_open"):
+        doc = fitz.open(file_path)  # 打开PDF文档
+    try:
+        for page_num in range(len(doc)):  # 遍历PDF中的每一页
+            started = time.perf_counter()  # 只统计本页的提取耗时，不包括下游处理
+            page = doc.load_page(page_num)  # 加载当前页面
+            page_data = {  # 创建当前页面的数据结构
+                "page_number": page_num+1,  # 页码（从1开始）
+                "title": "",  # 页面中最突出的标题
+                "content": [],  # 按阅读顺序排列的文本和小标题
+                "images": [],  # 需要OCR的图像
+                "scanned": False  # 是否按扫描页整页OCR
+            }
+            
+            # 提取带字号和位置信息的文本块
+            blocks = _text_blocks(page)
+            text_chars = sum(len(block["text"]) for block in blocks)
+            
+            _add_blocks(page_data, blocks)  # 文本层总是保留，扫描页的OCR文本只是追加
+            if text_chars < PDF_MIN_TEXT_CHARS and _image_coverage(page) >= PDF_SCAN_IMAGE_COVERAGE:
+                # 扫描页：没有可用的文本层，整页渲染后做一次OCR
+                try:
+                    page_data["images"].append({
+                        "image": ImageRef(_render_page(page), content_type="image/png"),
+                        "text": ""  # OCR识别出的文本（由OCR阶段填充）
+                    })
+                    page_data["scanned"] = True
+                except Exception as e:
+                    ERRORS.inc(stage='extract_page')
+                    logger.warning(f"渲染PDF扫描页时出错: {e}")
+            elif PDF_OCR_EMBEDDED_IMAGES:
+                _add_embedded_images(doc, page, page_data)
+            
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="extract_page")
+            yield page_data
+    finally:
+        doc.close()  # 关闭PDF文档，释放文件句柄
+
+def _image_coverage(page) -> float:
+    """页面中面积最大的一张图像覆盖页面面积的比例（0~1），没有图像时为0"""
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    largest = 0.0
+    for img in page.get_images():
+        for rect in page.get_image_rects(img[0]):
+            largest = max(largest, abs(rect & page.rect))  # 只计算页面可见范围内的部分
+    return largest / page_area
+
+def _text_blocks(page) -> list:
+    """读取页面的文本块，返回 [{"text", "size", "bbox"}]，size为块内最大字号"""
+    blocks = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:  # 只处理文本块（1为图像块）
+            continue
+        lines = []
+        size = 0.0
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            lines.append("".join(span["text"] for span in spans).strip())
+            size = max(size, max(span["size"] for span in spans))
+        if lines:
+            blocks.append({"text": "\n".join(lines), "size": size, "bbox": block["bbox"]})
+    return _reading_order(blocks, page.rect.width)
+
+def _reading_order(blocks: list, page_width: float) -> list:
+    """按阅读顺序排列文本块，支持双栏排版
+    
+    横跨页面中线的块把页面分成若干段；每一段内先读左栏（从上到下）再读右栏
+    """
+    middle = page_width / 2
+    ordered = []
+    section = []  # 当前段内的分栏文本块
     
-    return pages_data
\ No newline at end of file
+    def flush():
+        # 左栏在前、右栏在后，栏内按纵坐标排序
+        section.sort(key=lambda block: (block["bbox"][0] >= middle, block["bbox"][1]))
+        ordered.extend(section)
+        section.clear()
+    
+    for block in sorted(blocks, key=lambda block: (block["bbox"][1], block["bbox"][0])):
+        x0, _, x1, _ = block["bbox"]
+        if x0 < middle < x1:
+            flush()  # 通栏的块（标题、跨栏段落）结束当前段
+            ordered.append(block)
+        else:
+            section.append(block)
+    flush()
+    return ordered
+
+def _add_blocks(page_data: dict, blocks: list):
+    """根据字号识别标题，把文本块按阅读顺序写入页面数据"""
+    if not blocks:
+        return
+    # 按字符数加权的中位字号作为正文字号
+    sizes = [block["size"] for block in blocks for _ in range(len(block["text"]))]
+    body_size = statistics.median(sizes)
+    
+    for block in blocks:
+        text = block["text"]
+        is_heading = block["size"] >= body_size * PDF_HEADING_RATIO and len(text) <= 120
+        if is_heading and not page_data["title"]:
+            page_data["title"] = " ".join(text.split())  # 第一个标题作为页面标题
+        elif is_heading:
+            page_data["content"].append({"type": "heading", "data": " ".join(text.split())})
+        else:
+            page_data["content"].append({"type": "text", "data": text})
+
+def _render_page(page) -> bytes:
+    """按OCR_DPI把页面渲染为灰度PNG，像素数超过OCR_MAX_PIXELS时降低DPI"""
+    width_inches = page.rect.width / 72
+    height_inches = page.rect.height / 72
+    dpi = OCR_DPI
+    if width_inches * height_inches * dpi * dpi > OCR_MAX_PIXELS:
+        dpi = int((OCR_MAX_PIXELS / (width_inches * height_inches)) ** 0.5)
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return pixmap.tobytes("png")
+
+def _add_embedded_images(doc, page, page_data: dict):
+    """把页面中嵌入的图像加入OCR列表（仅在 PDF_OCR_EMBEDDED_IMAGES 开启时使用）"""
+    for img in page.get_images():  # 遍历页面中的所有图像
+        try:
+            base_image = doc.extract_image(img[0])  # 提取图像数据
+            image_bytes = base_image["image"]  # 获取图像的二进制数据
+            
+            page_data["images"].append({  # 添加到图像列表
+                # 原始图像数据的惰性引用，需要像素时再解码
+                "image": ImageRef(image_bytes, content_type=f"image/{base_image['ext']}"),
+                "text": ""  # OCR识别出的文本（由OCR阶段填充）
+            })
+        except Exception as e:
+            ERRORS.inc(stage='extract_image')
+            logger.warning(f"处理PDF图像时出错: {e}")  # 记录图像处理错误信息
@@ -0,0 +1,149 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取队列配置
+import re  # 正则表达式库，用于统计幻灯片数量
+import queue  # 阶段之间的有界队列
+import zipfile  # 用于在不解析整个PPT的情况下读取幻灯片列表
+import logging  # 记录统计页数时的错误
+import threading  # 每个阶段在独立线程中运行
+from .ppt_processor import iter_structured_content, OCR_LANG as PPT_OCR_LANG  # 逐张幻灯片提取
+from .pdf_processor import iter_text_from_pdf, OCR_LANG as PDF_OCR_LANG  # 逐页提取PDF
+from .ocr import ocr_images_async  # 异步提交OCR
+from .manifest import slide_fingerprint  # 增量转换使用的幻灯片指纹
+from .boilerplate import strip_boilerplate, BOILERPLATE_ENABLED  # 去除重复的模板文本
+from .metrics import timed  # 阶段耗时指标
+
+logger = logging.getLogger(__name__)
+
+# 相邻阶段之间最多缓冲的幻灯片/页面数量，决定了流水线的内存上限
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 8))
+
+_DONE = object()  # 阶段结束标记
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """向有界队列放入数据；下游已停止时放弃并返回False"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def prefetch(iterable, maxsize: int = None):
+    """在后台线程中运行一个阶段，通过有界队列把结果交给下游
+
+    上游产出速度超过下游时，队列写满后上游会阻塞，从而限制内存占用；
+    上游抛出的异常会在下游取数据时重新抛出
+
+    参数:
+        iterable: 上游阶段（通常是生成器）
+        maxsize: 队列容量，默认使用 PIPELINE_QUEUE_SIZE
+
+    返回:
+        按原顺序产出上游数据的生成器
+    """
+    q = queue.Queue(maxsize=max(1, maxsize or PIPELINE_QUEUE_SIZE))
+    stop = threading.Event()  # 下游提前结束时通知上游停止
+
+    def produce():
+        try:
+            for item in iterable:
+                if not _put(q, (False, item), stop):
+                    return
+            _put(q, (False, _DONE), stop)
+        except BaseException as e:
+            _put(q, (True, e), stop)  # 把异常交给下游处理
+        finally:
+            close = getattr(iterable, 'close', None)
+            if close:
+                close()  # 关闭上游生成器，释放其打开的文件
+
+    thread = threading.Thread(target=produce, name='pipeline-stage', daemon=True)
+    thread.start()
+    try:
+        while True:
+            is_error, item = q.get()
+            if is_error:
+                raise item
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def count_units(file_path: str, original_filename: str) -> int:
+    """快速统计幻灯片/页面数量，用于在流式处理时报告进度"""
+    try:
+        if original_filename.lower().endswith('.pdf'):
+            import fitz  # PyMuPDF，只读取页面目录
+            with fitz.open(file_path) as doc:
+                return doc.page_count
+        # PPTX是zip包，presentation.xml中每个sldId对应一张幻灯片
+        with zipfile.ZipFile(file_path) as archive:
+            presentation = archive.read('ppt/presentation.xml').decode('utf-8', 'ignore')
+        return len(re.findall(r'<p:sldId\b', presentation))
+    except Exception as e:
+        logger.warning(f"统计页数时出错: {e}")
+        return 0
+
+
+def iter_document(file_path: str, original_filename: str, manifest=None):
+    """以流水线方式逐张产出已完成OCR的幻灯片/页面
+
+    提取 → OCR 两个阶段分别在独立线程中运行，阶段之间通过有界队列连接：
+    后面的幻灯片还在提取或OCR时，前面的幻灯片已经可以交给AI生成，
+    内存中最多只保留约 2 × PIPELINE_QUEUE_SIZE（+ BOILERPLATE_WINDOW）张幻灯片的数据。
+    启用 BOILERPLATE_ENABLED 时，OCR之后再去除大多数幻灯片中都重复出现的模板文本
+
+    参数:
+        file_path: 已保存到本地的输入文件路径
+        original_filename: 原始文件名，用于判断文件类型
+        manifest: 可选的DocumentManifest；指纹与上次转换相同的幻灯片不再OCR，
+                  而是带上 cached_section / cached_content 交给下游直接复用
+
+    返回:
+        逐个产出幻灯片/页面结构化内容（图片文本已填充）的生成器
+    """
+    if original_filename.lower().endswith('.pdf'):
+        source, lang = iter_text_from_pdf(file_path), PDF_OCR_LANG
+    else:
+        source, lang = iter_structured_content(file_path), PPT_OCR_LANG
+
+    seen_hashes = []  # 文档内所有图片的内容摘要和感知哈希，用于识别重复的装饰图片
+
+    def submit_ocr(units):
+        # OCR提交阶段：把每张幻灯片的图片提交到OCR进程池后立即交给下游，不等待结果
+        for unit in units:
+            if manifest is not None:
+                unit["fingerprint"] = slide_fingerprint(unit)
+                previous = manifest.lookup(unit["fingerprint"])
+                if previous is not None:
+                    # 幻灯片未变化：复用上次的章节，跳过OCR
+                    unit["cached_section"] = previous["section"]
+                    unit["cached_content"] = previous["content"]
+                    yield unit, None
+                    continue
+            blobs = [image_data["image"].blob for image_data in unit["images"]]
+            # 整页扫描的PDF页面只有一张页面图像，不做装饰图片预分类
+            yield unit, ocr_images_async(blobs, lang=lang, seen_hashes=seen_hashes,
+                                         prefilter=not unit.get("scanned"))
+
+    def wait_ocr(submitted):
+        for unit, batch in submitted:
+            # 按顺序等待每张幻灯片的OCR结果，并填充到图片信息中
+            if batch is not None:
+                with timed("ocr_wait"):  # 下游等待该幻灯片OCR结果的时间
+                    texts = batch.result()
+                for image_data, text in zip(unit["images"], texts):
+                    image_data["text"] = text
+            yield unit
+
+    # 提取阶段和OCR提交阶段各自在后台线程中运行
+    units = wait_ocr(prefetch(submit_ocr(prefetch(source))))
+    if BOILERPLATE_ENABLED:
+        # 课程名、页眉页脚、版权声明等在每张幻灯片上重复的文本不再发送给AI
+        units = strip_boilerplate(units)
+    yield from units
@@ -1,10 +1,20 @@
 # 导入必要的库和模块
-from pptx import Presentation  # 用于读取和处理PPT文件
-import pytesseract  # OCR工具，用于从图像中提取文本
-from PIL import Image  # 图像处理库
-import io  # 用于处理二进制流
 import re  # 正则表达式库，用于文本处理
 import os  # 操作系统相关功能
+import time  # 用于统计逐张幻灯片的提取耗时
+import logging  # 记录提取过程中的错误
+from .ocr import ocr_images  # 带缓存、基于进程池的批量OCR识别
+from .image_ref import ImageRef  # 对原始图片数据的惰性引用
+from .metrics import STAGE_SECONDS, ERRORS, timed  # 耗时和错误指标
+
+logger = logging.getLogger(__name__)
+
+# 幻灯片图片的OCR识别语言：中文简体+英文
+OCR_LANG = 'chi_sim+eng'
+
+# PPTX提取引擎：fast（默认，直接从zip中流式解析幻灯片XML，见 pptx_fastpath）
+# 或 python-pptx（原有实现，把整个演示文稿加载为对象模型）
+PPTX_ENGINE = os.getenv('PPTX_ENGINE', 'fast')
 
 def extract_structured_content(file_path: str) -> list:
     """从PPT文件中提取结构化内容
@@ -15,10 +25,40 @@ def extract_structured_content(file_path: str) -> list:
     返回:
         包含所有幻灯片结构化内容的列表，每个幻灯片包含标题、内容和图片
     """
-    prs = Presentation(file_path)
-    slides_data = []
+    slides_data = list(iter_structured_content(file_path))
+    
+    # 将整个文档的图片一次性分发到OCR进程池，并把结果对应回各自的幻灯片
+    images = [image_data for slide_data in slides_data for image_data in slide_data["images"]]
+    texts = extract_text_from_images([image_data["image"].blob for image_data in images])
+    for image_data, text in zip(images, texts):
+        image_data["text"] = text
+    return slides_data
+
+def iter_structured_content(file_path: str):
+    """逐张幻灯片提取结构化内容的生成器（不做OCR）
+    
+    与extract_structured_content的输出结构相同，但每次只产出一张幻灯片，
+    图片的"text"字段为空，由调用方（例如流水线的OCR阶段）负责填充
+    
+    参数:
+        file_path: PPT文件的路径
+        
+    返回:
+        逐个产出幻灯片结构化内容的生成器
+    """
+    if PPTX_ENGINE == 'python-pptx':
+        return _iter_python_pptx(file_path)
+    from .pptx_fastpath import iter_slides  # 延迟导入，避免循环导入
+    return iter_slides(file_path)
+
+def _iter_python_pptx(file_path: str):
+    """使用python-pptx逐张幻灯片提取结构化内容（PPTX_ENGINE=python-pptx）"""
+    from pptx import Presentation  # 用于读取和处理PPT文件，只有使用该引擎时才导入
+    with timed("pptx_open"):
+        prs = Presentation(file_path)
     
     for i, slide in enumerate(prs.slides):
+        started = time.perf_counter()  # 只统计本张幻灯片的提取耗时，不包括下游处理
         slide_data = {
             "slide_number": i+1,
             "title": "",
@@ -43,28 +83,26 @@ def extract_structured_content(file_path: str) -> list:
                 # 处理图片元素
                 elif hasattr(shape, "shape_type") and shape.shape_type == 13:  # 13表示图片类型
                     try:
-                        # 从形状中提取图片数据并转换为PIL图像对象
-                        img = Image.open(io.BytesIO(shape.image.blob))
-                        # 尝试从图像中提取文本（OCR识别）
-                        img_text = extract_text_from_image(img)
-                        # 将图片转换为二进制数据以便存储
-                        img_byte_arr = io.BytesIO()
-                        img.save(img_byte_arr, format='PNG')
+                        # 直接引用PPT中存储的原始图片数据，不解码也不转码为PNG
+                        # （需要像素时再通过 ImageRef.open() / to_png() 按需转换）
+                        image_ref = ImageRef(shape.image.blob, content_type=shape.image.content_type)
                         # 将图片信息添加到幻灯片数据中
                         slide_data["images"].append({
-                            "image": img_byte_arr.getvalue(),  # 图片二进制数据
+                            "image": image_ref,  # 原始图片数据的惰性引用
                             "description": get_shape_description(shape),  # 图片描述
-                            "text": img_text  # 从图片中提取的文本
+                            "text": ""  # 从图片中提取的文本（由OCR阶段填充）
                         })
                     except Exception as e:
-                        print(f"处理图片时出错: {e}")  # 记录图片处理错误
+                        ERRORS.inc(stage='extract_image')
+                        logger.warning(f"处理图片时出错: {e}")  # 记录图片处理错误
                         
             except Exception as e:
-                print(f"处理形状元素时出错: {e}")  # 记录形状处理错误
+                ERRORS.inc(stage='extract_shape')
+                logger.warning(f"处理形状元素时出错: {e}")  # 记录形状处理错误
                 continue  # 继续处理下一个形状元素
         
-        slides_data.append(slide_data)
-    return slides_data
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="extract_slide")
+        yield slide_data
 
 def clean_text(text: str) -> str:
     """清理和规范化提取的文本"""
@@ -110,12 +148,7 @@ def get_shape_description(shape) -> str:
     except:
         return "图片"
         
-def extract_text_from_image(image):
-    """从图像中提取文本，支持中文"""
-    try:
-        # 设置Tesseract OCR语言为中文简体+英文
-        text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-        return text.strip() if text else ""
-    except Exception as e:
-        print(f"OCR识别错误: {e}")
-        return ""
\ No newline at end of file
+def extract_text_from_images(blobs: list) -> list:
+    """从多张图像中并行提取文本，支持中文"""
+    # 设置Tesseract OCR语言为中文简体+英文
+    return ocr_images(blobs, lang=OCR_LANG)
\ No newline at end of file
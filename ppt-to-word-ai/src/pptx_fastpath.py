@@ -0,0 +1,231 @@
+# 导入必要的库和模块
+import time  # 用于统计逐张幻灯片的提取耗时
+import logging  # 记录提取过程中的错误
+import zipfile  # PPTX是zip包，直接读取其中的XML部件
+import posixpath  # 解析关系文件中的相对路径
+import xml.etree.ElementTree as ElementTree  # 流式解析幻灯片XML
+from .ppt_processor import clean_text  # 与python-pptx引擎相同的文本清理
+from .image_ref import ImageRef  # 对原始图片数据的惰性引用
+from .metrics import STAGE_SECONDS, ERRORS, timed  # 耗时和错误指标
+
+logger = logging.getLogger(__name__)
+
+# PresentationML / DrawingML 使用的XML命名空间
+_P = '{http://schemas.openxmlformats.org/presentationml/2006/main}'
+_A = '{http://schemas.openxmlformats.org/drawingml/2006/main}'
+_R = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_MC = '{http://schemas.openxmlformats.org/markup-compatibility/2006}'
+_RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_TYPES = '{http://schemas.openxmlformats.org/package/2006/content-types}'
+
+# 作为标题的占位符类型
+_TITLE_PLACEHOLDERS = ('title', 'ctrTitle')
+# 每张幻灯片都重复的页脚类占位符（日期、页脚、页码），不作为内容
+_SKIPPED_PLACEHOLDERS = ('dt', 'ftr', 'sldNum', 'hdr')
+
+
+def _read_member(file_path: str, name: str) -> bytes:
+    """从PPTX中读取一个部件（图片在需要时才读取，每次单独打开zip，可以在任意线程中调用）"""
+    with zipfile.ZipFile(file_path) as archive:
+        return archive.read(name)
+
+
+def _relationships(archive: zipfile.ZipFile, part: str) -> dict:
+    """读取一个部件的关系文件
+
+    返回:
+        关系ID -> (关系类型的最后一段, zip中的部件名)，外部链接不包含在内
+    """
+    directory, filename = posixpath.split(part)
+    rels_name = posixpath.join(directory, '_rels', filename + '.rels')
+    try:
+        root = ElementTree.fromstring(archive.read(rels_name))
+    except KeyError:
+        return {}
+    relationships = {}
+    for rel in root.iter(f'{_RELS}Relationship'):
+        if rel.get('TargetMode') == 'External':
+            continue
+        target = posixpath.normpath(posixpath.join(directory, rel.get('Target', '')))
+        relationships[rel.get('Id')] = (rel.get('Type', '').rsplit('/', 1)[-1], target.lstrip('/'))
+    return relationships
+
+
+def _content_types(archive: zipfile.ZipFile):
+    """读取 [Content_Types].xml，返回按部件名查询MIME类型的函数"""
+    root = ElementTree.fromstring(archive.read('[Content_Types].xml'))
+    defaults = {
+        item.get('Extension', '').lower(): item.get('ContentType')
+        for item in root.iter(f'{_TYPES}Default')
+    }
+    overrides = {
+        item.get('PartName', '').lstrip('/'): item.get('ContentType')
+        for item in root.iter(f'{_TYPES}Override')
+    }
+
+    def lookup(name: str) -> str:
+        return overrides.get(name) or defaults.get(posixpath.splitext(name)[1].lstrip('.').lower())
+    return lookup
+
+
+def _slide_parts(archive: zipfile.ZipFile) -> list:
+    """按演示文稿中的顺序返回各幻灯片部件在zip中的名称"""
+    presentation = 'ppt/presentation.xml'
+    relationships = _relationships(archive, presentation)
+    root = ElementTree.fromstring(archive.read(presentation))
+    return [
+        relationships[slide_id.get(f'{_R}id')][1]
+        for slide_id in root.iter(f'{_P}sldId')
+        if slide_id.get(f'{_R}id') in relationships
+    ]
+
+
+def is_readable(file_path: str) -> bool:
+    """快速检查PPTX能否被解析（zip包完整，演示文稿和幻灯片列表可以读取）"""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            _content_types(archive)
+            return all(part in archive.NameToInfo for part in _slide_parts(archive))
+    except Exception:
+        return False
+
+
+def _paragraph_text(paragraph) -> str:
+    """一个段落的文本：与python-pptx一致，换行（a:br）转换为垂直制表符"""
+    parts = []
+    for child in paragraph:
+        if child.tag in (f'{_A}r', f'{_A}fld'):
+            parts.append(child.findtext(f'{_A}t') or '')
+        elif child.tag == f'{_A}br':
+            parts.append('\v')
+    return ''.join(parts)
+
+
+def _body_text(body) -> str:
+    """文本框（txBody）中所有段落的文本，段落之间用换行符分隔"""
+    if body is None:
+        return ''
+    return '\n'.join(_paragraph_text(paragraph) for paragraph in body.findall(f'{_A}p'))
+
+
+def _placeholder_type(shape, properties: str):
+    """形状的占位符类型，不是占位符时返回None（没有type属性的占位符是正文占位符）"""
+    placeholder = shape.find(f'{properties}/{_P}nvPr/{_P}ph')
+    if placeholder is None:
+        return None
+    return placeholder.get('type', 'body')
+
+
+def _table_text(table) -> str:
+    """表格的文本，每行一行，单元格之间用 | 分隔"""
+    rows = []
+    for row in table.iter(f'{_A}tr'):
+        cells = [' '.join(_body_text(cell.find(f'{_A}txBody')).split()) for cell in row.findall(f'{_A}tc')]
+        if any(cells):
+            rows.append('| ' + ' | '.join(cells) + ' |')
+    return '\n'.join(rows)
+
+
+def _notes_text(archive: zipfile.ZipFile, part: str) -> str:
+    """备注页中正文占位符的文本"""
+    root = ElementTree.fromstring(archive.read(part))
+    texts = []
+    for shape in root.iter(f'{_P}sp'):
+        if _placeholder_type(shape, f'{_P}nvSpPr') == 'body':
+            text = _body_text(shape.find(f'{_P}txBody')).strip()
+            if text:
+                texts.append(text)
+    return clean_text('\n'.join(texts))
+
+
+def _parse_slide(archive: zipfile.ZipFile, file_path: str, part: str, slide_data: dict, content_type):
+    """流式解析一张幻灯片的XML，按文档顺序填充标题、文本、表格和图片
+
+    组合形状中的子形状按其在组合中的顺序处理；mc:Fallback 中的内容是 mc:Choice 的重复，跳过
+    """
+    relationships = _relationships(archive, part)
+    fallback_depth = 0  # 当前是否位于 mc:Fallback 之内
+    with archive.open(part) as stream:
+        for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+            if element.tag == f'{_MC}Fallback':
+                fallback_depth += 1 if event == 'start' else -1
+                continue
+            if event != 'end' or fallback_depth:
+                continue
+
+            if element.tag == f'{_P}sp':
+                # 文本形状（包括占位符）
+                text = _body_text(element.find(f'{_P}txBody'))
+                placeholder = _placeholder_type(element, f'{_P}nvSpPr')
+                if text.strip() and placeholder not in _SKIPPED_PLACEHOLDERS:
+                    text = clean_text(text)  # 清理和规范化文本
+                    if placeholder in _TITLE_PLACEHOLDERS and not slide_data["title"]:
+                        slide_data["title"] = text
+                    else:
+                        slide_data["content"].append({"type": "text", "data": text})
+                element.clear()
+            elif element.tag == f'{_P}pic':
+                # 图片：只记录图片部件的位置，图片数据在需要时才读取
+                blip = element.find(f'{_P}blipFill/{_A}blip')
+                relationship = relationships.get(blip.get(f'{_R}embed')) if blip is not None else None
+                if relationship is not None:
+                    name = element.find(f'{_P}nvPicPr/{_P}cNvPr')
+                    slide_data["images"].append({
+                        "image": ImageRef(
+                            loader=lambda target=relationship[1]: _read_member(file_path, target),
+                            content_type=content_type(relationship[1])
+                        ),
+                        "description": (name.get('name') if name is not None else None) or "图片",
+                        "text": ""  # 从图片中提取的文本（由OCR阶段填充）
+                    })
+                element.clear()
+            elif element.tag == f'{_P}graphicFrame':
+                # 表格（图表等其他图形对象没有可提取的文本）
+                table = element.find(f'{_A}graphic/{_A}graphicData/{_A}tbl')
+                if table is not None:
+                    text = _table_text(table)
+                    if text:
+                        slide_data["content"].append({"type": "table", "data": text})
+                element.clear()
+
+    for kind, target in relationships.values():
+        if kind == 'notesSlide':
+            notes = _notes_text(archive, target)
+            if notes:
+                slide_data["notes"] = notes
+
+
+def iter_slides(file_path: str):
+    """逐张幻灯片提取结构化内容的生成器，直接从zip中流式解析幻灯片XML
+
+    输出结构与 ppt_processor.iter_structured_content 相同；此外：
+    标题取自标题占位符，页脚、日期和页码占位符被忽略；组合形状中的文本和图片、表格（"table"类型）
+    以及备注（"notes"字段）也会被提取。图片只记录位置，需要时才从zip中读取
+
+    参数:
+        file_path: PPTX文件的路径
+
+    返回:
+        逐个产出幻灯片结构化内容的生成器
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        with timed("pptx_open"):
+            content_type = _content_types(archive)
+            slide_parts = _slide_parts(archive)
+
+        for i, part in enumerate(slide_parts):
+            started = time.perf_counter()  # 只统计本张幻灯片的提取耗时，不包括下游处理
+            slide_data = {
+                "slide_number": i + 1,
+                "title": "",
+                "content": [],
+                "images": []
+            }
+            try:
+                _parse_slide(archive, file_path, part, slide_data, content_type)
+            except Exception as e:
+                # 单张幻灯片解析失败时保留编号，继续处理下一张
+                ERRORS.inc(stage='extract_slide')
+                logger.warning(f"解析幻灯片 {part} 时出错: {e}")
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="extract_slide")
+            yield slide_data
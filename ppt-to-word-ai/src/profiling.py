@@ -0,0 +1,343 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取配置和保存结果
+import sys  # 获取所有线程当前的调用栈
+import hmac  # 以固定时间比较管理员令牌
+import json  # 分析结果以JSON格式保存
+import time  # 用于计时
+import logging  # 记录保存结果时的错误
+import threading  # 采样线程和慢任务计时器
+import tracemalloc  # 内存分配快照
+import collections  # 汇总采样结果
+from .metrics import Counter, current_stage  # 分析次数指标、线程当前所在的处理阶段
+
+logger = logging.getLogger(__name__)
+
+# 管理员令牌：请求头 X-Profile-Token 与之一致时分析该任务；为空时不能通过请求头启用
+PROFILE_ADMIN_TOKEN = os.getenv('PROFILE_ADMIN_TOKEN', '')
+PROFILE_HEADER = 'X-Profile-Token'
+# 运行超过这么多秒的任务自动开始分析，0表示不自动分析
+PROFILE_SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', 0))
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.01))  # 采样间隔（秒）
+PROFILE_MEMORY = os.getenv('PROFILE_MEMORY', '1') == '1'  # 是否记录内存分配（tracemalloc有一定开销）
+# 分析结果的保存目录，最多保留 PROFILE_MAX_FILES 个文件（任务过期时一并删除）
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', '/app/assets/output')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(OUTPUT_DIR, 'profiles'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 100))
+
+PROFILES = Counter('ppt2word_profiles_total', '保存的任务性能分析数', labels=('trigger',))
+
+# 属于转换流程的线程名称前缀（见 job_queue、pipeline、word_generator、llm_router 和 batch）
+_PROCESSING_THREADS = ('convert-job', 'pipeline-stage', 'ai-writer', 'llm-hedge', 'batch')
+_TOP = 30  # 结果中列出的函数和内存分配位置数量
+_MEMORY_CHECK_INTERVAL = 1.0  # 检查内存占用的间隔（秒）
+_MEMORY_GROWTH = 1.1  # 内存占用超过上一次快照的这个倍数时重新拍摄快照
+
+_tracing_lock = threading.Lock()
+_tracing_jobs = 0  # 正在记录内存分配的分析数量
+_tracing_started = False  # tracemalloc是否由这里启动（结束时只停止自己启动的）
+
+
+def profiling_requested(headers) -> bool:
+    """请求是否带有正确的管理员令牌"""
+    token = headers.get(PROFILE_HEADER) or ''
+    return bool(PROFILE_ADMIN_TOKEN) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def profile_access_allowed(headers) -> bool:
+    """是否允许下载分析结果：必须带有正确的管理员令牌，未配置令牌时任何人都不能下载
+
+    分析结果包含完整的调用栈、源文件路径和内存分配位置，不能只凭任务ID下载
+    """
+    return profiling_requested(headers)
+
+
+def profile_path(job_id: str) -> str:
+    """任务分析结果的保存路径"""
+    return os.path.join(PROFILE_DIR, f"{job_id}.json")
+
+
+def remove_profile(job_id: str):
+    """删除任务的分析结果（任务过期时调用）"""
+    try:
+        os.remove(profile_path(job_id))
+    except FileNotFoundError:
+        pass
+
+
+def _start_tracing():
+    global _tracing_jobs, _tracing_started
+    with _tracing_lock:
+        _tracing_jobs += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+
+
+def _stop_tracing():
+    global _tracing_jobs, _tracing_started
+    with _tracing_lock:
+        _tracing_jobs -= 1
+        if _tracing_jobs == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+
+def _frame_slide(frame):
+    """从一个栈帧的局部变量中找出正在处理的幻灯片编号（PDF为页码），找不到时返回None"""
+    try:
+        local_vars = frame.f_locals
+    except Exception:
+        return None
+    for name in ('entry', 'slide_data', 'page_data', 'unit', 'item'):
+        value = local_vars.get(name)
+        if isinstance(value, dict):
+            for key in ('ordinal', 'slide_number', 'page_number'):  # word_generator的条目、幻灯片、PDF页面
+                if isinstance(value.get(key), int):
+                    return value[key]
+    for name in ('slide', 'ordinal'):
+        value = local_vars.get(name)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+    return None
+
+
+def _inspect_stack(frame):
+    """遍历调用栈，返回 (从外到内的函数列表, 最内层的本项目函数, 幻灯片编号)"""
+    functions = []
+    innermost = None
+    slide = None
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        name = f"{module}:{frame.f_code.co_name}"
+        functions.append(name)
+        if module.startswith('src.'):
+            if innermost is None:
+                innermost = name
+            if slide is None:
+                slide = _frame_slide(frame)
+        frame = frame.f_back
+    functions.reverse()
+    return functions, innermost, slide
+
+
+class JobProfiler:
+    """一个任务的采样分析器，在任务线程中创建
+
+    后台线程按 PROFILE_INTERVAL 采样转换流程各线程的调用栈（包括正在等待的线程，因此AI接口和OCR结果的
+    等待时间也会计入），按处理阶段、函数和幻灯片汇总；同时在内存占用最高时拍摄tracemalloc快照。
+    OCR在独立的进程中运行，只能看到等待时间；流水线和AI调用线程无法区分属于哪个任务，
+    同时运行的其他任务的这些线程也会被采样
+    """
+
+    def __init__(self, job_id: str, trigger: str, delay: float = 0):
+        """
+        参数:
+            job_id: 任务ID
+            trigger: 启用分析的原因（header / slow）
+            delay: 任务开始后等待多少秒才开始分析（慢任务），0表示立即开始
+        """
+        self.job_id = job_id
+        self.trigger = trigger
+        self.job_thread = threading.get_ident()  # 任务线程（其他任务的任务线程不采样）
+        self.job_started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._finished = False
+        self._thread = None
+        self._timer = None
+        self.samples = 0
+        self.stages = collections.Counter()  # 处理阶段 -> 样本数
+        self.functions = collections.Counter()  # 最内层的本项目函数 -> 样本数
+        self.slides = collections.Counter()  # 幻灯片编号 -> 样本数
+        self.stage_slides = collections.Counter()  # (处理阶段, 幻灯片编号) -> 样本数
+        self.stacks = collections.Counter()  # 折叠的调用栈 -> 样本数
+        self.concurrent_jobs = 1  # 采样期间同时运行的任务数的最大值
+        self._memory_start = None  # 分析开始时的内存快照
+        self._memory_peak = None  # (内存占用, 快照, 当时任务线程所在的阶段, 幻灯片编号)
+        if delay > 0:
+            self._timer = threading.Timer(delay, self.start)
+            self._timer.daemon = True
+            self._timer.start()
+        else:
+            self.start()
+
+    def start(self):
+        """开始采样（慢任务由计时器在超过阈值时调用）"""
+        with self._lock:
+            if self._finished or self._thread is not None:
+                return
+            self.started = time.perf_counter()
+            self.cpu_started = time.process_time()
+            if PROFILE_MEMORY:
+                _start_tracing()
+                self._memory_start = tracemalloc.take_snapshot()
+            self._thread = threading.Thread(target=self._run, name=f'profiler-{self.job_id[:8]}', daemon=True)
+            self._thread.start()
+        logger.info(f"开始分析任务 {self.job_id}（{self.trigger}）")
+
+    def _run(self):
+        next_memory_check = time.perf_counter()
+        while not self._stop.wait(PROFILE_INTERVAL):
+            self._sample()
+            if PROFILE_MEMORY and time.perf_counter() >= next_memory_check:
+                self._check_memory()
+                next_memory_check = time.perf_counter() + _MEMORY_CHECK_INTERVAL
+
+    def _sample(self):
+        """对转换流程的所有线程采样一次"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        jobs = 0
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident, '')
+            if not name.startswith(_PROCESSING_THREADS):
+                continue
+            functions, innermost, slide = _inspect_stack(frame)
+            if innermost is None:
+                continue  # 空闲的线程池线程
+            if name.startswith('convert-job'):
+                jobs += 1
+                if ident != self.job_thread:
+                    continue  # 其他任务的任务线程
+            # 不在具体计时阶段中的代码按模块归类，例如AI调用线程中的 llm_router
+            stage = current_stage(ident)
+            if stage in (None, 'job'):
+                stage = innermost.split(':')[0].rsplit('.', 1)[-1]
+            self.samples += 1
+            self.stages[stage] += 1
+            self.functions[innermost] += 1
+            if slide is not None:
+                self.slides[slide] += 1
+                self.stage_slides[stage, slide] += 1
+            # 折叠格式（可直接用于生成火焰图）：处理阶段作为根节点
+            self.stacks[';'.join([f"[{stage}]", name.rstrip('_0123456789')] + functions)] += 1
+        self.concurrent_jobs = max(self.concurrent_jobs, jobs)
+
+    def _check_memory(self):
+        """内存占用明显超过上一次快照时重新拍摄快照，保留占用最高时的快照"""
+        current, _ = tracemalloc.get_traced_memory()
+        if self._memory_peak is not None and current < self._memory_peak[0] * _MEMORY_GROWTH:
+            return
+        frame = sys._current_frames().get(self.job_thread)
+        slide = _inspect_stack(frame)[2] if frame is not None else None
+        stage = current_stage(self.job_thread)
+        self._memory_peak = (current, tracemalloc.take_snapshot(), None if stage == 'job' else stage, slide)
+
+    def _memory_report(self) -> dict:
+        """内存占用最高时相比分析开始时新增最多的代码行"""
+        current, peak = tracemalloc.get_traced_memory()
+        report = {"current_bytes": current, "peak_bytes": peak}
+        if self._memory_peak is not None:
+            size, snapshot, stage, slide = self._memory_peak
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            differences = snapshot.filter_traces(filters).compare_to(
+                self._memory_start.filter_traces(filters), 'lineno')
+            report["snapshot"] = {
+                "traced_bytes": size,
+                "stage": stage,
+                "slide": slide,
+                "top": [
+                    {"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+                    for stat in differences[:_TOP] if stat.size_diff > 0
+                ]
+            }
+        return report
+
+    def finish(self, error: str = None):
+        """停止分析并保存结果
+
+        参数:
+            error: 任务失败时的错误信息（包括调用栈）
+
+        返回:
+            分析结果的保存路径；任务在达到慢任务阈值之前结束（未开始分析）时返回None
+        """
+        with self._lock:
+            self._finished = True
+            if self._timer is not None:
+                self._timer.cancel()
+            if self._thread is None:
+                return None
+        self._stop.set()
+        self._thread.join()
+        try:
+            memory = None
+            if PROFILE_MEMORY:
+                self._check_memory()  # 任务结束时（例如doc.save之后）的内存占用
+                memory = self._memory_report()
+            return self._save(error, memory)
+        except Exception as e:
+            logger.error(f"保存任务 {self.job_id} 的分析结果时出错: {e}")
+            return None
+        finally:
+            self._memory_start = self._memory_peak = None
+            if PROFILE_MEMORY:
+                _stop_tracing()
+
+    def _save(self, error: str, memory: dict) -> str:
+        finished = time.perf_counter()
+        profile = {
+            "job_id": self.job_id,
+            "trigger": self.trigger,
+            "started_after_seconds": round(self.started - self.job_started, 3),  # 慢任务从超过阈值时开始
+            "duration_seconds": round(finished - self.started, 3),
+            "process_cpu_seconds": round(time.process_time() - self.cpu_started, 3),
+            "interval_seconds": PROFILE_INTERVAL,
+            "samples": self.samples,
+            "concurrent_jobs": self.concurrent_jobs,
+            "stages": dict(self.stages.most_common()),
+            "functions": dict(self.functions.most_common(_TOP)),
+            "slides": {str(slide): count for slide, count in self.slides.most_common(_TOP)},
+            "hot_spots": [
+                {"stage": stage, "slide": slide, "samples": count}
+                for (stage, slide), count in self.stage_slides.most_common(_TOP)
+            ],
+            "memory": memory,
+            "error": error,
+            "folded": [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        }
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = profile_path(self.job_id)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False, indent=1)
+        os.replace(path + '.tmp', path)
+        PROFILES.inc(trigger=self.trigger)
+        _prune_profiles()
+        logger.info(f"任务 {self.job_id} 的分析结果已保存: {self.samples} 个样本")
+        return path
+
+
+def _prune_profiles():
+    """分析结果超过 PROFILE_MAX_FILES 个时删除最早的"""
+    if not PROFILE_MAX_FILES:
+        return
+    entries = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith('.tmp'):
+            continue  # 正在写入的结果
+        try:
+            entries.append((os.path.getmtime(os.path.join(PROFILE_DIR, name)), name))
+        except FileNotFoundError:
+            continue
+    for _, name in sorted(entries)[:max(0, len(entries) - PROFILE_MAX_FILES)]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def job_profiler(job_id: str, requested: bool = False):
+    """为任务创建分析器（在任务线程中调用）
+
+    参数:
+        job_id: 任务ID
+        requested: 上传请求是否带有管理员令牌
+
+    返回:
+        JobProfiler，任务既未请求分析又没有配置慢任务阈值时返回None
+    """
+    if requested:
+        return JobProfiler(job_id, 'header')
+    if PROFILE_SLOW_SECONDS > 0:
+        return JobProfiler(job_id, 'slow', delay=PROFILE_SLOW_SECONDS)
+    return None
@@ -0,0 +1,67 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取限流配置
+import time  # 用于计算请求间隔
+import threading  # 线程锁，保证多线程并发调用时限流准确
+
+
+class RateLimiter:
+    """简单的令牌桶限流器，线程安全
+
+    每个AI服务商一个实例，所有并发的幻灯片请求共享同一个令牌桶，
+    保证整体请求速率不超过服务商的限制
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        """
+        参数:
+            requests_per_minute: 每分钟允许的请求数，<=0 表示不限流
+            burst: 令牌桶容量，允许的瞬时突发请求数
+        """
+        self.rate = requests_per_minute / 60.0  # 每秒补充的令牌数
+        self.capacity = max(1, burst)  # 令牌桶容量
+        self.tokens = float(self.capacity)  # 当前可用令牌数
+        self.updated_at = time.monotonic()  # 上次补充令牌的时间
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待"""
+        if self.rate <= 0:
+            return  # 未配置限流
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # 按经过的时间补充令牌
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                # 计算还需要等待多久才能拿到下一个令牌
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiters = {}  # 服务商名称 -> 限流器
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> RateLimiter:
+    """获取指定AI服务商的共享限流器
+
+    限流配置从环境变量读取，例如 GEMINI_RATE_LIMIT_RPM、VOLCENGINE_RATE_LIMIT_RPM，
+    以及对应的 *_RATE_LIMIT_BURST；未配置时不限流
+
+    参数:
+        provider: 服务商名称（与AI_MODEL_TYPE一致）
+
+    返回:
+        该服务商的限流器实例
+    """
+    key = provider.lower()
+    with _limiters_lock:
+        if key not in _limiters:
+            prefix = key.upper()
+            rpm = float(os.getenv(f'{prefix}_RATE_LIMIT_RPM', 0))
+            burst = int(os.getenv(f'{prefix}_RATE_LIMIT_BURST', 1))
+            _limiters[key] = RateLimiter(rpm, burst)
+        return _limiters[key]
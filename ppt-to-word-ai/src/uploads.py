@@ -0,0 +1,97 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于创建临时文件和读取配置
+import zipfile  # 只读取zip的中央目录，判断是否为PPTX
+import tempfile  # 生成不会冲突的临时文件
+
+# 单个上传文件的大小上限（MB），批量上传（压缩包或多个文件）的总大小上限（MB）
+MAX_UPLOAD_MB = float(os.getenv('MAX_UPLOAD_MB', 20))
+BATCH_MAX_UPLOAD_MB = float(os.getenv('BATCH_MAX_UPLOAD_MB', 500))
+
+# 各格式文件开头的魔数
+_PDF_MAGIC = b'%PDF-'
+_OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'  # 旧版Office二进制格式（.ppt）
+_ZIP_MAGIC = b'PK\x03\x04'  # PPTX和zip压缩包
+
+# 扩展名 -> 文件内容检测出的格式
+_EXTENSION_KINDS = {'.pdf': 'pdf', '.ppt': 'ppt', '.pptx': 'pptx', '.zip': 'zip'}
+
+_CHUNK_SIZE = 1024 * 1024  # 写入临时文件时每次复制的字节数
+
+
+class UploadError(ValueError):
+    """上传的文件无效（格式不支持或内容与扩展名不符）"""
+
+
+class UploadTooLargeError(UploadError):
+    """上传的文件超过大小上限"""
+
+
+def sniff_format(path: str, header: bytes) -> str:
+    """根据文件开头的魔数判断文件格式
+
+    PPTX是zip包，需要进一步确认其中包含 ppt/presentation.xml；
+    只读取zip末尾的中央目录，不解压任何内容
+
+    返回:
+        'pdf' / 'ppt' / 'pptx' / 'zip'，无法识别时返回None
+    """
+    if header.startswith(_PDF_MAGIC):
+        return 'pdf'
+    if header.startswith(_OLE_MAGIC):
+        return 'ppt'
+    if header.startswith(_ZIP_MAGIC):
+        try:
+            with zipfile.ZipFile(path) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return None
+        return 'pptx' if 'ppt/presentation.xml' in names else 'zip'
+    return None
+
+
+def spool_upload(file, directory: str, allowed: tuple = ('pdf', 'ppt', 'pptx'), max_bytes: int = None) -> str:
+    """把上传的文件流式写入唯一的临时文件，并校验文件内容
+
+    文件名由服务器生成（只保留扩展名），并发上传同名文件不会互相覆盖；
+    PDF和PPT在读到文件头时就能拒绝，不再写入剩余内容
+
+    参数:
+        file: Flask/Werkzeug的FileStorage对象
+        directory: 临时文件所在目录
+        allowed: 允许的文件格式
+        max_bytes: 可选的文件大小上限（字节），超出时停止写入并抛出UploadTooLargeError
+
+    返回:
+        临时文件的路径（调用方负责删除）
+    """
+    extension = os.path.splitext(file.filename or '')[1].lower()
+    expected = _EXTENSION_KINDS.get(extension)
+    if expected not in allowed:
+        raise UploadError(f"不支持的文件格式: {extension or '无扩展名'}")
+
+    header = file.stream.read(8)
+    # 非zip格式只需要文件头就能判断，尽早拒绝
+    if expected == 'pdf' and not header.startswith(_PDF_MAGIC) \
+            or expected == 'ppt' and not header.startswith(_OLE_MAGIC):
+        raise UploadError("文件内容与扩展名不符或文件已损坏")
+
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=directory, prefix='upload_', suffix=extension)
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            target.write(header)
+            written = len(header)
+            while True:
+                chunk = file.stream.read(_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if max_bytes is not None and written > max_bytes:
+                    raise UploadTooLargeError(f"文件超过大小上限（{max_bytes}字节）")
+                target.write(chunk)
+        if expected in ('pptx', 'zip') and sniff_format(path, header) != expected:
+            raise UploadError("文件内容与扩展名不符或文件已损坏")
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
@@ -0,0 +1,91 @@
+# 导入必要的库和模块
+import os  # 操作系统相关功能，用于读取配置
+import time  # 用于统计各步骤耗时
+import logging  # 记录预热结果
+from .metrics import Histogram  # 预热各步骤的耗时指标
+
+logger = logging.getLogger(__name__)
+
+# 是否在开始服务之前预热：导入转换依赖、启动OCR进程池并创建模型客户端
+# （不预热时，转换依赖在第一次转换时才导入；各步骤的耗时记录在 ppt2word_warmup_seconds 中）
+WARMUP = os.getenv('WARMUP', '1') == '1'
+
+WARMUP_SECONDS = Histogram('ppt2word_warmup_seconds', '启动预热各步骤的耗时（秒）', labels=('step',))
+
+
+def _step(name: str, func) -> float:
+    """执行一个预热步骤并记录耗时；预热失败只记录警告，不影响开始服务"""
+    started = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        logger.warning(f"预热步骤 {name} 失败: {e}")
+    seconds = time.perf_counter() - started
+    WARMUP_SECONDS.observe(seconds, step=name)
+    return seconds
+
+
+def _import_converter():
+    from . import converter  # 转换流程及其依赖的全部模块
+
+
+def _load_template():
+    from .docx_builder import get_template
+    get_template()
+
+
+def _warm_ocr():
+    from .ocr import warm_ocr_pool
+    from .ppt_processor import OCR_LANG
+    warm_ocr_pool(OCR_LANG)
+
+
+def _warm_office():
+    from .office_converter import warm_office_pool
+    warm_office_pool()
+
+
+def _create_llm_client():
+    from .llm_router import get_router
+    get_router().warm()
+
+
+def _open_caches():
+    from .ai_writer import get_llm_cache
+    from .artifact_store import get_artifact_store
+    get_llm_cache()
+    get_artifact_store()
+
+
+def preload() -> dict:
+    """导入转换依赖并加载Word模板（可以在fork之前执行）
+
+    在gunicorn的master进程中执行，fork出的worker直接共享这些已导入的模块
+
+    返回:
+        步骤名 -> 耗时（秒）
+    """
+    timings = {
+        "imports": _step("imports", _import_converter),
+        "docx_template": _step("docx_template", _load_template)
+    }
+    logger.info(f"预加载完成: {timings}")
+    return timings
+
+
+def warm_worker() -> dict:
+    """启动OCR进程池和Office转换进程、创建模型客户端并打开缓存（必须在fork之后执行）
+
+    这些对象包含线程、连接或子进程，不能在fork之前创建；OCR进程池中的每个工作进程都先完成一次识别
+
+    返回:
+        步骤名 -> 耗时（秒）
+    """
+    timings = {
+        "ocr_pool": _step("ocr_pool", _warm_ocr),
+        "office_pool": _step("office_pool", _warm_office),
+        "llm_client": _step("llm_client", _create_llm_client),
+        "caches": _step("caches", _open_caches)
+    }
+    logger.info(f"进程 {os.getpid()} 预热完成: {timings}")
+    return timings
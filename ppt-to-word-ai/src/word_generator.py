@@ -1,29 +1,47 @@
 # 导入必要的库和模块
-from docx import Document  # 用于创建和操作Word文档
-from docx.shared import Pt, Inches  # 用于设置文档中的点和英寸单位
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT  # 用于设置段落对齐方式
-import io  # 用于处理二进制流
-from PIL import Image  # 图像处理库
 import os  # 操作系统相关功能
-from .ai_writer import generate_explanation  # 导入AI写作模块，用于生成解释内容
+import queue  # 流式模式下在AI线程和写入线程之间传递文本片段
+from collections import deque  # 按幻灯片顺序保存进行中的AI请求
+from concurrent.futures import ThreadPoolExecutor  # 用于并发调用AI接口
+from .metrics import timed  # 阶段耗时指标
+from .docx_builder import DocumentBuilder, SectionWriter  # 基于模板、按章节批量生成XML的文档构建器
+from .ai_writer import generate_explanation, generate_explanation_stream, generate_batch_explanations, estimate_tokens  # 导入AI写作模块，用于生成解释内容
 
-def create_word_document(content: list, original_filename: str) -> str:
+# 同时进行中的AI请求数量上限（每个请求对应一张幻灯片，批量模式下对应一批幻灯片）
+AI_MAX_IN_FLIGHT = int(os.getenv('AI_MAX_IN_FLIGHT', 4))
+# 批量模式：把相邻幻灯片打包到一次请求中，每批内容的标记数预算（0表示关闭批量模式）
+AI_BATCH_TOKEN_BUDGET = int(os.getenv('AI_BATCH_TOKEN_BUDGET', 0))
+# 批量模式下每批最多包含的幻灯片数量
+AI_BATCH_MAX_SLIDES = int(os.getenv('AI_BATCH_MAX_SLIDES', 8))
+# 流式模式：AI边生成边写入文档，并通过event_callback实时推送生成的文本（批量模式下不生效）
+AI_STREAMING = os.getenv('AI_STREAMING', '1') == '1'
+# 生成的Word文档的保存目录
+OUTPUT_DIR = os.getenv('OUTPUT_DIR', '/app/assets/output')
+
+_STREAM_END = object()  # 流式输出结束标记
+
+def create_word_document(content, original_filename: str, progress_callback=None, total: int = None,
+                         event_callback=None, section_callback=None, output_dir: str = None,
+                         output_path: str = None) -> str:
     """创建基于用户反馈改进的学术Word文档
     
     参数:
-        content: 从PPT或PDF中提取的结构化内容列表
+        content: 从PPT或PDF中提取的结构化内容，可以是列表，也可以是逐张产出的迭代器（流式处理）
         original_filename: 原始文件名，用于生成输出文件名
+        progress_callback: 可选的进度回调 callback(done, total, stage)，每处理完一张幻灯片调用一次
+        total: 幻灯片/页面总数，content为迭代器时用于报告进度
+        event_callback: 可选的实时输出回调 callback(slide, text)，流式模式下每收到一段AI文本调用一次
+        section_callback: 可选的章节回调 callback(item, combined_content, section)，按幻灯片顺序
+                          每写入一张调用一次；section为AI生成的文本，没有内容时为空字符串，出错时为None。
+                          带有 cached_section 的幻灯片（增量转换中未变化的幻灯片）直接复用该章节
+        output_dir: 可选的输出目录，默认使用 OUTPUT_DIR
+        output_path: 可选的完整输出路径，指定时忽略 output_dir（由调用方决定文件名，例如产物存储的暂存文件）
         
     返回:
         生成的Word文档的完整路径
     """
-    doc = Document()
-    
-    # 改进的样式配置
-    styles = doc.styles
-    font = styles['Normal'].font
-    font.name = 'SimSun'  # 使用宋体或其他支持中文的字体
-    font.size = Pt(12)  # 调整为适合中文阅读的字号
+    # 样式来自每个进程只加载一次的模板（宋体12号正文、代码块样式等）
+    doc = DocumentBuilder()
     
     # 专业学术封面
     doc.add_heading(f"学习文档", 0)
@@ -32,100 +50,247 @@ def create_word_document(content: list, original_filename: str) -> str:
     doc.add_paragraph("内容已结构化和丰富化，便于学习\n")
     
     # 处理每个幻灯片/页面，应用关键改进
-    for item in content:
-        # 收集所有相关文本
-        all_text = []  # 用于存储当前幻灯片的所有文本内容
-        
-        # 如果存在标题，则添加到文本集合中
-        if item.get('title'):
-            all_text.append(f"标题: {item['title']}")  # 添加标题前缀以便AI识别
-        
-        # 添加文本内容
-        for element in item["content"]:
-            # 只添加类型为文本且长度超过15个字符的内容（过滤掉太短的文本）
-            if element["type"] == "text" and len(element["data"].strip()) > 15:  
-                all_text.append(element["data"])
-        
-        # 过滤并添加图片中的文本（仅当文本有意义时）
-        for img in item.get("images", []):
-            # 只添加文本长度超过25个字符的图片文本（确保内容有实质性）
-            if img.get("text") and len(img.get("text", "").strip()) > 25:  
-                img_text = img.get("text", "").strip()
-                # 过滤图片中的无关内容
-                irrelevant_terms = ["slide", "页面", "背景", "模板", "设计", "点击", "这里"]
-                # 检查文本中是否包含任何无关词汇
-                if not any(term in img_text.lower() for term in irrelevant_terms):
-                    all_text.append(f"图片内容: {img_text}")  # 添加图片文本前缀以便AI识别
-        
-        # 合并所有内容
-        combined_content = "\n".join(all_text)  # 将所有文本用换行符连接
-        
-        # 只有当合并后的内容不为空时才处理
-        if combined_content.strip():
-            # 必须使用改进的AI生成内容
+    # AI请求是网络密集型的，因此并发发送；结果按幻灯片顺序写入文档
+    if total is None:
+        total = len(content) if hasattr(content, '__len__') else 0  # 幻灯片/页面总数，用于报告进度
+    if progress_callback:
+        progress_callback(0, total, "generating")
+    
+    max_in_flight = max(1, AI_MAX_IN_FLIGHT)
+    batch_mode = AI_BATCH_TOKEN_BUDGET > 0
+    streaming = AI_STREAMING and not batch_mode
+    # 已提交但尚未写入的幻灯片数量上限，批量模式下需要容纳若干完整的批次
+    window = max_in_flight * (max(2, AI_BATCH_MAX_SLIDES) if batch_mode else 2)
+    pending = deque()  # 按幻灯片顺序排列的条目: {"item", "content", "future", "index", "stream", "cached"}
+    batch = []  # 正在打包、尚未提交的相邻幻灯片条目
+    batch_tokens = 0  # 当前批次内容的估计标记数
+    done = 0  # 已写入文档的幻灯片数量
+    
+    def flush_batch():
+        # 把当前批次作为一次请求提交（只有一张幻灯片时使用普通的单张请求）
+        nonlocal batch_tokens
+        if len(batch) == 1:
+            batch[0]["future"] = executor.submit(generate_explanation, batch[0]["content"])
+        elif batch:
+            future = executor.submit(generate_batch_explanations, [entry["content"] for entry in batch])
+            for index, entry in enumerate(batch):
+                entry["future"] = future
+                entry["index"] = index  # 该幻灯片在批量结果中的位置
+        batch.clear()
+        batch_tokens = 0
+    
+    def write_next():
+        # 等待队首幻灯片的AI结果并写入文档，保证输出顺序与幻灯片顺序一致
+        nonlocal done
+        entry = pending.popleft()
+        section = ""  # 该幻灯片生成的章节文本，出错时为None
+        if entry["cached"] is not None:
+            # 增量转换：幻灯片未变化，直接写入上次生成的章节
+            section = entry["cached"]
+            if section:
+                with timed("docx_write"):
+                    doc.add_markdown(section)
+                    doc.add_paragraph()  # 添加空白段落作为分隔
+                    doc.flush()
+                if event_callback:
+                    event_callback(entry["ordinal"], section)
+        elif entry["stream"] is not None:
+            # 流式模式：AI每生成一行就立即解析并写入文档
+            with timed("docx_stream"):  # 包括等待AI输出和逐行写入
+                section = _write_stream(doc, entry["stream"], entry["content"])
+            doc.add_paragraph()  # 添加空白段落作为分隔
+            with timed("docx_write"):
+                doc.flush()
+        elif entry["content"].strip():
+            if entry["future"] is None:
+                flush_batch()  # 队首幻灯片还在打包中的批次里，立即提交
             try:
-                # 调用AI写作模块生成结构化的解释内容
-                enhanced_content = generate_explanation(combined_content)
-                
+                # 获取AI生成的结构化解释内容（失败时在这里抛出异常）
+                with timed("llm_wait"):  # 写入线程等待AI结果的时间
+                    enhanced_content = entry["future"].result()
+                if entry["index"] is not None:
+                    enhanced_content = enhanced_content[entry["index"]]
                 # 处理AI生成的具有层次结构的内容
-                lines = enhanced_content.split('\n')  # 按行分割内容
-                for line in lines:
-                    line = line.strip()  # 去除行首尾空白
-                    if not line:  # 跳过空行
-                        continue
-                    
-                    if line.startswith('####'):
-                        # 小标题（三级标题）
-                        doc.add_heading(line[4:].strip(), level=3)                        
-                    elif line.startswith('###'):
-                        # 副标题（二级标题）
-                        doc.add_heading(line[3:].strip(), level=2)
-                    elif line.startswith('##'):
-                        # 主标题（一级标题）
-                        doc.add_heading(line[2:].strip(), level=1)
-
-                    elif line.startswith('•') or line.startswith('- ') or line.startswith('* '):
-                        # 项目符号列表（无序列表）
-                        # 根据不同的项目符号类型提取文本内容
-                        bullet_text = line[1:].strip() if line.startswith('•') else line[2:].strip()
-                        para = doc.add_paragraph(bullet_text, style='List Bullet')  # 使用项目符号样式
-                    elif line.startswith(('1. ', '2. ', '3. ', '4. ', '5. ')):
-                        # 编号列表（有序列表）
-                        num_text = line[3:].strip()  # 提取编号后的文本
-                        para = doc.add_paragraph(num_text, style='List Number')  # 使用编号列表样式
-                    elif '```' in line:
-                        # 代码块标记 - 忽略标记行，但处理内容
-                        continue
-                    elif line.startswith('**') and line.endswith('**'):
-                        # 粗体文本作为突出段落
-                        para = doc.add_paragraph()
-                        run = para.add_run(line[2:-2])  # 去除前后的**标记
-                        run.bold = True  # 设置为粗体
-                    elif len(line) > 10:  # 只处理内容实质的段落（超过10个字符）
-                        # 普通段落
-                        doc.add_paragraph(line)
-                
+                with timed("docx_write"):
+                    doc.add_markdown(enhanced_content)
+                section = enhanced_content
             except Exception as e:
-                # 如果AI处理出错，记录问题
-                doc.add_heading(f"AI内容处理错误", level=1)
-                doc.add_paragraph(f"错误信息: {str(e)}")  # 添加错误详情
-                doc.add_paragraph("未处理的原始内容:")  # 标明以下是原始内容
-                doc.add_paragraph(combined_content)  # 添加原始内容
-        
-        # 改进的章节分隔符（仅在有内容时添加）
-        if combined_content.strip():
+                # 如果AI处理出错，只记录当前幻灯片的问题，不影响其他幻灯片
+                doc.add_error_section(e, entry["content"])
+                section = None
+            
+            # 改进的章节分隔符（仅在有内容时添加）
             doc.add_paragraph()  # 添加空白段落作为分隔
+            with timed("docx_write"):
+                doc.flush()  # 整个章节的XML一次性插入文档
+        if section_callback:
+            section_callback(entry["item"], entry["content"], section)
+        
+        # 报告当前幻灯片已处理完成
+        done += 1
+        if progress_callback:
+            progress_callback(done, total, "generating")
     
-    # 使用改进的命名方式保存文件
-    output_dir = "/app/assets/output"  # 输出目录
-    os.makedirs(output_dir, exist_ok=True)  # 确保输出目录存在
+    with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='ai-writer') as executor:
+        for ordinal, item in enumerate(content, start=1):
+            cached = item.get("cached_section")
+            # 复用的幻灯片没有经过OCR，使用上次记录的合并文本
+            combined_content = item["cached_content"] if cached is not None else build_combined_content(item)
+            entry = {
+                "item": item, "ordinal": ordinal, "content": combined_content,
+                "future": None, "index": None, "stream": None, "cached": cached
+            }
+            
+            # 只有当合并后的内容不为空时才调用AI（复用的幻灯片不需要调用）
+            if combined_content.strip() and cached is None:
+                if batch_mode:
+                    # 超出标记数预算或幻灯片数量上限时，先提交当前批次
+                    tokens = estimate_tokens(combined_content)
+                    if batch and (batch_tokens + tokens > AI_BATCH_TOKEN_BUDGET or len(batch) >= AI_BATCH_MAX_SLIDES):
+                        flush_batch()
+                    batch.append(entry)
+                    batch_tokens += tokens
+                elif streaming:
+                    entry["stream"] = queue.Queue()  # AI线程写入、文档写入线程读取的文本片段
+                    entry["future"] = executor.submit(
+                        _stream_explanation, combined_content, entry["stream"], ordinal, event_callback
+                    )
+                else:
+                    entry["future"] = executor.submit(generate_explanation, combined_content)
+            pending.append(entry)
+            
+            # 限制已提交但尚未写入的幻灯片数量，避免结果在内存中堆积
+            while len(pending) > window:
+                write_next()
+        
+        # 提交最后一个批次并写入剩余的幻灯片
+        flush_batch()
+        while pending:
+            write_next()
     
-    # 从原始文件名中提取基本名称（不含扩展名）
-    base_name = os.path.splitext(original_filename)[0]
-    # 构建输出文件名，使用中文前缀
-    output_filename = f"学习文档_{base_name}.docx"  
-    # 构建完整的输出路径
-    output_path = os.path.join(output_dir, output_filename)
+    # 使用改进的命名方式保存文件
+    if output_path is None:
+        output_dir = output_dir or OUTPUT_DIR  # 输出目录
+        os.makedirs(output_dir, exist_ok=True)  # 确保输出目录存在
+        # 构建完整的输出路径
+        output_path = os.path.join(output_dir, output_filename(original_filename))
     
-    doc.save(output_path)
+    total = max(total, done)  # 迭代器的实际数量可能与预估不同
+    if progress_callback:
+        progress_callback(total, total, "saving")
+    with timed("docx_save"):
+        doc.save(output_path)
     return output_path
+
+def output_filename(original_filename: str, keep_extension: bool = False) -> str:
+    """生成的Word文档的文件名：学习文档_<原文件名（不含扩展名）>.docx
+
+    keep_extension为True时保留原扩展名（学习文档_a.pdf.docx），用于区分基本名相同的输入文件
+    """
+    # 从原始文件名中提取基本名称（不含扩展名），使用中文前缀
+    base_name = original_filename if keep_extension else os.path.splitext(original_filename)[0]
+    return f"学习文档_{base_name}.docx"
+
+def build_combined_content(item: dict) -> str:
+    """收集一张幻灯片/页面中所有相关文本，合并为发送给AI的内容
+    
+    参数:
+        item: 单张幻灯片或单个页面的结构化内容
+        
+    返回:
+        合并后的文本，没有有效内容时返回空字符串
+    """
+    all_text = []  # 用于存储当前幻灯片的所有文本内容
+    
+    # 如果存在标题，则添加到文本集合中
+    if item.get('title'):
+        all_text.append(f"标题: {item['title']}")  # 添加标题前缀以便AI识别
+    
+    # 添加文本内容
+    for element in item["content"]:
+        if element["type"] == "heading":
+            # PDF中按字号识别出的小标题
+            all_text.append(f"小标题: {element['data']}")
+        # 只添加类型为文本且长度超过15个字符的内容（过滤掉太短的文本）
+        elif element["type"] == "text" and len(element["data"].strip()) > 15:  
+            all_text.append(element["data"])
+        elif element["type"] == "table":
+            # PPT中的表格，每行一行
+            all_text.append(f"表格:\n{element['data']}")
+    
+    # 添加演讲者备注
+    if item.get("notes"):
+        all_text.append(f"备注: {item['notes']}")
+    
+    # 过滤并添加图片中的文本（仅当文本有意义时）
+    for img in item.get("images", []):
+        # 只添加文本长度超过25个字符的图片文本（确保内容有实质性）
+        if img.get("text") and len(img.get("text", "").strip()) > 25:  
+            img_text = img.get("text", "").strip()
+            # 过滤图片中的无关内容
+            irrelevant_terms = ["slide", "页面", "背景", "模板", "设计", "点击", "这里"]
+            # 检查文本中是否包含任何无关词汇
+            if not any(term in img_text.lower() for term in irrelevant_terms):
+                all_text.append(f"图片内容: {img_text}")  # 添加图片文本前缀以便AI识别
+    
+    # 合并所有内容
+    return "\n".join(all_text)  # 将所有文本用换行符连接
+
+def _stream_explanation(combined_content: str, chunks: queue.Queue, slide: int, event_callback=None):
+    """在AI线程中流式生成一张幻灯片的解释，把每段文本放入队列并推送实时事件"""
+    try:
+        for chunk in generate_explanation_stream(combined_content):
+            chunks.put(chunk)
+            if event_callback:
+                event_callback(slide, chunk)
+    except Exception as e:
+        chunks.put(e)  # 交给写入线程生成回退章节
+    finally:
+        chunks.put(_STREAM_END)
+
+def _write_stream(doc, chunks: queue.Queue, combined_content: str):
+    """从队列中读取AI文本片段，按完整的行增量解析并写入文档
+    
+    返回:
+        完整的生成文本，出错时返回None
+    """
+    writer = SectionWriter(doc)  # 代码块和表格跨越多行，由writer保存解析状态
+    parser = IncrementalLineParser(writer.feed_line)
+    parts = []  # 已收到的全部文本片段
+    failed = False
+    while True:
+        chunk = chunks.get()
+        if chunk is _STREAM_END:
+            break
+        if isinstance(chunk, Exception):
+            parser.close()
+            writer.close()
+            # 如果AI处理出错，只记录当前幻灯片的问题，不影响其他幻灯片
+            doc.add_error_section(chunk, combined_content)
+            failed = True
+            continue  # 继续读取直到结束标记，避免残留在队列中
+        parser.feed(chunk)
+        parts.append(chunk)
+    parser.close()
+    writer.close()
+    return None if failed else "".join(parts)
+
+class IncrementalLineParser:
+    """增量行解析器：接收任意切分的文本片段，每凑齐一整行就交给回调处理"""
+    
+    def __init__(self, on_line):
+        self.on_line = on_line  # 处理完整一行的回调
+        self.buffer = ""  # 尚未遇到换行符的残余文本
+    
+    def feed(self, chunk: str):
+        """输入一段文本，处理其中所有完整的行"""
+        self.buffer += chunk
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self.on_line(line)
+    
+    def close(self):
+        """处理最后一行（没有换行符结尾的部分）"""
+        if self.buffer:
+            self.on_line(self.buffer)
+            self.buffer = ""
@@ -9,11 +9,14 @@ document.addEventListener('DOMContentLoaded', function() {
     const statusText = document.getElementById('status-text');
     const downloadBtn = document.getElementById('download-btn');
     const errorMessage = document.getElementById('error-message');
+    const liveOutput = document.getElementById('live-output');
 
     // 文件对象
     let selectedFile = null;
     // 生成的文件名
-    let generatedFileName = null;
+    let generatedDownloadUrl = null;
+    // 实时输出的事件流
+    let eventSource = null;
 
     // 点击上传区域触发文件选择
     uploadArea.addEventListener('click', function() {
@@ -87,6 +90,7 @@ document.addEventListener('DOMContentLoaded', function() {
         // 更新UI状态
         uploadBtn.disabled = true;
         statusContainer.classList.add('show');
+        liveOutput.classList.remove('show');
         progressBar.style.width = '10%';
         
         // 更新状态文本
@@ -110,36 +114,33 @@ document.addEventListener('DOMContentLoaded', function() {
                     throw new Error(`服务器响应错误 (${response.status})`);
                 }
             }
-            progressBar.style.width = '50%';
-            statusText.textContent = '正在处理文件...';
+            progressBar.style.width = '15%';
+            statusText.textContent = '文件已上传，等待处理...';
             return response.json();
         })
         .then(data => {
-            progressBar.style.width = '80%';
-            statusText.textContent = '生成Word文档...';
+            if (!data.success || !data.job_id) {
+                throw new Error(data.error || '处理文件时出错');
+            }
+            // 文件已上传，订阅AI实时输出，并开始轮询后台任务的进度
+            watchLiveOutput(`/jobs/${data.job_id}/events`);
+            return pollJob(data.status_url || `/jobs/${data.job_id}`);
+        })
+        .then(job => {
+            stopLiveOutput();
+            progressBar.style.width = '100%';
+            statusText.textContent = '处理完成！';
+            generatedDownloadUrl = job.download_url;
             
-            // 模拟处理时间，给用户更好的反馈
+            // 显示结果区域
             setTimeout(() => {
-                progressBar.style.width = '100%';
-                statusText.textContent = '处理完成！';
-                
-                if (data.success) {
-                    // 处理成功
-                    generatedFileName = data.output_file;
-                    
-                    // 显示结果区域
-                    setTimeout(() => {
-                        statusContainer.classList.remove('show');
-                        resultContainer.classList.add('show');
-                    }, 500);
-                } else {
-                    // 处理失败
-                    throw new Error(data.error || '处理文件时出错');
-                }
-            }, 800);
+                statusContainer.classList.remove('show');
+                resultContainer.classList.add('show');
+            }, 500);
         })
         .catch(error => {
             console.error('Error:', error);
+            stopLiveOutput();
             progressBar.style.width = '0%';
             statusContainer.classList.remove('show');
             showError(error.message || '上传或处理文件时出错');
@@ -150,13 +151,96 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // 轮询任务状态，直到任务完成或失败
+    function pollJob(statusUrl) {
+        return new Promise((resolve, reject) => {
+            function check() {
+                fetch(statusUrl)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`查询任务状态失败 (${response.status})`);
+                    }
+                    return response.json();
+                })
+                .then(job => {
+                    if (job.status === 'completed') {
+                        resolve(job);
+                        return;
+                    }
+                    if (job.status === 'failed') {
+                        throw new Error(job.details || job.error || '处理文件时出错');
+                    }
+                    updateProgress(job.progress);
+                    setTimeout(check, 1000);  // 每秒查询一次
+                })
+                .catch(reject);
+            }
+            check();
+        });
+    }
+
+    // 通过Server-Sent Events接收AI边生成边输出的文本，逐张幻灯片显示
+    function watchLiveOutput(eventsUrl) {
+        stopLiveOutput();
+        if (!window.EventSource) return;  // 浏览器不支持时只显示进度条
+        
+        liveOutput.textContent = '';
+        let currentSlide = null;
+        eventSource = new EventSource(eventsUrl);
+        eventSource.onmessage = function(e) {
+            const event = JSON.parse(e.data);
+            if (event.slide !== currentSlide) {
+                currentSlide = event.slide;
+                liveOutput.textContent += `\n—— 幻灯片 ${event.slide} ——\n`;
+            }
+            liveOutput.textContent += event.text;
+            liveOutput.classList.add('show');
+            liveOutput.scrollTop = liveOutput.scrollHeight;  // 自动滚动到最新内容
+        };
+        eventSource.addEventListener('status', function(e) {
+            const job = JSON.parse(e.data);
+            if (job.status === 'completed' || job.status === 'failed') {
+                stopLiveOutput();
+            }
+        });
+        eventSource.onerror = function() {
+            // 连接中断时由浏览器自动重连；任务结束后由stopLiveOutput关闭
+        };
+    }
+
+    // 关闭实时输出的事件流
+    function stopLiveOutput() {
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
+    }
+
+    // 根据任务进度更新进度条和状态文本
+    function updateProgress(progress) {
+        if (!progress) return;
+        if (progress.stage === 'extracting') {
+            progressBar.style.width = '20%';
+            statusText.textContent = '正在提取文件内容...';
+        } else if (progress.stage === 'saving') {
+            progressBar.style.width = '95%';
+            statusText.textContent = '生成Word文档...';
+        } else if (progress.total > 0) {
+            // 20% ~ 95% 之间按幻灯片进度推进
+            const percent = 20 + Math.round(75 * progress.done / progress.total);
+            progressBar.style.width = `${percent}%`;
+            statusText.textContent = `正在生成内容 (${progress.done}/${progress.total})...`;
+        } else {
+            statusText.textContent = '排队等待处理...';
+        }
+    }
+
     // 下载按钮点击事件
     downloadBtn.addEventListener('click', function() {
-        if (!generatedFileName) return;
+        if (!generatedDownloadUrl) return;
         
-        // 创建下载链接
-        const downloadUrl = `/download/${generatedFileName}`;
-        window.location.href = downloadUrl;
+        // 使用任务结果中的下载链接（每个任务的下载键唯一）
+        window.location.href = generatedDownloadUrl;
     });
 
     // 显示错误消息
@@ -0,0 +1,26 @@
+# 导入必要的库和模块
+import os  # 检查生成的文件
+from benchmarks.synthetic import make_pptx, make_pdf  # 合成的PPTX和PDF文件
+from src import batch, llm_router  # 被测试的批量转换
+
+
+def test_same_base_name_inputs_do_not_overwrite(tmp_path, monkeypatch):
+    """同一目录下的 a.pptx 和 a.pdf 各自生成一个Word文档，不会互相覆盖"""
+    monkeypatch.delenv('AI_PROVIDERS', raising=False)
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    monkeypatch.setenv('AI_MODEL_TYPE', 'gemini')
+    monkeypatch.setattr(llm_router, '_router', None)  # 没有可用的服务商，每张幻灯片写入错误提示章节
+
+    input_dir = tmp_path / 'input'
+    input_dir.mkdir()
+    make_pptx(str(input_dir / 'a.pptx'), slides=2, images=0, logo=False)
+    make_pdf(str(input_dir / 'a.pdf'), pages=2, images=0)
+    output_dir = tmp_path / 'output'
+
+    report = batch.run_batch(batch.collect_inputs(str(input_dir)), output_dir=str(output_dir),
+                             base_dir=str(input_dir), workers=2)
+
+    outputs = [result["output"] for result in report["files"]]
+    assert report["summary"]["completed"] == 2
+    assert sorted(outputs) == ["学习文档_a.pdf.docx", "学习文档_a.pptx.docx"]
+    assert all(os.path.exists(output_dir / output) for output in outputs)
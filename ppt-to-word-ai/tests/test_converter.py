@@ -0,0 +1,20 @@
+# 导入必要的库和模块
+import docx  # 读取生成的Word文档
+from benchmarks.synthetic import make_pptx  # 合成的PPTX文件
+from src import converter, llm_router, manifest  # 被测试的转换流程和增量转换清单
+
+
+def test_unconfigured_provider_still_writes_fallback_sections(tmp_path, monkeypatch):
+    """没有可用的AI服务商时，开启增量转换也要完成转换，每张幻灯片写入错误提示章节"""
+    monkeypatch.setenv('AI_MODEL_TYPE', 'gemini')
+    monkeypatch.delenv('AI_PROVIDERS', raising=False)
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    monkeypatch.setattr(llm_router, '_router', None)  # 按上面的环境变量重新创建路由
+    monkeypatch.setattr(manifest, 'MANIFEST_DIR', str(tmp_path / 'manifests'))
+    monkeypatch.setattr(converter, 'INCREMENTAL_ENABLED', True)
+
+    source = make_pptx(str(tmp_path / 'deck.pptx'), slides=3, images=0, logo=False)
+    output = converter.convert_file(source, 'deck.pptx', output_dir=str(tmp_path))
+
+    headings = [p.text for p in docx.Document(output).paragraphs if p.text == "AI内容处理错误"]
+    assert len(headings) == 3
@@ -0,0 +1,26 @@
+# 导入必要的库和模块
+import random  # 使用固定种子生成确定性的图片
+from benchmarks.synthetic import text_image, logo_image  # 合成的文字截图和徽标图片
+from src.image_filter import prefilter_images  # 被测试的OCR预分类
+
+
+def test_distinct_text_images_are_not_filtered():
+    """内容不同的白底文字截图缩小后几乎相同，但都必须交给OCR"""
+    rng = random.Random(0)
+    blobs = [text_image(rng, width=800, height=300, lines=4) for _ in range(4)]
+    assert prefilter_images(blobs) == [None] * 4
+
+
+def test_distinct_text_images_across_slides_are_not_filtered():
+    """逐张幻灯片提交时，与之前幻灯片中的文字截图一起统计也不能被判为装饰"""
+    rng = random.Random(1)
+    seen_hashes = []
+    for _ in range(6):
+        assert prefilter_images([text_image(rng, width=800, height=300, lines=4)], seen_hashes) == [None]
+
+
+def test_repeated_logo_is_decoration():
+    """每张幻灯片上完全相同的徽标视为装饰"""
+    seen_hashes = []
+    reasons = [prefilter_images([logo_image()], seen_hashes)[0] for _ in range(4)]
+    assert reasons == [None, None, 'decoration', 'decoration']
@@ -0,0 +1,24 @@
+# 导入必要的库和模块
+import random  # 使用固定种子生成确定性的图片
+import fitz  # PyMuPDF，用于生成测试用的PDF
+from benchmarks.synthetic import text_image, logo_image  # 合成的文字截图和徽标图片
+from src.pdf_processor import iter_text_from_pdf  # 被测试的逐页提取
+
+
+def test_scanned_page_detection_by_image_coverage(tmp_path):
+    """带徽标的标题页保留文本层、不做OCR；被图像铺满的页面整页OCR，同时保留已有文本"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 100), "Intro", fontsize=30)
+    page.insert_image(fitz.Rect(450, 20, 570, 80), stream=logo_image())
+    page = doc.new_page()
+    page.insert_image(page.rect, stream=text_image(random.Random(0)), keep_proportion=False)
+    page.insert_text((72, 40), "Page 2", fontsize=10)
+    path = str(tmp_path / 'deck.pdf')
+    doc.save(path)
+
+    title_page, scanned_page = iter_text_from_pdf(path)
+    assert not title_page["scanned"] and not title_page["images"]
+    assert [item["data"] for item in title_page["content"]] == ["Intro"]
+    assert scanned_page["scanned"] and len(scanned_page["images"]) == 1
+    assert [item["data"] for item in scanned_page["content"]] == ["Page 2"]